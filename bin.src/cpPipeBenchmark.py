@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Benchmark the orchestration of eotest by CpTask on a synthetic TS8 run, using stub eotest subtasks."""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from lsst.cp.pipe import CpTask, EOTEST_STAGES
+from lsst.cp.pipe.benchmark import makeSyntheticRepo, configureStubSubtasks, runBenchmark, measureStartup, \
+    makeEngineInputs, compareEngines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--root", help="Directory for the synthetic repo and outputs (default: a temporary "
+                        "directory, deleted afterwards)")
+    parser.add_argument("--runs", type=int, default=1,
+                        help="Number of runs, processed in batch mode if more than one "
+                        "(default: %(default)s)")
+    parser.add_argument("--ccds", type=int, default=9, help="Number of CCDs (default: %(default)s)")
+    parser.add_argument("--visits", type=int, default=4,
+                        help="Visits per testType/imageType (default: %(default)s)")
+    parser.add_argument("--ampShape", type=int, nargs=2, default=(200, 100), metavar=("ROWS", "COLUMNS"),
+                        help="Size of each amplifier image (default: %(default)s)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1],
+                        help="Values of numProcesses to benchmark (default: %(default)s)")
+    parser.add_argument("--cpu", type=float, default=0., help="CPU seconds per stage and CCD")
+    parser.add_argument("--memory", type=int, default=0, help="Bytes of memory used per stage and CCD")
+    parser.add_argument("--intermediate", type=int, default=0,
+                        help="Bytes of intermediate file written per stage and CCD")
+    parser.add_argument("--noRead", action="store_true", help="Don't read the input files")
+    parser.add_argument("--report", action="store_true", help="Also time makeEotestReport()")
+    parser.add_argument("--startup", action="store_true",
+                        help="Time the startup of CpTask, with all the stages and with only the read noise, "
+                        "instead of running it")
+    parser.add_argument("--compare", metavar="STAGE",
+                        help="Compare the eotest task of a stage with cp_pipe's NumPy engine for it, e.g. "
+                        "ptc, on synthetic inputs, instead of running CpTask")
+    parser.add_argument("--config", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="Further CpTaskConfig overrides, e.g. stagingDir=/scratch")
+    args = parser.parse_args()
+
+    if args.startup:
+        readNoiseOnly = dict((stage.doField, stage.name == 'readNoise') for stage in EOTEST_STAGES)
+        for description, overrides in (("all stages", {}), ("read noise only", readNoiseOnly)):
+            timings = measureStartup(overrides)
+            print("Startup with %s: import %.3f s, config %.3f s, construction %.3f s" %
+                  (description, timings.importTime, timings.configTime, timings.constructTime))
+        return
+
+    root = args.root or tempfile.mkdtemp()
+    try:
+        if args.compare:
+            runArgs = makeEngineInputs(args.compare, root)
+            comparison = compareEngines(args.compare, CpTask.ConfigClass(), runArgs, root)
+            print("%s: eotest %.2f s, numpy %.2f s, speedup %.1f" %
+                  (args.compare, comparison.eotestTime, comparison.numpyTime,
+                   comparison.eotestTime/comparison.numpyTime))
+            for column, difference in sorted(comparison.differences.items()):
+                tolerance = comparison.tolerances[column]
+                print("    %-14s relative difference %.2e, tolerance %.0e%s" %
+                      (column, difference, tolerance, "" if difference <= tolerance else "  EXCEEDED"))
+            return
+
+        start = time.time()
+        butler = makeSyntheticRepo(os.path.join(root, 'repo'), nCcds=args.ccds,
+                                   visitsPerAcquisition=args.visits, ampShape=tuple(args.ampShape),
+                                   runs=[str(1000 + i) for i in range(args.runs)])
+        print("Wrote %d synthetic raw files in %.1f s" % (len(butler.records), time.time() - start))
+
+        for numProcesses in args.processes:
+            config = CpTask.ConfigClass()
+            config.eotestOutputPath = os.path.join(root, 'eotest_%d' % numProcesses)
+            if os.path.exists(config.eotestOutputPath):
+                shutil.rmtree(config.eotestOutputPath)
+            config.numProcesses = numProcesses
+            configureStubSubtasks(config, cpuSeconds=args.cpu, readInputs=not args.noRead,
+                                  memoryBytes=args.memory, intermediateBytes=args.intermediate)
+            for override in args.config:
+                name, value = override.split('=', 1)
+                fieldType = config._fields[name].dtype
+                setattr(config, name, value.lower() in ('1', 'true', 'yes') if fieldType is bool
+                        else fieldType(value))
+
+            timings = runBenchmark(CpTask, config, butler, doReport=args.report)
+            print("\nnumProcesses=%d: run %.2f s, stages %.2f s, overhead %.2f s, "
+                  "efficiency %.0f%%" % (numProcesses, timings.runTime, timings.unitTime, timings.overhead,
+                                         100*timings.efficiency))
+            if timings.reportTime is not None:
+                print("makeEotestReport %.2f s" % timings.reportTime)
+            for stageName, stageTime in sorted(timings.stageTimes.items(), key=lambda item: -item[1]):
+                print("    %-14s %8.2f s" % (stageName, stageTime))
+    finally:
+        if not args.root:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
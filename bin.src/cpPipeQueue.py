@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Run eotest over several nodes: plan the work units of a run into a queue, and run workers pulling them."""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+
+import lsst.daf.persistence as dafPersist
+from lsst.cp.pipe import CpTask, SqliteWorkQueue
+
+
+def parseConfig(overrides):
+    """Make a CpTaskConfig with NAME=VALUE overrides, converted to the type of their field."""
+    config = CpTask.ConfigClass()
+    for override in overrides:
+        name, value = override.split('=', 1)
+        fieldType = config._fields[name].dtype
+        setattr(config, name, value.lower() in ('1', 'true', 'yes') if fieldType is bool
+                else fieldType(value))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command")
+    for command, description in (("plan", "Queue the work units of a run"),
+                                 ("work", "Run work units from the queue until it is finished"),
+                                 ("status", "Print the number of units in each state, and the failures")):
+        subparser = subparsers.add_parser(command, help=description)
+        subparser.add_argument("queue",
+                               help="SQLite database of the queue, on a filesystem seen by all the nodes")
+        if command == "status":
+            continue
+        subparser.add_argument("repo", help="Repository containing the eotest data")
+        subparser.add_argument("--config", nargs="*", default=[], metavar="NAME=VALUE",
+                               help="CpTaskConfig overrides, which must be the same for all the nodes")
+        if command == "plan":
+            subparser.add_argument("--run", help="Run to process, if the repo contains several")
+            subparser.add_argument("--ccds", nargs="+", help="CCDs to process")
+        else:
+            subparser.add_argument("--leaseSeconds", type=float, default=600.,
+                                   help="Time after which the unit of a dead worker is rerun "
+                                   "(default: %(default)s)")
+            subparser.add_argument("--workerId", help="Identifier of the worker (default: host_pid)")
+            subparser.add_argument("--idleTimeout", type=float,
+                                   help="Stop after this many seconds without a unit to run")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        task = CpTask(config=parseConfig(args.config))
+        task.planEotestQueue(dafPersist.Butler(args.repo), SqliteWorkQueue(args.queue), run=args.run,
+                             ccds=args.ccds)
+    elif args.command == "work":
+        task = CpTask(config=parseConfig(args.config))
+        task.runEotestWorker(dafPersist.Butler(args.repo),
+                             SqliteWorkQueue(args.queue, leaseSeconds=args.leaseSeconds),
+                             workerId=args.workerId, idleTimeout=args.idleTimeout)
+    elif args.command == "status":
+        workQueue = SqliteWorkQueue(args.queue)
+        print(", ".join("%d %s" % (count, state) for state, count in workQueue.getCounts().items()))
+        for unit, error in workQueue.getFailures():
+            print("\n%s failed:\n%s" % (unit, error))
+    else:
+        parser.print_usage()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Serve eotest jobs from a queue directory, keeping the tasks warm between jobs, or submit a job to one."""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import time
+
+from lsst.cp.pipe import CpTask, CpService, submitJob, readJobResult
+
+
+def parseConfig(overrides):
+    """Convert NAME=VALUE config overrides to a dict, with the values of the type of their CpTaskConfig field.
+    """
+    fields = CpTask.ConfigClass()._fields
+    config = {}
+    for override in overrides:
+        name, value = override.split('=', 1)
+        fieldType = fields[name].dtype
+        config[name] = value.lower() in ('1', 'true', 'yes') if fieldType is bool else fieldType(value)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command")
+
+    serveParser = subparsers.add_parser("serve", help="Run the jobs submitted to the queue")
+    serveParser.add_argument("queueDir", help="Directory of the job queue")
+    serveParser.add_argument("--config", nargs="*", default=[], metavar="NAME=VALUE",
+                             help="CpTaskConfig overrides for every job, e.g. numProcesses=8")
+    serveParser.add_argument("--maxTasks", type=int, default=4,
+                             help="Number of distinct configs whose tasks are kept (default: %(default)s)")
+    serveParser.add_argument("--poll", type=float, default=1.,
+                             help="Seconds between checks of an empty queue (default: %(default)s)")
+    serveParser.add_argument("--idleTimeout", type=float, help="Stop after this many seconds without a job")
+
+    submitParser = subparsers.add_parser("submit", help="Add a job to the queue")
+    submitParser.add_argument("queueDir", help="Directory of the job queue")
+    submitParser.add_argument("repo", help="Repository containing the eotest data")
+    submitParser.add_argument("--run", help="Run to process, if the repo contains several")
+    submitParser.add_argument("--stages", nargs="+", help="eotest stages to run, e.g. readNoise")
+    submitParser.add_argument("--ccds", nargs="+", help="CCDs to process")
+    submitParser.add_argument("--config", nargs="*", default=[], metavar="NAME=VALUE",
+                              help="CpTaskConfig overrides for this job")
+    submitParser.add_argument("--wait", action="store_true", help="Wait for the job to finish")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        service = CpService(args.queueDir, config=parseConfig(args.config), maxTasks=args.maxTasks)
+        service.serve(pollInterval=args.poll, idleTimeout=args.idleTimeout)
+    elif args.command == "submit":
+        jobId = submitJob(args.queueDir, args.repo, run=args.run, stages=args.stages, ccds=args.ccds,
+                          config=parseConfig(args.config))
+        print("Submitted job %s" % jobId)
+        if args.wait:
+            result = readJobResult(args.queueDir, jobId)
+            while result is None:
+                time.sleep(1.)
+                result = readJobResult(args.queueDir, jobId)
+            print("Job %s %s in %.1f s" % (jobId, result['status'], result['wallTime']))
+            if result['status'] != 'succeeded':
+                print(result['error'])
+                return 1
+    else:
+        parser.print_usage()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
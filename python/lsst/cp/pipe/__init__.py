@@ -24,3 +24,39 @@
 from .version import *   # generated by sconsUtils unless you tell it not to
 from .cpTask import *
 
+from .eotestStages import *
+from .scheduler import *
+from .rawIndex import *
+from .flatPairIndex import *
+from .gainCache import *
+from .manifest import *
+from .resultCache import *
+from .maskRegistry import *
+from .staging import *
+from .exposurePool import *
+from .intermediates import *
+from .instrumentation import *
+from .report import *
+from .service import *
+from .workQueue import *
+from .memoryModel import *
+from .isolation import *
+from .ampImages import *
+from .engineConfigs import *
+
+# The NumPy engines are imported when first used, so that importing the package doesn't import them
+_ENGINE_NAMES = {
+    "ptcEngine": ["NumpyPtcTask", "findFlat2", "measurePairStats", "fitPtc"],
+    "readNoiseEngine": ["NumpyReadNoiseTask", "measureBoxNoise"],
+    "defectEngine": ["stackSegments", "findDefectColumns", "writeMaskFile", "NumpyBrightPixelsTask",
+                     "NumpyDarkPixelsTask"],
+    "cteEngine": ["measureEper", "NumpyCteTask"],
+}
+
+
+def __getattr__(name):
+    for moduleName, names in _ENGINE_NAMES.items():
+        if name in names:
+            import importlib
+            return getattr(importlib.import_module("." + moduleName, __name__), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
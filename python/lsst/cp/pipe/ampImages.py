@@ -0,0 +1,326 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Amplifier geometry and batched pixel statistics for the NumPy implementations of the eotest stages."""
+from __future__ import absolute_import, division, print_function
+
+import re
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ["CHANNEL_IDS", "AmpGeometry", "getAmps", "readAmpGeometry", "getOverscanColumns", "fitRowBias",
+           "fitSerialBias", "readSegmentRows", "readUnbiasedImaging", "readMaskStack", "maskedMean",
+           "maskedVariance"]
+
+# The channel, i.e. segment, name of each amplifier, used by eotest to label its outputs
+CHANNEL_IDS = dict(zip(range(1, 17), ['10', '11', '12', '13', '14', '15', '16', '17',
+                                      '07', '06', '05', '04', '03', '02', '01', '00']))
+
+_SECTION = re.compile(r'\[(\d+):(\d+),(\d+):(\d+)\]')
+
+
+class AmpGeometry(object):
+    """The imaging and overscan regions of an amplifier's segment, as numpy slices of its image.
+
+    The regions are those eotest uses: the imaging region is given by the DATASEC keyword, the serial
+    overscan is the columns after it, over all the rows, and the parallel overscan is the rows above it,
+    over the imaging columns.
+
+    Parameters
+    ----------
+    shape : `tuple` of `int`
+        The (rows, columns) of the segment's image
+    datasec : `str`, optional
+        The imaging region, in FITS notation, e.g. '[11:522,1:2002]'. Defaults to the whole image, with no
+        overscan.
+    """
+
+    def __init__(self, shape, datasec=None):
+        self.shape = tuple(shape)
+        ny, nx = self.shape
+        if datasec:
+            match = _SECTION.match(datasec.replace(' ', ''))
+            if match is None:
+                raise ValueError("Cannot parse image section %s" % datasec)
+            x0, x1, y0, y1 = [int(value) for value in match.groups()]
+            x0, y0 = x0 - 1, y0 - 1
+        else:
+            x0, x1, y0, y1 = 0, nx, 0, ny
+        self.imaging = (slice(y0, y1), slice(x0, x1))
+        self.serialOverscan = (slice(0, ny), slice(x1, nx))
+        self.parallelOverscan = (slice(y1, ny), slice(x0, x1))
+
+    @property
+    def imagingShape(self):
+        """The (rows, columns) of the imaging region."""
+        return (self.imaging[0].stop - self.imaging[0].start, self.imaging[1].stop - self.imaging[1].start)
+
+    @property
+    def hasSerialOverscan(self):
+        """Are there any serial overscan columns?"""
+        return self.serialOverscan[1].stop > self.serialOverscan[1].start
+
+
+def getAmps(path):
+    """Get the amplifiers in a file, which are numbered as their extensions.
+
+    Parameters
+    ----------
+    path : `str`
+        The file
+
+    Returns
+    -------
+    amps : `list` of `int`
+        The amplifiers, at most 16
+    """
+    with fits.open(path) as hdulist:
+        return [hdu for hdu in range(1, min(len(hdulist), 17)) if hdulist[hdu].header.get('NAXIS') == 2]
+
+
+def readAmpGeometry(path, amp=1):
+    """Read the geometry of an amplifier's segment from its header.
+
+    All the segments of a CCD have the same geometry, so that of one serves for the others.
+
+    Parameters
+    ----------
+    path : `str`
+        The file
+    amp : `int`
+        The amplifier, which is also the index of its extension
+
+    Returns
+    -------
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry
+    """
+    header = fits.getheader(path, amp)
+    return AmpGeometry((header['NAXIS2'], header['NAXIS1']), header.get('DATASEC'))
+
+
+def getOverscanColumns(geometry, dxmin=5, dxmax=2):
+    """Get the serial overscan columns from which eotest measures the bias.
+
+    Parameters
+    ----------
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of the segments
+    dxmin, dxmax : `int`
+        Number of overscan columns to leave out at the start and end of each row, if there are enough
+
+    Returns
+    -------
+    columns : `slice` or None
+        The columns, or None if there is no serial overscan
+    """
+    if not geometry.hasSerialOverscan:
+        return None
+    overscan = geometry.serialOverscan[1]
+    first, last = overscan.start + dxmin, overscan.stop - dxmax
+    if last <= first:
+        first, last = overscan.start, overscan.stop
+    return slice(first, last)
+
+
+def fitRowBias(rowMeans, rows, fitOrder=1):
+    """Fit the mean serial overscan of each row by a polynomial in the row number, as eotest does.
+
+    Parameters
+    ----------
+    rowMeans : `numpy.ndarray`
+        The (..., row) mean of the serial overscan of every row of some segments
+    rows : `slice`
+        The rows at which to evaluate the fit
+    fitOrder : `int`
+        Order of the polynomial
+
+    Returns
+    -------
+    bias : `numpy.ndarray`
+        The (..., row) fitted bias level of the rows
+    """
+    rowNumbers = np.arange(rowMeans.shape[-1])
+    coefficients = np.polyfit(rowNumbers, rowMeans.reshape(-1, rowMeans.shape[-1]).T, fitOrder)
+    bias = np.dot(np.vander(rowNumbers[rows], fitOrder + 1), coefficients).T
+    return bias.reshape(rowMeans.shape[:-1] + bias.shape[-1:])
+
+
+def fitSerialBias(images, geometry, dxmin=5, dxmax=2, fitOrder=1):
+    """Fit the bias level of each row of a stack of segments, from their serial overscans.
+
+    As eotest does, the mean of each row of the serial overscan, leaving out the first dxmin and last dxmax
+    columns, is fitted by a polynomial in the row number.
+
+    Parameters
+    ----------
+    images : `numpy.ndarray`
+        The (amp, row, column) images of the whole segments
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        Their geometry
+    dxmin, dxmax : `int`
+        Number of overscan columns to leave out at the start and end of each row
+    fitOrder : `int`
+        Order of the polynomial
+
+    Returns
+    -------
+    bias : `numpy.ndarray`
+        The (amp, row) bias level of the imaging rows, or zeros if there is no serial overscan
+    """
+    rows = geometry.imaging[0]
+    columns = getOverscanColumns(geometry, dxmin, dxmax)
+    if columns is None:
+        return np.zeros((images.shape[0], rows.stop - rows.start))
+    return fitRowBias(images[:, :, columns].mean(axis=2, dtype=np.float64), rows, fitOrder)
+
+
+def readSegmentRows(hdulist, amps, rows, columns):
+    """Read part of the segments of some amplifiers from an open file, decoding them to float32.
+
+    Only the requested rows are read from a memory-mapped file, so large files can be processed in strips.
+
+    Parameters
+    ----------
+    hdulist : `astropy.io.fits.HDUList`
+        The file, opened with do_not_scale_image_data=True
+    amps : `list` of `int`
+        The amplifiers, which are also the indices of their extensions
+    rows, columns : `slice`
+        The part of each segment to read
+
+    Returns
+    -------
+    images : `numpy.ndarray`
+        The float32 (amp, row, column) pixel values
+    """
+    images = None
+    for i, amp in enumerate(amps):
+        hdu = hdulist[amp]
+        data = hdu.data[rows, columns]
+        if images is None:
+            images = np.empty((len(amps),) + data.shape, dtype=np.float32)
+        images[i] = data
+        images[i] *= hdu.header.get('BSCALE', 1)
+        images[i] += hdu.header.get('BZERO', 0)
+    return images
+
+
+def readUnbiasedImaging(pool, path, amps, geometry, fitOrder=1):
+    """Read the bias-subtracted imaging regions of the amplifiers in a file as a single array.
+
+    Parameters
+    ----------
+    pool : `lsst.cp.pipe.ExposurePool`
+        The pool from which to get the decoded, memory-mapped, images
+    path : `str`
+        The file
+    amps : `list` of `int`
+        The amplifiers
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of their segments
+    fitOrder : `int`
+        Order of the polynomial fitted to the serial overscan; see fitSerialBias()
+
+    Returns
+    -------
+    images : `numpy.ndarray`
+        The float32 (amp, row, column) imaging regions
+    """
+    segments = np.stack([pool.getImage(path, amp) for amp in amps])
+    bias = fitSerialBias(segments, geometry, fitOrder=fitOrder)
+    images = segments[(slice(None),) + geometry.imaging].astype(np.float32)
+    images -= bias[:, :, np.newaxis].astype(np.float32)
+    return images
+
+
+def readMaskStack(pool, maskFiles, amps, geometry):
+    """Combine the eotest mask files of a CCD into a single array of masked imaging pixels.
+
+    Parameters
+    ----------
+    pool : `lsst.cp.pipe.ExposurePool`
+        The pool from which to get the mask images
+    maskFiles : iterable of `str`
+        The mask files, whose extensions are the segments of the amplifiers. Any pixel with a mask bit set
+        is masked, as eotest masks with all the planes.
+    amps : `list` of `int`
+        The amplifiers
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of their segments
+
+    Returns
+    -------
+    masked : `numpy.ndarray`
+        The boolean (amp, row, column) array, True where the imaging pixel is masked
+    """
+    masked = np.zeros((len(amps),) + geometry.imagingShape, dtype=bool)
+    for maskFile in maskFiles:
+        for i, amp in enumerate(amps):
+            masked[i] |= pool.getImage(maskFile, amp)[geometry.imaging] != 0
+    return masked
+
+
+def maskedMean(images, masked):
+    """Get the mean of each image of a stack, leaving out the masked and non-finite pixels.
+
+    Parameters
+    ----------
+    images : `numpy.ndarray`
+        The (amp, row, column) images
+    masked : `numpy.ndarray`
+        The boolean (amp, row, column) array of masked pixels
+
+    Returns
+    -------
+    means : `numpy.ndarray`
+        The mean of each image; NaN if no pixels are left
+    """
+    good = ~masked & np.isfinite(images)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(good, images, 0).sum(axis=(1, 2), dtype=np.float64)/good.sum(axis=(1, 2))
+
+
+def maskedVariance(images, masked):
+    """Get the sample variance of each image of a stack, leaving out the masked and non-finite pixels.
+
+    Parameters
+    ----------
+    images : `numpy.ndarray`
+        The (amp, row, column) images
+    masked : `numpy.ndarray`
+        The boolean (amp, row, column) array of masked pixels
+
+    Returns
+    -------
+    variances : `numpy.ndarray`
+        The variance of each image, with N - 1 degrees of freedom as afw's VARIANCE statistic; NaN if fewer
+        than two pixels are left
+    """
+    good = ~masked & np.isfinite(images)
+    nGood = good.sum(axis=(1, 2))
+    means = maskedMean(images, masked)
+    deviations = np.where(good, images - means[:, np.newaxis, np.newaxis].astype(images.dtype), 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.square(deviations, dtype=np.float64).sum(axis=(1, 2))/(nGood - 1)
@@ -0,0 +1,758 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A synthetic TS8 repository, stand-in butler and stub eotest subtasks for benchmarking CpTask.
+
+These let the orchestration done by CpTask, i.e. the planning, scheduling, parallelism, caching and
+bookkeeping around the eotest calls, be timed and its parallel scaling measured without real camera data or
+the cost of the real analyses. The stub subtasks can be given CPU, I/O and memory costs to mimic them.
+Synthetic frames with realistic noise are also provided, on which cp_pipe's NumPy engines for some stages
+can be timed and checked against the eotest tasks they replace. See bin/cpPipeBenchmark.py for a
+command-line driver.
+"""
+from __future__ import absolute_import, division, print_function
+
+import collections
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.pex.config as pexConfig
+import lsst.pipe.base as pipeBase
+
+from .eotestStages import EOTEST_STAGES, getStage
+
+__all__ = ["SYNTHETIC_ACQUISITIONS", "makeSyntheticRepo", "SyntheticButler", "StubEotestConfig",
+           "StubEotestTask", "configureStubSubtasks", "runBenchmark", "measureStartup", "writeSyntheticFrame",
+           "makeSyntheticFlatPairs", "makeSyntheticBiasFrames", "makeSyntheticDefectFrames",
+           "makeSyntheticSuperflats", "makeEngineInputs", "compareEngines"]
+
+# The (testType, imageType) of the acquisitions in a synthetic run, i.e. those read by the eotest stages
+SYNTHETIC_ACQUISITIONS = sorted(set((stage.testType, stage.imageType) for stage in EOTEST_STAGES))
+
+# Run in a fresh interpreter by measureStartup(), with the output path and JSON config overrides as arguments
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.time()
+from lsst.cp.pipe import CpTask
+imported = time.time()
+config = CpTask.ConfigClass()
+config.eotestOutputPath = sys.argv[1]
+for name, value in json.loads(sys.argv[2]).items():
+    setattr(config, name, value)
+config.validate()
+validated = time.time()
+CpTask(config=config)
+constructed = time.time()
+print(json.dumps(dict(importTime=imported - start, configTime=validated - imported,
+                      constructTime=constructed - validated)))
+"""
+
+# The mask files written by the stub subtasks of the stages which make masks, named as eotest names them
+_STUB_MASK_NAMES = {'brightPixels': 'bright_pixel_mask', 'darkPixels': 'dark_pixel_mask',
+                    'traps': 'traps_mask'}
+
+
+class SyntheticButler(object):
+    """A stand-in for the butler of a TS8 repo, providing just what CpTask uses.
+
+    Parameters
+    ----------
+    records : `list` of `dict`
+        The raw data, one dict per file, with keys run, visit, ccd, testType, imageType and filename
+    gainDir : `str`, optional
+        Directory in which the gains are also written, so that butlers in other processes can read them
+    """
+
+    def __init__(self, records, gainDir=None):
+        self.records = list(records)
+        self.gainDir = gainDir
+        self.gains = {}
+        self.nCalls = collections.Counter()
+
+    def queryMetadata(self, datasetType, format, dataId=None, **rest):
+        """Get the distinct values of some keys of the raw data matching a dataId, like the butler."""
+        self.nCalls['queryMetadata'] += 1
+        dataId = dict(dataId or {}, **rest)
+        values = []
+        seen = set()
+        for record in self.records:
+            if all(str(record[key]) == str(value) for key, value in dataId.items()):
+                value = tuple(record[key] for key in format) if len(format) > 1 else record[format[0]]
+                if value not in seen:
+                    seen.add(value)
+                    values.append(value)
+        return values
+
+    def get(self, datasetType, dataId=None, **rest):
+        """Get the raw_filename or eotest_gain dataset for a dataId."""
+        self.nCalls['get'] += 1
+        dataId = dict(dataId or {}, **rest)
+        if datasetType == 'raw_filename':
+            for record in self.records:
+                if str(record['visit']) == str(dataId['visit']) and record['ccd'] == dataId['ccd']:
+                    return [record['filename'] + '[0]']
+        elif datasetType == 'eotest_gain':
+            key = (dataId['ccd'], str(dataId['run']))
+            if key not in self.gains and self.gainDir is not None and os.path.exists(self._getGainFile(key)):
+                with open(self._getGainFile(key), 'rb') as f:
+                    self.gains[key] = pickle.load(f)
+            if key in self.gains:
+                return self.gains[key]
+        raise RuntimeError("No %s dataset found for %s" % (datasetType, dataId))
+
+    def put(self, obj, datasetType, dataId=None, **rest):
+        """Put an eotest_gain dataset."""
+        self.nCalls['put'] += 1
+        dataId = dict(dataId or {}, **rest)
+        if datasetType != 'eotest_gain':
+            raise RuntimeError("SyntheticButler cannot put %s datasets" % datasetType)
+        key = (dataId['ccd'], str(dataId['run']))
+        self.gains[key] = obj
+        if self.gainDir is not None:
+            if not os.path.exists(self.gainDir):
+                os.makedirs(self.gainDir)
+            with open(self._getGainFile(key), 'wb') as f:
+                pickle.dump(obj, f)
+
+    def _getGainFile(self, key):
+        return os.path.join(self.gainDir, 'gain_%s_%s.pickle' % key)
+
+
+def makeSyntheticRepo(root, nCcds=9, visitsPerAcquisition=4, ampShape=(200, 100), nAmps=16, runs=('1234',),
+                      seed=0):
+    """Write synthetic TS8 runs to disk, and make a butler for them.
+
+    Each raw file has an empty primary HDU and one image extension per amplifier, like the TS8 data, and
+    the flats come in flat1/flat2 pairs. The pixel values are random but otherwise meaningless.
+
+    Parameters
+    ----------
+    root : `str`
+        Directory in which to write the data
+    nCcds : `int`
+        Number of CCDs, at most 9 for a raft
+    visitsPerAcquisition : `int`
+        Number of visits of each (testType, imageType) in SYNTHETIC_ACQUISITIONS. There is only ever one
+        pocket-pumped trap visit, as eotest takes just one.
+    ampShape : `tuple` of `int`
+        The (rows, columns) of each amplifier image
+    nAmps : `int`
+        Number of amplifiers per CCD
+    runs : `list` of `str`
+        The run numbers; each run has the same CCDs and acquisitions
+    seed : `int`
+        Seed for the pixel values
+
+    Returns
+    -------
+    butler : `SyntheticButler`
+        A butler for the data
+    """
+    rng = np.random.RandomState(seed)
+    ampImages = [rng.randint(900, 1100, size=ampShape).astype(np.int32) for _ in range(nAmps)]
+    ccds = ['S%d%d' % (i // 3, i % 3) for i in range(nCcds)]
+    records = []
+    visit = 0  # visits are unique across runs, as in a real repo
+    for run in runs:
+        for testType, imageType in SYNTHETIC_ACQUISITIONS:
+            nVisits = 1 if imageType == 'PPUMP' else visitsPerAcquisition
+            for i in range(nVisits):
+                visit += 1
+                for ccd in ccds:
+                    ccdDir = os.path.join(root, 'raw', str(run), ccd)
+                    if not os.path.exists(ccdDir):
+                        os.makedirs(ccdDir)
+                    filename = '%s_%s_%s_%03d' % (ccd, testType, imageType, visit)
+                    if testType == 'FLAT':
+                        filename += '_flat%d' % (i % 2 + 1)
+                    path = os.path.join(ccdDir, filename + '.fits')
+                    # the flats of each pair share an exposure time, and get a little more light than the last
+                    primary = fits.PrimaryHDU()
+                    primary.header['EXPTIME'] = 1. + i // 2
+                    primary.header['MONDIODE'] = 1e-9*(1. + i // 2)
+                    primary.header['IMGTYPE'] = imageType
+                    hdus = [primary]
+                    hdus.extend(fits.ImageHDU(image, name='Segment%02d' % amp)
+                                for amp, image in enumerate(ampImages, 1))
+                    fits.HDUList(hdus).writeto(path, overwrite=True)
+                    records.append(dict(run=str(run), visit=visit, ccd=ccd, testType=testType,
+                                        imageType=imageType, filename=path))
+    gainDir = os.path.join(root, 'gains')
+    if os.path.exists(gainDir):
+        shutil.rmtree(gainDir)  # those of an earlier repo in the same place
+    return SyntheticButler(records, gainDir=gainDir)
+
+
+class StubEotestConfig(pexConfig.Config):
+    """Config for StubEotestTask, with the fields CpTask sets on the eotest configs, and tunable costs."""
+    output_dir = pexConfig.Field(dtype=str, doc="Output directory, set by CpTaskConfig.validate()",
+                                 default='.')
+    temp_set_point = pexConfig.Field(dtype=float, doc="Unused; present because CpTask sets it",
+                                     default=-95.)
+    temp_set_point_tol = pexConfig.Field(dtype=float, doc="Unused; present because CpTask sets it",
+                                         default=1.)
+    stageName = pexConfig.Field(dtype=str, doc="Name of the eotest stage the task stands in for",
+                                default='')
+    cpuSeconds = pexConfig.Field(dtype=float, doc="CPU time to burn per call", default=0.)
+    readInputs = pexConfig.Field(dtype=bool, doc="Read every input file in full?", default=True)
+    memoryBytes = pexConfig.Field(dtype=int, doc="Memory to allocate and touch during each call",
+                                  default=0)
+    intermediateBytes = pexConfig.Field(dtype=int, doc="Size of the medianed intermediate file to write",
+                                        default=0)
+    failCcds = pexConfig.ListField(dtype=str, doc="CCDs on which to raise, to mimic a bad input file",
+                                   default=[])
+    hangCcds = pexConfig.ListField(dtype=str, doc="CCDs on which to hang, to mimic a fit which never "
+                                   "converges", default=[])
+
+
+class StubEotestTask(pipeBase.Task):
+    """A stand-in for an eotest subtask, with tunable costs and eotest-like outputs.
+
+    Like the eotest tasks, it updates the sensor's results file, writes the stage's mask file, if any, and
+    a medianed intermediate file, and for Fe55 returns the gains.
+    """
+    ConfigClass = StubEotestConfig
+    _DefaultName = "stubEotest"
+
+    def run(self, sensor_id, *args, **kwargs):
+        """Read the inputs, use the configured CPU and memory, and write the outputs.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        *args, **kwargs
+            The input files and options, as passed by CpTask. Lists of files, or a single file for the
+            traps stage, are read; the mask files and everything else are ignored.
+
+        Returns
+        -------
+        gains : `dict` or None
+            Gain of each amplifier, for the fe55 stage only
+        """
+        if sensor_id in self.config.failCcds:
+            raise RuntimeError("Stub %s task failing on %s, as configured" %
+                               (self.config.stageName, sensor_id))
+        while sensor_id in self.config.hangCcds:
+            time.sleep(1.)
+
+        inputs = []
+        for value in list(args) + [value for key, value in kwargs.items() if key != 'mask_files']:
+            if isinstance(value, str) and value.endswith(('.fits', '.fits.gz')):
+                inputs.append(value)
+            elif isinstance(value, (list, tuple)) and value and isinstance(value[0], str):
+                inputs.extend(path for path in value if path.endswith(('.fits', '.fits.gz')))
+        if self.config.readInputs:
+            for path in inputs:
+                with open(path, 'rb') as f:
+                    while f.read(1 << 20):
+                        pass
+
+        scratch = None
+        if self.config.memoryBytes > 0:
+            scratch = np.ones(self.config.memoryBytes // 8)
+        end = time.process_time() + self.config.cpuSeconds
+        while time.process_time() < end:
+            if scratch is not None:
+                scratch[::512] += 1.
+            else:
+                sum(range(1000))
+        del scratch
+
+        outputDir = self.config.output_dir
+        resultsPath = os.path.join(outputDir, '%s_eotest_results.json' % sensor_id)
+        results = {}
+        if os.path.exists(resultsPath):
+            with open(resultsPath) as f:
+                results = json.load(f)
+        results[self.config.stageName] = dict(nInputs=len(inputs),
+                                              nMaskFiles=len(kwargs.get('mask_files', ())))
+        with open(resultsPath, 'w') as f:
+            json.dump(results, f)
+        maskName = _STUB_MASK_NAMES.get(self.config.stageName)
+        if maskName is not None:
+            with open(os.path.join(outputDir, '%s_%s.fits' % (sensor_id, maskName)), 'w') as f:
+                f.write(self.config.stageName)
+        if self.config.intermediateBytes > 0:
+            with open(os.path.join(outputDir, '%s_median_%s.fits' % (sensor_id, self.config.stageName)),
+                      'wb') as f:
+                f.write(b'\0'*self.config.intermediateBytes)
+        if self.config.stageName == 'fe55':
+            return dict((amp, 1.) for amp in range(1, 17))
+        return None
+
+
+def configureStubSubtasks(config, cpuSeconds=0., readInputs=True, memoryBytes=0, intermediateBytes=0):
+    """Retarget all the eotest subtasks of a CpTaskConfig to StubEotestTask.
+
+    This must be done before the CpTask is constructed. The costs can afterwards be adjusted per stage
+    through e.g. config.ptc.cpuSeconds.
+
+    Parameters
+    ----------
+    config : `lsst.cp.pipe.CpTaskConfig`
+        The config to modify
+    cpuSeconds : `float`
+        CPU time to burn per (stage, ccd)
+    readInputs : `bool`
+        Read every input file in full?
+    memoryBytes : `int`
+        Memory to allocate and touch per (stage, ccd)
+    intermediateBytes : `int`
+        Size of the medianed intermediate file written per (stage, ccd)
+    """
+    for stage in EOTEST_STAGES:
+        getattr(config, stage.name).retarget(StubEotestTask)
+        stubConfig = getattr(config, stage.name)
+        stubConfig.stageName = stage.name
+        stubConfig.cpuSeconds = cpuSeconds
+        stubConfig.readInputs = readInputs
+        stubConfig.memoryBytes = memoryBytes
+        stubConfig.intermediateBytes = intermediateBytes
+
+
+def runBenchmark(taskClass, config, butler, doReport=False):
+    """Run CpTask on a butler, timing it end to end and per stage.
+
+    If the repo has several runs they are all processed with runEotestBatch(), otherwise runEotestDirect()
+    is used.
+
+    Parameters
+    ----------
+    taskClass : `type`
+        The task to run, normally `lsst.cp.pipe.CpTask`
+    config : `lsst.cp.pipe.CpTaskConfig`
+        Its config. eotestOutputPath should be empty or not yet exist, so that nothing is reused from an
+        earlier benchmark.
+    butler : `SyntheticButler` or `lsst.daf.persistence.Butler`
+        The butler of the data
+    doReport : `bool`
+        Also run and time makeEotestReport()? This needs eotest's plotting code and results files it can
+        read, so with the stub subtasks only the per-CCD overhead around the plotting is meaningful.
+
+    Returns
+    -------
+    timings : `lsst.pipe.base.Struct`
+        - ``runTime``: wall time of runEotestDirect() or runEotestBatch() (`float`)
+        - ``reportTime``: wall time of makeEotestReport(), or None (`float`)
+        - ``stageTimes``: summed wall time of the units of each stage (`dict`)
+        - ``unitTime``: summed wall time of all the units (`float`)
+        - ``overhead``: the part of runTime not spent in the units, for a serial run, or the
+          part of runTime times numProcesses not spent in the units, for a parallel one (`float`)
+        - ``efficiency``: unitTime/(runTime*numProcesses) (`float`)
+    """
+    task = taskClass(config=config)
+    start = time.time()
+    if len(butler.queryMetadata('raw', ['run'])) > 1:
+        task.runEotestBatch(butler)
+    else:
+        task.runEotestDirect(butler)
+    runTime = time.time() - start
+
+    reportTime = None
+    if doReport:
+        start = time.time()
+        task.makeEotestReport(butler)
+        reportTime = time.time() - start
+
+    stageTimes = collections.defaultdict(float)
+    timelinePath = os.path.join(config.eotestOutputPath, 'eotestTimeline.json')
+    if os.path.exists(timelinePath):
+        with open(timelinePath) as f:
+            for event in json.load(f)['traceEvents']:
+                stageTimes[event['cat']] += event['dur']/1e6
+    unitTime = sum(stageTimes.values())
+    nProcesses = max(config.numProcesses, 1)
+    return pipeBase.Struct(runTime=runTime, reportTime=reportTime, stageTimes=dict(stageTimes),
+                           unitTime=unitTime, overhead=runTime*nProcesses - unitTime,
+                           efficiency=unitTime/(runTime*nProcesses) if runTime > 0 else 0.)
+
+
+def measureStartup(configOverrides=None, nRepeats=3, outputPath='/tmp/cpPipeStartup'):
+    """Time the startup of CpTask: importing lsst.cp.pipe, making and validating its config, and
+    constructing the task.
+
+    Each repeat is made in a fresh interpreter, so that the import is really done, and the median of each
+    time over the repeats is returned.
+
+    Parameters
+    ----------
+    configOverrides : `dict`, optional
+        CpTaskConfig fields to set, e.g. {'doFe55': False}
+    nRepeats : `int`
+        Number of times to start up
+    outputPath : `str`
+        Value for config.eotestOutputPath; nothing is written there
+
+    Returns
+    -------
+    timings : `lsst.pipe.base.Struct`
+        - ``importTime``: seconds to import lsst.cp.pipe, and with it eotest (`float`)
+        - ``configTime``: seconds to make and validate the config (`float`)
+        - ``constructTime``: seconds to construct the task and its subtasks (`float`)
+    """
+    results = []
+    for _ in range(nRepeats):
+        output = subprocess.check_output([sys.executable, '-c', _STARTUP_SCRIPT, outputPath,
+                                          json.dumps(configOverrides or {})], stderr=subprocess.PIPE)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return pipeBase.Struct(**dict((name, sorted(result[name] for result in results)[len(results)//2])
+                                  for name in ('importTime', 'configTime', 'constructTime')))
+
+
+def _deferCharge(charge, lastRow, nTransfers, cti, nTrailing=3):
+    """Move the charge which charge transfer inefficiency defers out of the last row of an image, read out
+    along its first axis, into the rows after it.
+
+    Each electron is left behind in a transfer with probability cti, so the number of rows by which it
+    trails is binomially distributed.
+    """
+    coefficient = 1.
+    for k in range(1, min(nTrailing, charge.shape[0] - lastRow - 1) + 1):
+        coefficient *= (nTransfers - k + 1)/k
+        charge[lastRow + k] += charge[lastRow]*coefficient*cti**k*(1 - cti)**(nTransfers - k)
+    charge[lastRow] *= (1 - cti)**nTransfers
+
+
+def writeSyntheticFrame(path, electrons, rng, gain=1.5, readNoise=5., bias=1000., nAmps=16,
+                        imagingShape=(200, 100), prescan=3, serialOverscan=20, parallelOverscan=10,
+                        header=None, serialCti=0., parallelCti=0.):
+    """Write a synthetic TS8 frame with realistic noise, for checking the NumPy engines against eotest.
+
+    Each segment has a prescan, the imaging region, given by DATASEC, and serial and parallel overscans. The
+    imaging pixels get Poisson-distributed charge, and every pixel a bias level and Gaussian read noise.
+
+    Parameters
+    ----------
+    path : `str`
+        The file to write
+    electrons : `float` or `numpy.ndarray`
+        Mean charge of the imaging pixels, in electrons, or an array of the imaging shape giving that of each
+        pixel; 0 for a bias frame
+    rng : `numpy.random.RandomState`
+        The random number generator
+    gain : `float`
+        Gain, in electrons per ADU
+    readNoise : `float`
+        Read noise, in electrons
+    bias : `float`
+        Bias level, in ADU
+    nAmps : `int`
+        Number of amplifiers
+    imagingShape : `tuple` of `int`
+        The (rows, columns) of the imaging region of each amplifier
+    prescan, serialOverscan, parallelOverscan : `int`
+        Number of prescan and serial overscan columns, and of parallel overscan rows
+    header : `dict`, optional
+        Keywords for the primary header, e.g. EXPTIME
+    serialCti, parallelCti : `float`
+        Charge transfer inefficiency to inject, as the fraction of the charge left behind in each transfer.
+        Only the charge deferred out of the last imaging column and row is modelled, into the first
+        overscan columns and rows, which is what an EPER measurement sees.
+
+    Returns
+    -------
+    path : `str`
+        The file written
+    """
+    ny, nx = imagingShape
+    shape = (ny + parallelOverscan, prescan + nx + serialOverscan)
+    primary = fits.PrimaryHDU()
+    for key, value in (header or {}).items():
+        primary.header[key] = value
+    hdus = [primary]
+    for amp in range(1, nAmps + 1):
+        charge = np.zeros(shape)
+        if np.any(np.asarray(electrons) > 0):
+            charge[:ny, prescan:prescan + nx] = rng.poisson(electrons, size=imagingShape)
+        if parallelCti > 0:
+            _deferCharge(charge, ny - 1, ny, parallelCti)
+        if serialCti > 0:
+            _deferCharge(charge.T, prescan + nx - 1, prescan + nx, serialCti)
+        image = bias + (charge + rng.normal(0., readNoise, size=shape))/gain
+        hdu = fits.ImageHDU(np.round(image).astype(np.int32), name='Segment%02d' % amp)
+        hdu.header['DATASEC'] = '[%d:%d,%d:%d]' % (prescan + 1, prescan + nx, 1, ny)
+        hdus.append(hdu)
+    fits.HDUList(hdus).writeto(path, overwrite=True)
+    return path
+
+
+def makeSyntheticFlatPairs(directory, sensorId='S00', exposureTimes=(1., 2., 4., 8., 16., 32.), flux=1000.,
+                           seed=0, **frameArgs):
+    """Write synthetic flat pairs, named as by the TS8 data acquisition system.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory in which to write the files
+    sensorId : `str`
+        Name of the CCD, used in the filenames
+    exposureTimes : `list` of `float`
+        The exposure time of each pair, in seconds
+    flux : `float`
+        Charge per pixel per second, in electrons
+    seed : `int`
+        Seed for the pixel values
+    **frameArgs
+        Further arguments for writeSyntheticFrame(), e.g. gain
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The files written
+    """
+    rng = np.random.RandomState(seed)
+    photodiode = 1e-9*flux  # a nominal photodiode current, proportional to the flux
+    paths = []
+    for exptime in exposureTimes:
+        for pair in (1, 2):
+            path = os.path.join(directory, '%s_flat_%07.2fs_flat%d.fits' % (sensorId, exptime, pair))
+            paths.append(writeSyntheticFrame(path, flux*exptime, rng, header=dict(EXPTIME=exptime,
+                                                                                  MONDIODE=photodiode,
+                                                                                  IMGTYPE='FLAT'),
+                                             **frameArgs))
+    return paths
+
+
+def makeSyntheticBiasFrames(directory, sensorId='S00', nFrames=5, seed=0, **frameArgs):
+    """Write synthetic bias frames, named as by the TS8 data acquisition system.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory in which to write the files
+    sensorId : `str`
+        Name of the CCD, used in the filenames
+    nFrames : `int`
+        Number of frames
+    seed : `int`
+        Seed for the pixel values
+    **frameArgs
+        Further arguments for writeSyntheticFrame(), e.g. readNoise
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The files written
+    """
+    rng = np.random.RandomState(seed)
+    return [writeSyntheticFrame(os.path.join(directory, '%s_fe55_bias_%03d.fits' % (sensorId, i)), 0., rng,
+                                header=dict(EXPTIME=0., IMGTYPE='BIAS'), **frameArgs)
+            for i in range(nFrames)]
+
+
+def makeSyntheticDefectFrames(directory, kind, sensorId='S00', nFrames=5, level=1000., defectLevel=0.,
+                               defectPixels=((10, 20), (50, 70)), defectColumns=(40,), exptime=500., seed=0,
+                               **frameArgs):
+    """Write synthetic darks or superflats with defective pixels and columns in every amplifier.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory in which to write the files
+    kind : `str`
+        'dark' or 'sflat', used in the filenames
+    sensorId : `str`
+        Name of the CCD, used in the filenames
+    nFrames : `int`
+        Number of frames
+    level : `float`
+        Mean charge of the good imaging pixels, in electrons
+    defectLevel : `float`
+        Mean charge of the defective pixels and columns, in electrons
+    defectPixels : `list` of `tuple`
+        The (row, column) of each defective pixel in the imaging region
+    defectColumns : `list` of `int`
+        The defective columns of the imaging region
+    exptime : `float`
+        Exposure time, in seconds
+    seed : `int`
+        Seed for the pixel values
+    **frameArgs
+        Further arguments for writeSyntheticFrame(), e.g. imagingShape
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The files written
+    """
+    rng = np.random.RandomState(seed)
+    electrons = np.full(frameArgs.get('imagingShape', (200, 100)), float(level))
+    for row, column in defectPixels:
+        electrons[row, column] = defectLevel
+    electrons[:, list(defectColumns)] = defectLevel
+    imageType = 'DARK' if kind == 'dark' else 'FLAT'
+    return [writeSyntheticFrame(os.path.join(directory, '%s_%s_%03d.fits' % (sensorId, kind, i)), electrons,
+                                rng, header=dict(EXPTIME=exptime, IMGTYPE=imageType), **frameArgs)
+            for i in range(nFrames)]
+
+
+def makeSyntheticSuperflats(directory, sensorId='S00', nFrames=5, level=2e4, seed=0, **frameArgs):
+    """Write synthetic superflats, e.g. with injected charge transfer inefficiency.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory in which to write the files
+    sensorId : `str`
+        Name of the CCD, used in the filenames
+    nFrames : `int`
+        Number of frames
+    level : `float`
+        Mean charge of the imaging pixels, in electrons
+    seed : `int`
+        Seed for the pixel values
+    **frameArgs
+        Further arguments for writeSyntheticFrame(), e.g. serialCti and parallelCti
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The files written
+    """
+    rng = np.random.RandomState(seed)
+    return [writeSyntheticFrame(os.path.join(directory, '%s_superflat_500_%03d.fits' % (sensorId, i)), level,
+                                rng, header=dict(EXPTIME=50., IMGTYPE='FLAT'), **frameArgs)
+            for i in range(nFrames)]
+
+
+def makeEngineInputs(stageName, directory, sensorId='S00', **kwargs):
+    """Write synthetic inputs for a stage with a NumPy engine, and get the arguments for running it.
+
+    Parameters
+    ----------
+    stageName : `str`
+        The stage, e.g. 'ptc'
+    directory : `str`
+        Directory in which to write the inputs
+    sensorId : `str`
+        Name of the CCD
+    **kwargs
+        Further arguments for the function writing the inputs, e.g. makeSyntheticFlatPairs(),
+        makeSyntheticBiasFrames(), makeSyntheticDefectFrames() or makeSyntheticSuperflats()
+
+    Returns
+    -------
+    runArgs : `dict`
+        Keyword arguments for the run() methods of the stage's eotest task and NumPy engine
+    """
+    if stageName == 'ptc':
+        return dict(sensor_id=sensorId, infiles=makeSyntheticFlatPairs(directory, sensorId, **kwargs),
+                    mask_files=(), gains=dict((amp, 1.) for amp in range(1, 17)))
+    if stageName == 'readNoise':
+        gain = kwargs.get('gain', 1.5)
+        return dict(sensor_id=sensorId, bias_files=makeSyntheticBiasFrames(directory, sensorId, **kwargs),
+                    mask_files=(), gains=dict((amp, gain) for amp in range(1, kwargs.get('nAmps', 16) + 1)))
+    if stageName == 'brightPixels':
+        # a dark current of 0.01 e-/s, with bright pixels and columns of 20 e-/s
+        gain = kwargs.get('gain', 1.5)
+        kwargs = dict(dict(level=5., defectLevel=1e4, exptime=500.), **kwargs)
+        return dict(sensor_id=sensorId, dark_files=makeSyntheticDefectFrames(directory, 'dark', sensorId,
+                                                                             **kwargs),
+                    mask_files=(), gains=dict((amp, gain) for amp in range(1, kwargs.get('nAmps', 16) + 1)))
+    if stageName == 'darkPixels':
+        # superflats with dark pixels and columns at half the level
+        kwargs = dict(dict(level=1e4, defectLevel=5e3), **kwargs)
+        return dict(sensor_id=sensorId, sflat_files=makeSyntheticDefectFrames(directory, 'sflat', sensorId,
+                                                                              **kwargs),
+                    mask_files=())
+    if stageName == 'cte':
+        kwargs = dict(dict(serialCti=5e-5, parallelCti=2e-5), **kwargs)
+        return dict(sensor_id=sensorId,
+                    superflat_files=makeSyntheticSuperflats(directory, sensorId, **kwargs), mask_files=())
+    raise RuntimeError("No synthetic inputs for stage %s" % stageName)
+
+
+def _readAmpResults(path):
+    """Read the per-amplifier columns of an eotest results file."""
+    with fits.open(path) as hdulist:
+        data = hdulist['AMPLIFIER_RESULTS'].data
+        return dict((name, np.array(data[name])) for name in data.names)
+
+
+def compareEngines(stageName, config, runArgs, outputRoot):
+    """Run the eotest task of a stage and cp_pipe's NumPy engine for it on the same inputs, timing both and
+    comparing their results.
+
+    Parameters
+    ----------
+    stageName : `str`
+        The stage, which must have a NumPy engine, e.g. 'ptc'
+    config : `lsst.cp.pipe.CpTaskConfig`
+        Config holding the configs of both tasks; it is not modified
+    runArgs : `dict`
+        Keyword arguments for their run() methods, e.g. from makeEngineInputs()
+    outputRoot : `str`
+        Directory in which to make an output directory for each task
+
+    Returns
+    -------
+    comparison : `lsst.pipe.base.Struct`
+        - ``eotestTime``: wall time of the eotest task's run() (`float`)
+        - ``numpyTime``: wall time of the NumPy engine's run() (`float`)
+        - ``differences``: the largest relative difference of each column in the engine's TOLERANCES
+          (`dict`)
+        - ``tolerances``: the engine's TOLERANCES (`dict`)
+        - ``withinTolerance``: are all the differences within the tolerances? (`bool`)
+    """
+    stage = getStage(stageName)
+    if stage.numpyField is None:
+        raise RuntimeError("Stage %s has no NumPy engine" % stageName)
+    times = {}
+    results = {}
+    tolerances = {}
+    for engine, field in (('eotest', stage.name), ('numpy', stage.numpyField)):
+        outputDir = os.path.join(outputRoot, engine)
+        if not os.path.exists(outputDir):
+            os.makedirs(outputDir)
+        subtaskConfig = getattr(config, field)
+        taskConfig = type(subtaskConfig.value)()
+        taskConfig.update(**subtaskConfig.toDict())
+        taskConfig.output_dir = outputDir
+        task = subtaskConfig.target(config=taskConfig)
+        tolerances = getattr(task, 'TOLERANCES', tolerances)
+        start = time.time()
+        task.run(**runArgs)
+        times[engine] = time.time() - start
+        results[engine] = _readAmpResults(os.path.join(outputDir,
+                                                       '%s_eotest_results.fits' % runArgs['sensor_id']))
+
+    differences = {}
+    for column in tolerances:
+        expected, measured = results['eotest'][column], results['numpy'][column]
+        scale = np.maximum(np.abs(expected), np.finfo(np.float32).tiny)
+        relative = np.abs(measured - expected)/scale
+        relative[np.isnan(measured) & np.isnan(expected)] = 0.  # e.g. the noise of a bad fit, in both
+        differences[column] = float(np.max(relative))
+    return pipeBase.Struct(eotestTime=times['eotest'], numpyTime=times['numpy'], differences=differences,
+                           tolerances=dict(tolerances),
+                           withinTolerance=all(differences[column] <= tolerances[column]
+                                               for column in differences))
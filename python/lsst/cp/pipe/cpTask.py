@@ -25,14 +25,110 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+import fnmatch
 import glob
+import importlib
+import json
+import multiprocessing
+import queue
+import socket
 import sys
+import time
+import traceback
 
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import lsst.log as lsstLog
 import lsst.eotest.sensor as sensorTest
 
+from .engineConfigs import NumpyPtcConfig, NumpyReadNoiseConfig, NumpyBrightPixelsConfig, \
+    NumpyDarkPixelsConfig, NumpyCteConfig
+from .eotestStages import EOTEST_STAGES, getStage
+from .exposurePool import ExposurePool
+from .instrumentation import Timeline, measureCall, profileCall, summarizeProfiles
+from .isolation import IsolatedCall, waitForCalls
+from .intermediates import IntermediateTracker, getDirectorySize, _MEDIAN_FILE_PATTERN
+from .gainCache import GainCache
+from .manifest import CompletionManifest, getFileSignature
+from .maskRegistry import MaskRegistry
+from .memoryModel import MemoryModel
+from .resultCache import ResultCache, hashFile
+from .rawIndex import RawFilenameIndex
+from .flatPairIndex import FlatPairIndex
+from .report import makeCcdReport, _initReportWorker
+from .scheduler import WorkUnit, StageScheduler
+from .staging import InputStager
+from .workQueue import _keepLeased
+
+# The task whose subtasks are run by the worker processes. This is set by the parent immediately before the
+# pool is created so that forked workers inherit it, rather than having to pickle the task and its subtasks.
+_poolTask = None
+
+# the workers inherit _poolTask, so must be forked whatever the platform's default start method is
+_forkContext = multiprocessing.get_context('fork')
+
+
+class _EngineTarget(object):
+    """The target of the config field of a NumPy engine, which imports the engine's module only when the task
+    is made, i.e. only if config.<stage>Engine selects it.
+
+    Parameters
+    ----------
+    moduleName : `str`
+        Name of the engine's module within lsst.cp.pipe
+    name : `str`
+        Name of the engine's task class
+    ConfigClass : `lsst.pex.config.Config`-type
+        The task's config class, which pex_config needs before the task itself
+    """
+
+    def __init__(self, moduleName, name, ConfigClass):
+        # pex_config saves a retargeted field by these
+        self.__module__ = 'lsst.cp.pipe.' + moduleName
+        self.__name__ = name
+        self.ConfigClass = ConfigClass
+
+    def __call__(self, *args, **kwargs):
+        return getattr(importlib.import_module(self.__module__), self.__name__)(*args, **kwargs)
+
+# the per-sensor results file, which each stage updates
+_RESULTS_FILE_PATTERN = '*_eotest_results.fits'
+
+# the statistics of the pools of decoded images which are summed over the units of a run
+_EXPOSURE_POOL_STATS = ('hits', 'misses', 'evictions')
+
+
+def _runSubtaskInWorker(args):
+    """Run one eotest subtask on one CCD inside a pool worker process.
+
+    Parameters
+    ----------
+    args : `tuple` of (`str`, `str`, `dict`, `str`)
+        The name of the subtask, the run being processed, the keyword arguments for the subtask's run()
+        method, and the file to which to write its profile, or None to not profile it.
+
+    Returns
+    -------
+    result : `object`
+        Whatever the subtask's run() method returned.
+    measurements : `dict`
+        The resources used by the subtask, from measureCall().
+    """
+    taskName, run, kwargs, profilePath = args
+    return _poolTask._callSubtask(taskName, run, kwargs, profilePath)
+
+
+def _initPoolWorker(task):
+    """Set the task whose subtasks are run by a worker of a long-lived pool; see CpTask.startWorkerPool().
+
+    Parameters
+    ----------
+    task : `lsst.cp.pipe.CpTask`
+        The task, inherited by the forked worker rather than pickled.
+    """
+    global _poolTask
+    _poolTask = task
+
 
 class CpTaskConfig(pexConfig.Config):
     """Config class for the calibration products production (CP) task."""
@@ -55,6 +151,20 @@ class CpTaskConfig(pexConfig.Config):
         doc="Measure the read-noise?",
         default=True,
     )
+    readNoiseEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Implementation of the read noise analysis to run.",
+        allowed={
+            "eotest": "eotest's ReadNoiseTask, configured by readNoise",
+            "numpy": "cp_pipe's NumpyReadNoiseTask, batched over the bias frames and amplifiers, "
+                     "configured by readNoiseNumpy",
+        },
+        default="eotest",
+    )
+    readNoiseNumpy = pexConfig.ConfigurableField(
+        target=_EngineTarget('readNoiseEngine', 'NumpyReadNoiseTask', NumpyReadNoiseConfig),
+        doc="The NumPy read noise task, run instead of readNoise if readNoiseEngine is 'numpy'.",
+    )
     brightPixels = pexConfig.ConfigurableField(
         target=sensorTest.BrightPixelsTask,
         doc="The bright pixel/column finding task.",
@@ -64,6 +174,20 @@ class CpTaskConfig(pexConfig.Config):
         doc="Find bright pixels?",
         default=True,
     )
+    brightPixelsEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Implementation of the bright pixel finding to run.",
+        allowed={
+            "eotest": "eotest's BrightPixelsTask, configured by brightPixels",
+            "numpy": "cp_pipe's NumpyBrightPixelsTask, stacking the darks in memory a strip of rows at a "
+                     "time, configured by brightPixelsNumpy",
+        },
+        default="eotest",
+    )
+    brightPixelsNumpy = pexConfig.ConfigurableField(
+        target=_EngineTarget('defectEngine', 'NumpyBrightPixelsTask', NumpyBrightPixelsConfig),
+        doc="The NumPy bright pixel task, run instead of brightPixels if brightPixelsEngine is 'numpy'.",
+    )
     darkPixels = pexConfig.ConfigurableField(
         target=sensorTest.DarkPixelsTask,
         doc="The dark pixel/column finding task.",
@@ -73,6 +197,20 @@ class CpTaskConfig(pexConfig.Config):
         doc="Find dark pixels?",
         default=True,
     )
+    darkPixelsEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Implementation of the dark pixel finding to run.",
+        allowed={
+            "eotest": "eotest's DarkPixelsTask, configured by darkPixels",
+            "numpy": "cp_pipe's NumpyDarkPixelsTask, stacking the superflats in memory a strip of rows at a "
+                     "time, configured by darkPixelsNumpy",
+        },
+        default="eotest",
+    )
+    darkPixelsNumpy = pexConfig.ConfigurableField(
+        target=_EngineTarget('defectEngine', 'NumpyDarkPixelsTask', NumpyDarkPixelsConfig),
+        doc="The NumPy dark pixel task, run instead of darkPixels if darkPixelsEngine is 'numpy'.",
+    )
     traps = pexConfig.ConfigurableField(
         target=sensorTest.TrapTask,
         doc="The trap-finding task.",
@@ -91,6 +229,20 @@ class CpTaskConfig(pexConfig.Config):
         doc="Measure the charge transfer efficiency?",
         default=True,
     )
+    cteEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Implementation of the charge transfer efficiency analysis to run.",
+        allowed={
+            "eotest": "eotest's CteTask, configured by cte",
+            "numpy": "cp_pipe's NumpyCteTask, vectorized over the superflats and amplifiers, configured by "
+                     "cteNumpy",
+        },
+        default="eotest",
+    )
+    cteNumpy = pexConfig.ConfigurableField(
+        target=_EngineTarget('cteEngine', 'NumpyCteTask', NumpyCteConfig),
+        doc="The NumPy CTE analysis task, run instead of cte if cteEngine is 'numpy'.",
+    )
     ptc = pexConfig.ConfigurableField(
         target=sensorTest.PtcTask,
         doc="The PTC analysis task.",
@@ -100,6 +252,19 @@ class CpTaskConfig(pexConfig.Config):
         doc="Measure the photon transfer curve?",
         default=True,
     )
+    ptcEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="Implementation of the photon transfer curve analysis to run.",
+        allowed={
+            "eotest": "eotest's PtcTask, configured by ptc",
+            "numpy": "cp_pipe's NumpyPtcTask, vectorized over the amplifiers, configured by ptcNumpy",
+        },
+        default="eotest",
+    )
+    ptcNumpy = pexConfig.ConfigurableField(
+        target=_EngineTarget('ptcEngine', 'NumpyPtcTask', NumpyPtcConfig),
+        doc="The NumPy PTC analysis task, run instead of ptc if ptcEngine is 'numpy'.",
+    )
     flatPair = pexConfig.ConfigurableField(
         target=sensorTest.FlatPairTask,
         doc="The flat-pair analysis task.",
@@ -123,10 +288,162 @@ class CpTaskConfig(pexConfig.Config):
     flatPairMaxPdFracDev = pexConfig.Field(
         dtype=float,
         doc="Maximum allowed fractional deviation between photodiode currents for the eotest flatPair task. "
-        "This value is passed to the task's run() method at runtime rather than being stored in the task's"
-        "own pexConfig field.",
+        "This value is passed to the task's run() method at runtime rather than being stored in the task's "
+        "own pexConfig field. Pairs deviating by more are also left out of the inputs of both the flatPair "
+        "and PTC tasks.",
         default=0.05,
     )
+    numProcesses = pexConfig.Field(
+        dtype=int,
+        doc="Number of worker processes used to run the per-CCD part of each eotest stage in parallel. "
+        "The eotest tasks are CPU-bound, so separate processes are used rather than threads. A value of 1 "
+        "runs everything serially in the calling process.",
+        default=1,
+    )
+    reuseRawFilenameIndex = pexConfig.Field(
+        dtype=bool,
+        doc="Reuse the index of raw filenames saved in eotestOutputPath by a previous run of the same run "
+        "number, rather than scanning the butler registry again? The index is still checked against one "
+        "registry query, and rebuilt if data has been ingested, or removed, since it was made.",
+        default=True,
+    )
+    resume = pexConfig.Field(
+        dtype=bool,
+        doc="Resume an earlier run into the same eotestOutputPath? Each (stage, ccd) which completes is "
+        "recorded in a manifest in eotestOutputPath, along with its input files, mask files, gains and "
+        "subtask config. If True, those which are recorded as complete, with the same inputs and with their "
+        "outputs still present, are not rerun.",
+        default=False,
+    )
+    resultCacheDir = pexConfig.Field(
+        dtype=str,
+        doc="Directory of a cache of stage outputs which can be shared between runs, e.g. by several "
+        "operators processing the same data with the same config into different output paths. The outputs "
+        "of a (stage, ccd) whose input files, mask files, gains and subtask config match a cached entry are "
+        "taken from the cache rather than recomputed. Leave empty to disable the cache.",
+        default='',
+    )
+    resultCacheMaxBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum size of the result cache in bytes, beyond which the least recently used entries are "
+        "evicted.",
+        default=100*1024**3,
+    )
+    resultCacheLink = pexConfig.Field(
+        dtype=bool,
+        doc="Hard-link outputs from the result cache into eotestOutputPath rather than copying them? The "
+        "per-sensor results file, which later stages update, is always copied.",
+        default=False,
+    )
+    stagingDir = pexConfig.Field(
+        dtype=str,
+        doc="Fast local scratch directory into which the raw inputs are copied before being processed, so "
+        "that files used by several stages are only read from the shared filesystem once. Leave empty to "
+        "read the inputs in place.",
+        default='',
+    )
+    stagingMaxBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum total size of the files staged in stagingDir, beyond which the least recently used ones "
+        "not currently in use are removed.",
+        default=50*1024**3,
+    )
+    stagingReadAhead = pexConfig.Field(
+        dtype=int,
+        doc="Number of upcoming (stage, ccd) units whose inputs are staged in the background while the "
+        "current ones run.",
+        default=2,
+    )
+    stagingDecompress = pexConfig.Field(
+        dtype=bool,
+        doc="Decompress gzipped inputs when staging them?",
+        default=False,
+    )
+    exposurePoolMaxBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum size in bytes of the pool of decoded amplifier images kept in each process. Only the "
+        "NumPy engines use it, for the mask files, which every later stage of a CCD reads, and for the "
+        "flats of the NumPy PTC engine; eotest's tasks, including FlatPairTask, and the NumPy defect and "
+        "CTE engines, which read the frames a strip at a time, don't. The least recently used images are "
+        "dropped beyond this. Set to 0 to disable the pool. If memoryBudgetBytes is set, the pools of the "
+        "numProcesses processes are also limited to half of it.",
+        default=4*1024**3,
+    )
+    diskQuotaBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum number of bytes in eotestOutputPath. While it holds more than this, no new (stage, ccd) "
+        "units are started until the running ones finish and their intermediate files are deleted. Set to 0 "
+        "for no limit.",
+        default=0,
+    )
+    memoryBudgetBytes = pexConfig.Field(
+        dtype=int,
+        doc="Memory in bytes available to the (stage, ccd) units running at once. A unit is only started if "
+        "the estimated peak memory of the running units, including it, stays within this, so light stages "
+        "run side by side while heavy ones are throttled; a unit is always started if nothing else is "
+        "running. The estimates are refined from the peak RSS measured for each stage, which includes what "
+        "the process's pool of decoded images (see exposurePoolMaxBytes) holds. Set to 0 for no limit.",
+        default=0,
+    )
+    memoryBaselineBytes = pexConfig.Field(
+        dtype=int,
+        doc="Memory in bytes used by a worker process before it reads any data, used to estimate the peak "
+        "memory of stages which have not yet been measured.",
+        default=500*1024**2,
+    )
+    memoryHistoryFile = pexConfig.Field(
+        dtype=str,
+        doc="File in which the measured peak memory of each stage is kept, to refine the estimates of later "
+        "runs. Leave empty to use eotestMemoryHistory.json in eotestOutputPath; set it to share the "
+        "measurements between output directories.",
+        default='',
+    )
+    reportMaxPdfLatex = pexConfig.Field(
+        dtype=int,
+        doc="Maximum number of pdflatex runs at once when making the reports of several CCDs in parallel.",
+        default=2,
+    )
+    reportAlwaysRedraw = pexConfig.Field(
+        dtype=bool,
+        doc="Redraw every figure and remake every pdf in makeEotestReport(), even those which are newer "
+        "than the eotest outputs they show?",
+        default=False,
+    )
+    profileStages = pexConfig.ListField(
+        dtype=str,
+        doc="Names of the eotest stages whose subtask calls are run under cProfile, e.g. ['ptc', 'traps']. "
+        "The profile of each (stage, ccd) is written to the 'profile' directory in eotestOutputPath, as a "
+        "pstats file which can be read with the pstats module or turned into a flame graph, e.g. with "
+        "flameprof or snakeviz.",
+        default=[],
+    )
+    stageTimeouts = pexConfig.DictField(
+        keytype=str,
+        itemtype=float,
+        doc="Wall-clock time in seconds after which a (stage, ccd) unit of each stage, e.g. {'ptc': 3600.}, "
+        "is killed and counted as failed. Stages which are not listed get defaultStageTimeout. If any "
+        "timeout is set, every unit is run in a worker process of its own, so that it can be killed.",
+        default={},
+    )
+    defaultStageTimeout = pexConfig.Field(
+        dtype=float,
+        doc="Timeout in seconds of the stages not in stageTimeouts. Set to 0 for no timeout.",
+        default=0.,
+    )
+    unitRetries = pexConfig.Field(
+        dtype=int,
+        doc="Number of times a (stage, ccd) unit which fails or times out is rerun before it is quarantined. "
+        "The units depending on a quarantined unit are skipped, while the other CCDs carry on; at the end "
+        "the run fails if config.requireAllEOTests is set, and otherwise just lists the quarantined units "
+        "in eotestQuarantine.json in the output directory.",
+        default=0,
+    )
+    profileSummaryLength = pexConfig.Field(
+        dtype=int,
+        doc="Number of the functions with the most internal time, over all the profiled calls of a run, to "
+        "list in a summary in the 'profile' directory. Set to 0 for no summary.",
+        default=30,
+    )
 
     def setDefaults(self):
         """Set default config options for the subTasks."""
@@ -163,16 +480,27 @@ class CpTaskConfig(pexConfig.Config):
                                "Please set config.eotestOutputPath.")
 
         taskList = ['fe55', 'brightPixels', 'darkPixels', 'readNoise', 'traps', 'cte', 'flatPair', 'ptc']
-        for task in taskList:
-            if getattr(self, task).output_dir != '.':
-                # Being thorough here: '.' is the eotest default. If this is not the value then the user has
-                # specified something, and we're going to clobber it, so raise a warning. Unlike to happen.
+        numpyTaskList = [stage.numpyField for stage in EOTEST_STAGES if stage.numpyField is not None]
+        for task in taskList + numpyTaskList:
+            if getattr(self, task).output_dir not in ('.', self.eotestOutputPath):
+                # Being thorough here: '.' is the eotest default. If this is not the value, and it wasn't set
+                # by an earlier call of validate(), then the user has specified something, and we're going to
+                # clobber it, so raise a warning. Unlike to happen.
                 log.warn("OVERWRITING: Found a user defined output path of %s for %sTask. "
                          "This has been overwritten with %s, as individually specified output paths for "
                          "subTasks are not supported at present" % (getattr(self, task).output_dir,
                                                                     task, self.eotestOutputPath))
             getattr(self, task).output_dir = self.eotestOutputPath
 
+        for stageName in self.profileStages:
+            if stageName not in taskList:
+                raise RuntimeError("Unknown stage %s in config.profileStages; known stages are %s" %
+                                   (stageName, taskList))
+        for stageName in self.stageTimeouts:
+            if stageName not in taskList:
+                raise RuntimeError("Unknown stage %s in config.stageTimeouts; known stages are %s" %
+                                   (stageName, taskList))
+
 
 class CpTask(pipeBase.CmdLineTask):
     """
@@ -214,48 +542,1021 @@ class CpTask(pipeBase.CmdLineTask):
         self.config.validate()
         self.config.freeze()
 
-        self.makeSubtask("fe55")
-        self.makeSubtask("readNoise")
-        self.makeSubtask("brightPixels")
-        self.makeSubtask("darkPixels")
-        self.makeSubtask("traps")
-        self.makeSubtask("cte")
-        self.makeSubtask("flatPair")
-        self.makeSubtask("ptc")
+        # the gains measured by, or read back for, the stages of a run; created when the butler is known
+        self.gainCache = None
+        # copies of the subtasks writing to the output directory of a run in batch mode, keyed by
+        # (subtask name, run); see _makeRunSubtasks()
+        self._runSubtasks = {}
+        # decoded amplifier images, shared between the stages run in this process
+        self.exposurePool = ExposurePool(self._getExposurePoolBytes())
+        # estimates of the peak memory of the units, made when first needed; see _getMemoryModel()
+        self.memoryModel = None
+        # long-lived pool of worker processes, if one has been started; see startWorkerPool()
+        self._workerPool = None
+
+        # only the subtasks which are switched on are made, as constructing the eotest tasks is not free
+        for stage in EOTEST_STAGES:
+            if not getattr(self.config, stage.doField):
+                continue
+            if self._usesNumpyEngine(stage):
+                # made under the stage's name, so that it is run just like the eotest task it replaces
+                setattr(self, stage.name, getattr(self.config, stage.numpyField).apply(
+                    name=stage.name, parentTask=self, exposurePool=self.exposurePool))
+            else:
+                self.makeSubtask(stage.name)
+
+    def _usesNumpyEngine(self, stage):
+        """Is a stage run by cp_pipe's NumPy implementation of it rather than by the eotest task?
+
+        Parameters
+        ----------
+        stage : `lsst.cp.pipe.EotestStage`
+            The stage
+
+        Returns
+        -------
+        usesNumpy : `bool`
+            True if the stage has a NumPy engine, and config.<stage>Engine selects it
+        """
+        return stage.numpyField is not None and getattr(self.config, stage.name + 'Engine') == 'numpy'
+
+    def _getExposurePoolBytes(self):
+        """Get the maximum size of the pool of decoded images of each process.
+
+        Only the NumPy engines use the pool, so it is empty unless one of them is selected. If
+        config.memoryBudgetBytes is set, the pools of all the processes are bounded by half of the budget.
+        This doesn't hold back any units: what a pool holds is part of the peak RSS measured for the units
+        of its process, from which the memory model estimates them.
+
+        Returns
+        -------
+        maxBytes : `int`
+            The maximum size in bytes
+        """
+        if not any(getattr(self.config, stage.doField) and self._usesNumpyEngine(stage)
+                   for stage in EOTEST_STAGES):
+            return 0
+        maxBytes = self.config.exposurePoolMaxBytes
+        if self.config.memoryBudgetBytes > 0:
+            maxBytes = min(maxBytes, self.config.memoryBudgetBytes//(2*max(self.config.numProcesses, 1)))
+        return maxBytes
+
+    def startWorkerPool(self):
+        """Start a pool of config.numProcesses worker processes to be kept for all later runs.
+
+        Normally each run forks its own pool of workers, and shuts it down at the end. A task which is kept
+        to process many runs, e.g. by `lsst.cp.pipe.CpService`, can instead fork the workers once. They are
+        only used by runEotestDirect(), as those of runEotestBatch() need the subtasks made for each run.
+        Does nothing if config.numProcesses is 1 or the pool is already running.
+        """
+        if self.config.numProcesses > 1 and self._workerPool is None:
+            self.log.info("Starting a pool of %d worker processes" % self.config.numProcesses)
+            self._workerPool = _forkContext.Pool(processes=self.config.numProcesses,
+                                                  initializer=_initPoolWorker, initargs=(self,))
+
+    def stopWorkerPool(self):
+        """Shut down the pool of worker processes started by startWorkerPool(), if it is running."""
+        if self._workerPool is not None:
+            self._workerPool.close()
+            self._workerPool.join()
+            self._workerPool = None
+
+    def _getRawFilenameIndices(self, butler, outputPaths):
+        """Get the index of the raw filenames for each run, scanning the registry only if necessary.
+
+        The index of each run is saved in its output directory, and reused by later reruns if
+        config.reuseRawFilenameIndex is set and the registry still has the same raws for the run. The runs
+        which need indexing are all indexed with a single registry query.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data
+        outputPaths : `dict` of `str`: `str`
+            The output directory of each run to index
+
+        Returns
+        -------
+        indices : `dict` of `str`: `lsst.cp.pipe.RawFilenameIndex`
+            The index of the raw filenames of each run
+        """
+        indices = {}
+        indexFiles = dict((run, os.path.join(path, 'rawFilenameIndex_%s.json' % run))
+                          for run, path in outputPaths.items())
+        for run, indexFile in indexFiles.items():
+            if self.config.reuseRawFilenameIndex and os.path.exists(indexFile):
+                index = RawFilenameIndex.readJson(indexFile)
+                if index.run != str(run):
+                    self.log.warn("Ignoring %s, as it is for run %s, not %s" % (indexFile, index.run, run))
+                elif not index.isCurrent(butler):
+                    self.log.info("Ignoring %s, as the registry has changed since it was written" % indexFile)
+                    # the flat-pair index was made from the same raws, so its headers are read again too
+                    flatPairIndexFile = os.path.join(outputPaths[run], 'flatPairIndex_%s.json' % run)
+                    if os.path.exists(flatPairIndexFile):
+                        os.remove(flatPairIndexFile)
+                else:
+                    self.log.info("Read index of %s raw files from %s" % (len(index), indexFile))
+                    indices[run] = index
+
+        toScan = [run for run in outputPaths if run not in indices]
+        if len(toScan) == 1:
+            scanned = {toScan[0]: RawFilenameIndex.fromButler(butler, toScan[0])}
+        elif toScan:
+            scanned = RawFilenameIndex.fromButlerRuns(butler, toScan)
+        else:
+            scanned = {}
+        for run, index in scanned.items():
+            index.writeJson(indexFiles[run])
+            self.log.info("Indexed %s raw files for run %s" % (len(index), run))
+        indices.update(scanned)
+        return indices
+
+    def _makeRunSubtasks(self, run, outputPath):
+        """Make copies of the subtasks which write to the output directory of a run.
+
+        The eotest tasks take their output directory from their config rather than as an argument to
+        run(), so processing runs into separate directories needs a set of subtasks for each one.
+
+        Parameters
+        ----------
+        run : `str`
+            The run
+        outputPath : `str`
+            Its output directory
+        """
+        for stage in EOTEST_STAGES:
+            if not getattr(self.config, stage.doField):
+                continue
+            subtask = getattr(self, stage.name)
+            config = type(subtask.config)()
+            config.update(**subtask.config.toDict())
+            config.output_dir = outputPath
+            config.freeze()
+            kwargs = dict(exposurePool=self.exposurePool) if self._usesNumpyEngine(stage) else {}
+            self._runSubtasks[(stage.name, run)] = type(subtask)(config=config, parentTask=self,
+                                                                 name='%s_%s' % (stage.name, run), **kwargs)
+
+    def _getSubtask(self, taskName, run):
+        """Get the subtask to use for a run.
+
+        Parameters
+        ----------
+        taskName : `str`
+            The name of the subtask
+        run : `str`
+            The run being processed
+
+        Returns
+        -------
+        subtask : `lsst.pipe.base.Task`
+            The run's own copy of the subtask if it has one, otherwise the subtask itself
+        """
+        return self._runSubtasks.get((taskName, run), getattr(self, taskName))
+
+    def _makeMaskRegistry(self, path, run, ccds, manifest):
+        """Make the registry of mask files, seeded with those already in the output directory.
+
+        Parameters
+        ----------
+        path : `str`
+            The output directory
+        run : `str`
+            The run being processed
+        ccds : `list`
+            The CCDs being processed
+        manifest : `lsst.cp.pipe.CompletionManifest`
+            The manifest of the run, which records which stage made the masks left by an earlier run
+
+        Returns
+        -------
+        maskRegistry : `lsst.cp.pipe.MaskRegistry`
+            The registry
+        """
+        maskRegistry = MaskRegistry([stage.name for stage in EOTEST_STAGES])
+        origins = dict((output, stage.name) for stage in EOTEST_STAGES for ccd in ccds
+                       for output in manifest.getOutputs((run, stage.name, ccd)))
+        maskRegistry.scanDirectory(path, ccds, origins)
+        return maskRegistry
+
+    def _makeResultCache(self):
+        """Make the result cache, if one is configured.
+
+        Returns
+        -------
+        resultCache : `lsst.cp.pipe.ResultCache` or `None`
+            The cache, or None if config.resultCacheDir is not set
+        """
+        if not self.config.resultCacheDir:
+            return None
+        return ResultCache(self.config.resultCacheDir, self.config.resultCacheMaxBytes,
+                           link=self.config.resultCacheLink)
+
+    def _makeInputStager(self):
+        """Make the stager of input files, if staging is configured.
+
+        Returns
+        -------
+        stager : `lsst.cp.pipe.InputStager` or `None`
+            The stager, or None if config.stagingDir is not set
+        """
+        if not self.config.stagingDir:
+            return None
+        return InputStager(self.config.stagingDir, self.config.stagingMaxBytes,
+                           decompress=self.config.stagingDecompress, log=self.log)
+
+    def _checkStageData(self, stage, testTypes, imTypes):
+        """Check that the data needed by an eotest stage is in the repo.
+
+        Parameters
+        ----------
+        stage : `lsst.cp.pipe.EotestStage`
+            The stage to check
+        testTypes : `list` of `str`
+            The testTypes available in the repo
+        imTypes : `list` of `str`
+            The imageTypes available in the repo
+
+        Returns
+        -------
+        available : `bool`
+            True if the data is available, False if it is not and config.requireAllEOTests is False
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the data is not available and config.requireAllEOTests is True
+        """
+        if stage.testType in testTypes and stage.imageType in imTypes:
+            return True
+        msg = ("Required data for the %s task (testType %s, imageType %s) unavailable. Available data:"
+               "\ntestTypes: %s\nimageTypes: %s" % (stage.name, stage.testType, stage.imageType,
+                                                    testTypes, imTypes))
+        if self.config.requireAllEOTests:
+            raise RuntimeError(msg)
+        self.log.warn(msg + "\nSkipping %s task" % stage.name)
+        return False
+
+    def _planEotestUnits(self, eotestRuns):
+        """Work out the (run, stage, ccd) units of work, and the dependencies between them.
+
+        A unit depends on the unit for the same run and CCD of each earlier stage whose products it
+        consumes. Stages which are switched off, or for which a run has no data, are left out, and any unit
+        which would have consumed their products simply uses whatever is already available, as before.
+        The units are given to the scheduler stage by stage, with the CCDs of all the runs together, so
+        that the work of several runs is spread over the worker processes.
+
+        Parameters
+        ----------
+        eotestRuns : `dict` of `str`: `lsst.pipe.base.Struct`
+            The state of each eotest run, as made by _runEotest()
+
+        Returns
+        -------
+        scheduler : `lsst.cp.pipe.StageScheduler`
+            Scheduler for the units
+        """
+        runStages = {}
+        for run, eotestRun in sorted(eotestRuns.items()):
+            testTypes = eotestRun.rawIndex.getTestTypes()
+            imTypes = eotestRun.rawIndex.getImageTypes()
+            runStages[run] = set(stage.name for stage in EOTEST_STAGES if getattr(self.config, stage.doField)
+                                 and self._checkStageData(stage, testTypes, imTypes))
+
+        units = []
+        dependencies = {}
+        producers = dict((run, {}) for run in eotestRuns)
+        for stage in EOTEST_STAGES:
+            for run, eotestRun in sorted(eotestRuns.items()):
+                if stage.name not in runStages[run]:
+                    continue
+                for ccd in eotestRun.ccds:
+                    unit = WorkUnit(stage, ccd, run)
+                    units.append(unit)
+                    dependencies[unit.key] = [(run, producers[run][product], ccd)
+                                              for product in stage.consumes if product in producers[run]]
+                for product in stage.produces:
+                    producers[run][product] = stage.name
 
-    def _getMaskFiles(self, path, ccd):
-        """Get all available eotest mask files for a given ccd.
+        # every eotest task updates the sensor's results file, so only one stage may run on a CCD at once
+        return StageScheduler(units, dependencies, groupOf=lambda unit: (unit.run, unit.ccd))
 
-        Each stage of the processing generates more mask files, so this allows each to be picked up
-        as more and more tests run, and saves having to have clever logic for if some tasks fail.
+    def _getInputFilenames(self, eotestRun, unit):
+        """Get the input files for a unit of work.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+
+        Returns
+        -------
+        filenames : `list` of `str`
+            The input files
+        """
+        stage, ccd = unit.stage, unit.ccd
+        filenames = eotestRun.rawIndex.getFilenames(stage.testType, stage.imageType, ccd)
+        if stage.flatPairsOnly:
+            # There is no "flat-pair" test type, so all FLAT/FLAT imType/testType will appear here, and
+            # we need to filter these for only the pair acquisitions (as the eotest code looks like it
+            # isn't totally thorough on rejecting the wrong types of data here)
+            # TODO: adding a translator to obs_comCam and ingesting this would allow this to be done
+            # by the butler instead of here. DM-12939
+            filenames = self._getFlatPairFilenames(eotestRun, ccd, filenames)
+            if not filenames:
+                raise RuntimeError("No flatPair files found for %s task on %s." % (stage.name, ccd))
+        return filenames
+
+    def _getFlatPairIndex(self, outputPath, run):
+        """Get the index of the flat pairs of a run, reading that saved by an earlier run if allowed.
+
+        The index is reused under the same conditions as the index of the raw filenames, i.e. if
+        config.reuseRawFilenameIndex is set and the registry has not changed since; the saved index is removed
+        by _getRawFilenameIndices() otherwise. Files which have changed since they were indexed are indexed
+        again by _getFlatPairFilenames().
+
+        Parameters
+        ----------
+        outputPath : `str`
+            The output directory of the run
+        run : `str`
+            The run
+
+        Returns
+        -------
+        index : `lsst.cp.pipe.FlatPairIndex`
+            The index, which is empty if there was none to reuse
+        """
+        indexFile = os.path.join(outputPath, 'flatPairIndex_%s.json' % run)
+        if self.config.reuseRawFilenameIndex and os.path.exists(indexFile):
+            index = FlatPairIndex.readJson(indexFile)
+            if index.run == str(run):
+                return index
+            self.log.warn("Ignoring %s, as it is for run %s, not %s" % (indexFile, index.run, run))
+        return FlatPairIndex(run)
+
+    def _getFlatPairFilenames(self, eotestRun, ccd, filenames):
+        """Get the files of the good flat pairs of a CCD, shared by the flat-pair and PTC stages.
+
+        Note that eotest needs the original filename as written by the test-stand data acquisition system,
+        as that is the only place the flat pair-number is recorded, so the sym-links are resolved and the
+        *original* paths/filenames are returned. The headers of any files not yet in the run's flat-pair
+        index are read, and the pairs checked, when the first of the stages asks for them.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        filenames : `list` of `str`
+            The FLAT/FLAT files of the CCD
+
+        Returns
+        -------
+        filenames : `list` of `str`
+            The real paths of the files of the good pairs
+        """
+        if ccd not in eotestRun.flatPairs:
+            index = eotestRun.flatPairIndex
+            nRead = index.addFiles(ccd, filenames)
+            if nRead:
+                index.writeJson(os.path.join(eotestRun.outputPath, 'flatPairIndex_%s.json' % eotestRun.run))
+            # files indexed by an earlier run but no longer in the registry are left out
+            pairs, rejected = index.getPairs(ccd, self.config.flatPairMaxPdFracDev, filenames)
+            for paths, reason in rejected:
+                names = ", ".join(os.path.basename(path) for path in paths)
+                self.log.warn("Not using %s for %s: %s" % (names, ccd, reason))
+            self.log.info("Found %d good flat pairs for %s, reading %d headers" % (len(pairs), ccd, nRead))
+            eotestRun.flatPairs[ccd] = index.getFilenames(ccd, self.config.flatPairMaxPdFracDev, filenames)
+        return eotestRun.flatPairs[ccd]
+
+    def _makeRunArgs(self, eotestRun, unit):
+        """Gather the arguments for the run() method of the subtask for a unit of work.
+
+        This is done immediately before the unit is started, so that the mask files written by the
+        stages which have already run on the CCD are picked up.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+
+        Returns
+        -------
+        kwargs : `dict`
+            The keyword arguments for the subtask's run() method
+        """
+        stage, ccd = unit.stage, unit.ccd
+        filenames = self._getInputFilenames(eotestRun, unit)
+        self.log.trace("%s: Processing %s with %s files" % (stage.name, ccd, len(filenames)))
+
+        # Each stage picks up the masks made so far, so that more and more are used as more tests run, without
+        # needing clever logic for when some tasks fail. Masks written by this or later stages in an earlier
+        # run into the same directory are not used, so that a rerun or resumed run sees the same masks as a
+        # fresh one. eotest wants an empty tuple if there are none.
+        maskFiles = eotestRun.maskRegistry.getMaskFiles(ccd, beforeStage=stage.name)
+        kwargs = dict(sensor_id=ccd, mask_files=maskFiles)
+        if stage.singleFile:
+            if len(filenames) != 1:  # eotest can't handle more than one
+                self.log.fatal("%s: Found %s files where exactly one was expected: %s" %
+                               (stage.name, len(filenames), filenames))
+            kwargs[stage.filesArg] = filenames[0]
+        else:
+            kwargs[stage.filesArg] = filenames
+        if 'gains' in stage.consumes:
+            kwargs['gains'] = self.gainCache.get(ccd, unit.run)
+        for arg, field in stage.configArgs.items():
+            kwargs[arg] = getattr(self.config, field)
+        return kwargs
+
+    def _getUnitSignature(self, unit, kwargs):
+        """Get the signature of everything which goes into a unit of work.
+
+        If any of the input files, the mask files, the gains or the subtask's config change, so does the
+        signature, so it can be used to decide whether a unit recorded in the manifest needs rerunning.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        kwargs : `dict`
+            The keyword arguments for the subtask's run() method
+
+        Returns
+        -------
+        signature : `dict`
+            The signature, which can be serialised as JSON
+        """
+        stage = unit.stage
+        inputs = [kwargs[stage.filesArg]] if stage.singleFile else kwargs[stage.filesArg]
+        return dict(inputs=[getFileSignature(f) for f in inputs],
+                    masks=[getFileSignature(f) for f in sorted(kwargs['mask_files'])],
+                    config=self._getSubtask(stage.name, unit.run).config.toDict(),
+                    args=dict((arg, value) for arg, value in kwargs.items()
+                              if arg not in (stage.filesArg, 'mask_files', 'sensor_id')))
+
+    def _listSensorFiles(self, path, ccd):
+        """List the signatures of the non-temporary files in an output directory belonging to a CCD.
+
+        eotest prefixes the names of all the files it writes with the sensor id.
 
         Parameters
         ----------
         path : `str`
-            Path on which to find the mask files
-        ccd : `string` or `int`
+            The output directory
+        ccd : `str` or `int`
             Name/identifier of the CCD
 
         Returns
         -------
-        maskFiles : iterable of `str`
-            List of mask files, or an empty tuple if none are found
+        signatures : `dict`
+            File signatures, keyed by the path of the file
         """
-        pattern = '*' + str(ccd) + '*mask*'  # the cast to str supports obs_auxTel
-        maskFiles = glob.glob(os.path.join(path, pattern))
-        return maskFiles if len(maskFiles) > 0 else ()  # eotest wants an empty tuple here
+        prefix = str(ccd) + '_'
+        return dict((os.path.join(path, filename), getFileSignature(os.path.join(path, filename)))
+                    for filename in os.listdir(path)
+                    if filename.startswith(prefix) and not fnmatch.fnmatch(filename, _MEDIAN_FILE_PATTERN))
+
+    def _listIntermediateFiles(self, path, ccd):
+        """List the intermediate (medianed) files in an output directory belonging to a CCD.
+
+        Parameters
+        ----------
+        path : `str`
+            The output directory
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+
+        Returns
+        -------
+        paths : `set` of `str`
+            The files
+        """
+        prefix = str(ccd) + '_'
+        return set(os.path.join(path, filename) for filename in os.listdir(path)
+                   if filename.startswith(prefix) and fnmatch.fnmatch(filename, _MEDIAN_FILE_PATTERN))
+
+    def _releaseIntermediates(self, eotestRun, scheduler, unit):
+        """Delete the intermediate files of a unit's CCD which no unit still to run on it uses.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        scheduler : `lsst.cp.pipe.StageScheduler`
+            Scheduler handing out the units to run
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit which has just finished
+        """
+        keepStages = set()
+        for pending in scheduler.getPending((unit.run, unit.ccd)):
+            keepStages.update(pending.stage.usesIntermediates)
+        eotestRun.intermediates.release(unit.ccd, keepStages)
+
+    def _isOverDiskQuota(self):
+        """Is the output directory, including those of any runs in it, over config.diskQuotaBytes?"""
+        if not self.config.diskQuotaBytes:
+            return False
+        return getDirectorySize(self.config.eotestOutputPath) > self.config.diskQuotaBytes
+
+    def _getMemoryModel(self):
+        """Get the model of the peak memory of the units, starting from the measurements of earlier runs."""
+        if self.memoryModel is None:
+            self.memoryModel = MemoryModel(self.config.memoryBaselineBytes)
+            self.memoryModel.readJson(self._getMemoryHistoryFile())
+        return self.memoryModel
+
+    def _getMemoryHistoryFile(self):
+        """Get the file in which the measured peak memory of the stages is kept."""
+        return self.config.memoryHistoryFile or os.path.join(self.config.eotestOutputPath,
+                                                             'eotestMemoryHistory.json')
+
+    def _getInputSize(self, eotestRun, unit):
+        """Get the total size in bytes, and the number, of the input files of a unit of work."""
+        filenames = self._getInputFilenames(eotestRun, unit)
+        return sum(os.path.getsize(filename) for filename in filenames if os.path.exists(filename)), \
+            len(filenames)
+
+    def _admitUnit(self, eotestRun, unit, memoryModel, reserved):
+        """Decide whether a unit may start, given config.memoryBudgetBytes and the units already running.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit which is ready to start
+        memoryModel : `lsst.cp.pipe.MemoryModel`
+            The model of the peak memory of the units
+        reserved : `dict`
+            The estimated peak memory of each running unit, keyed by the unit's key. The unit is added if it
+            is admitted.
+
+        Returns
+        -------
+        admitted : `bool`
+            True if the unit fits in the budget, or nothing else is running
+        """
+        inputBytes, nFiles = self._getInputSize(eotestRun, unit)
+        estimate = memoryModel.estimate(unit.stage.name, inputBytes, nFiles)
+        if reserved and sum(reserved.values()) + estimate > self.config.memoryBudgetBytes:
+            self.log.debug("Holding back %s task on %s, estimated to need %.0f MB with %.0f MB in use" %
+                           (unit.stage.name, unit.ccd, estimate/1024**2, sum(reserved.values())/1024**2))
+            return False
+        reserved[unit.key] = estimate
+        return True
+
+    def _getCacheKey(self, unit, signature, sensorFiles):
+        """Get the result cache key of a unit of work.
+
+        Unlike the manifest signature, this must not depend on the output directory, so that is left out of
+        the subtask config, and the files already in the output directory, which include the mask files and
+        the results file which eotest updates, are represented by their names and a hash of their contents.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        signature : `dict`
+            The signature of the unit, from _getUnitSignature()
+        sensorFiles : iterable of `str`
+            The CCD's files already in the output directory
+
+        Returns
+        -------
+        key : `str`
+            The cache key
+        """
+        config = dict((field, value) for field, value in signature['config'].items() if field != 'output_dir')
+        description = dict(stage=unit.stage.name, ccd=str(unit.ccd), inputs=signature['inputs'],
+                           config=config, args=signature['args'],
+                           masks=sorted(os.path.basename(mask[0]) for mask in signature['masks']),
+                           sensorFiles=dict((os.path.basename(path), hashFile(path)) for path in sensorFiles))
+        return ResultCache.makeKey(description)
+
+    def _finishUnit(self, eotestRun, unit, result, signature, outputs):
+        """Store the products of a unit of work which has completed, and record it in the manifest.
+
+        This is always called from the parent process, one unit at a time, so butler writes are never
+        concurrent.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        result : `object`
+            The return value of the subtask's run() method
+        signature : `dict`
+            The signature of the unit, from _getUnitSignature()
+        outputs : `list` of `str`
+            The files written by the unit
+        """
+        if 'gains' in unit.stage.produces:
+            # gainsPropSet = dafBase.PropertySet()
+            # for amp, gain in gains.items():  # there is no propSet.fromDict() method so make like this
+            #     gainsPropSet.addDouble(str(amp), gain)
+            self.gainCache.put(result, unit.ccd, unit.run)
+        eotestRun.maskRegistry.add(unit.ccd, unit.stage.name, outputs)
+        eotestRun.manifest.record(unit.key, signature, outputs)
+
+    def _callSubtask(self, taskName, run, kwargs, profilePath=None):
+        """Call a subtask's run() method, measuring it, and profiling it if requested.
+
+        Parameters
+        ----------
+        taskName : `str`
+            The name of the subtask
+        run : `str`
+            The run being processed, which chooses the copy of the subtask to use
+        kwargs : `dict`
+            The keyword arguments for its run() method
+        profilePath : `str`, optional
+            File to which to write the profile of the call. It is not profiled if this is None.
+
+        Returns
+        -------
+        result : `object`
+            Whatever the subtask's run() method returned
+        measurements : `dict`
+            The resources used by the subtask, from measureCall(), with the hits, misses and evictions of
+            this process's pool of decoded images during the call, as exposurePoolHits etc.
+        """
+        runMethod = self._getSubtask(taskName, run).run
+        poolBefore = self.exposurePool.getStats()
+        if profilePath is None:
+            result, measurements = measureCall(runMethod, **kwargs)
+        else:
+            result, measurements = measureCall(profileCall, profilePath, runMethod, **kwargs)
+        # the call may run in a worker process, whose pool the parent can't see, so its use is returned
+        poolAfter = self.exposurePool.getStats()
+        for name in _EXPOSURE_POOL_STATS:
+            measurements['exposurePool' + name.capitalize()] = poolAfter[name] - poolBefore[name]
+        return result, measurements
+
+    def _getProfilePath(self, eotestRun, unit):
+        """Get the file to which to write the profile of a unit of work, making its directory if needed.
+
+        The profiles go in a directory of their own so that they are not mistaken for eotest's outputs.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+
+        Returns
+        -------
+        path : `str`
+            The profile file
+        """
+        profileDir = os.path.join(eotestRun.outputPath, 'profile')
+        if not os.path.exists(profileDir):
+            os.makedirs(profileDir)
+        path = os.path.join(profileDir, '%s_%s_%s.pstats' % (unit.run, unit.stage.name, unit.ccd))
+        eotestRun.profiles.append(path)
+        return path
+
+    def _recordMeasurements(self, eotestRun, unit, measurements):
+        """Record the resources used by a unit of work in the task metadata and the run's timeline.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the eotest run, as made by _runEotest()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        measurements : `dict`
+            The measurements of the unit, from measureCall()
+        """
+        for quantity in ('wallTime', 'cpuTime', 'peakRss', 'bytesRead', 'charsRead', 'filesOpened'):
+            if measurements[quantity] is not None:
+                self.metadata.set('eotest.%s.%s.%s' % (unit.stage.name, unit.ccd, quantity),
+                                  measurements[quantity])
+        eotestRun.timeline.add(str(unit.ccd), unit.stage.name, measurements, run=unit.run)
+        self.log.info("Finished %s task on %s in %.1f s, using %.1f s of CPU" %
+                      (unit.stage.name, unit.ccd, measurements['wallTime'], measurements['cpuTime']))
+
+    def _logTimelineSummary(self, timeline):
+        """Log the time and data used by each stage, summed over the CCDs.
+
+        Parameters
+        ----------
+        timeline : `lsst.cp.pipe.Timeline`
+            The timeline of the run
+        """
+        totals = {}
+        for event in timeline.events:
+            total = totals.setdefault(event['cat'], dict(wallTime=0., cpuTime=0., bytesRead=0, nUnits=0))
+            total['wallTime'] += event['dur']/1e6
+            total['cpuTime'] += event['args']['cpuTime']
+            total['bytesRead'] += event['args']['bytesRead'] or 0
+            total['nUnits'] += 1
+        for stageName, total in sorted(totals.items(), key=lambda item: -item[1]['wallTime']):
+            self.log.info("%s: %d CCDs, %.1f s wall, %.1f s CPU, %.1f MB read from storage" %
+                          (stageName, total['nUnits'], total['wallTime'], total['cpuTime'],
+                           total['bytesRead']/1024**2))
+
+    def _getStageTimeout(self, stage):
+        """Get the timeout in seconds of the units of a stage, or None if they have none."""
+        return self.config.stageTimeouts.get(stage.name, self.config.defaultStageTimeout) or None
+
+    def _startUnit(self, unit, runArgs, pool, finished, calls):
+        """Start the subtask call of a unit of work.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        runArgs : `tuple`
+            The arguments for _runSubtaskInWorker()
+        pool : `multiprocessing.Pool`
+            The pool in which to run it, or None to run it here
+        finished : `queue.Queue`
+            Queue to which (unit, succeeded, result) is put when the call has finished
+        calls : `dict`
+            The calls running in processes of their own, keyed by the unit's key, to which the call is added,
+            or None if units are not run in processes of their own
+        """
+        if calls is not None:
+            calls[unit.key] = IsolatedCall(_runSubtaskInWorker, (runArgs,),
+                                           timeout=self._getStageTimeout(unit.stage), tag=unit)
+        elif pool is None:
+            try:
+                finished.put((unit, True, self._callSubtask(*runArgs)))
+            except Exception as e:
+                finished.put((unit, False, e))
+        else:
+            pool.apply_async(_runSubtaskInWorker, (runArgs,),
+                             callback=lambda res, unit=unit: finished.put((unit, True, res)),
+                             error_callback=lambda exc, unit=unit: finished.put((unit, False, exc)))
+
+    def _waitForUnit(self, finished, calls):
+        """Wait for the subtask call of a unit to finish, killing those which overrun their timeout.
+
+        Parameters
+        ----------
+        finished : `queue.Queue`
+            Queue to which the calls started by _startUnit() put their outcome
+        calls : `dict`
+            The calls running in processes of their own, or None
+
+        Returns
+        -------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit which has finished
+        succeeded : `bool`
+            Did the call succeed?
+        result : `object`
+            The (result, measurements) of the call if it succeeded, otherwise the exception it raised
+        """
+        while calls and finished.empty():
+            for call in waitForCalls(calls.values()):
+                del calls[call.tag.key]
+                succeeded, result = call.getResult()
+                finished.put((call.tag, succeeded, result))
+            for key, call in list(calls.items()):
+                if call.isOverdue():
+                    call.kill()
+                    del calls[key]
+                    finished.put((call.tag, False, RuntimeError("Timed out after %.0f s" % call.timeout)))
+        return finished.get()
+
+    @staticmethod
+    def _describeFailure(exc):
+        """Describe the exception raised by a failed unit, with its traceback if it has one."""
+        if getattr(exc, '__traceback__', None) is not None or getattr(exc, '__cause__', None) is not None:
+            return ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)).rstrip()
+        return '%s: %s' % (type(exc).__name__, exc)
+
+    def _runUnits(self, eotestRuns, scheduler):
+        """Run the units of work handed out by a scheduler, in parallel if so configured.
+
+        Units are run in a pool of config.numProcesses worker processes, and a new unit is started as soon
+        as its dependencies are met and a worker is free. Their arguments are gathered, and their results
+        stored, here in the parent process. A unit whose subtask call raises does not stop the run: it is
+        retried and quarantined as described below, and the caller decides whether the run fails.
+
+        Every completed unit is recorded in the run's manifest. If config.resume is set, units whose
+        manifest entry matches their current inputs are not rerun. If config.resultCacheDir is set, the
+        outputs of units found in the result cache are taken from there instead of being recomputed, and
+        those of units which are computed are added to it. If config.stagingDir is set, the inputs of each
+        unit are copied there before it starts, and those of the next few units in the background.
+
+        The intermediate files written by each unit are deleted as soon as no unit still to run on the same
+        CCD uses them. If config.diskQuotaBytes is set, no new units are started while the output directory
+        is over the quota and other units are still running to free space. If config.memoryBudgetBytes is
+        set, units are only started while the estimated peak memory of all those running fits in it.
+
+        The wall time, CPU time, peak RSS, bytes read and files opened of each unit which is run are recorded
+        in the task metadata and in the run's timeline. Units of the stages in config.profileStages are also
+        profiled.
+
+        If config.stageTimeouts or config.defaultStageTimeout are set, each unit is run in a process of its
+        own, which is killed if the unit overruns its timeout. A unit which fails, or is killed, is rerun up
+        to config.unitRetries times, and then quarantined: the units which depend on it are skipped, while
+        everything else carries on. The quarantined units are returned; _runEotest() lists them in
+        eotestQuarantine.json, and only then fails the run if config.requireAllEOTests is set. Only errors
+        of the scheduling itself, rather than of a unit, abandon the remaining work and are re-raised here.
+
+        Parameters
+        ----------
+        eotestRuns : `dict` of `str`: `lsst.pipe.base.Struct`
+            The state of each eotest run, as made by _runEotest()
+        scheduler : `lsst.cp.pipe.StageScheduler`
+            Scheduler handing out the units to run
+
+        Returns
+        -------
+        quarantined : `list` of `lsst.pipe.base.Struct`
+            The units which failed, each with the unit, its error, its number of attempts, and the units
+            skipped because of it
+        """
+        global _poolTask
+
+        stager = next(iter(eotestRuns.values())).stager  # shared by all the runs
+        finished = queue.Queue()
+        started = {}
+        prefetched = set()
+        overQuota = False
+        memoryModel = self._getMemoryModel() if self.config.memoryBudgetBytes > 0 else None
+        reserved = {}  # estimated peak memory of the running units, by key
+        quarantined = []
+        pool = None
+        ownPool = False
+        calls = None  # the units running in processes of their own, if they may need killing
+        if self.config.defaultStageTimeout or any(self.config.stageTimeouts.values()):
+            self.log.info("Running each eotest task in a process of its own, with up to %d at once" %
+                          max(self.config.numProcesses, 1))
+            _poolTask = self
+            calls = {}
+        elif self.config.numProcesses > 1:
+            self.log.info("Running eotest tasks using %s processes" % self.config.numProcesses)
+            if self._workerPool is not None and not self._runSubtasks:
+                pool = self._workerPool
+            else:
+                _poolTask = self
+                pool = _forkContext.Pool(processes=self.config.numProcesses)
+                ownPool = True
+        try:
+            while not scheduler.isFinished:
+                maxUnits = max(self.config.numProcesses, 1) - scheduler.nRunning
+                if maxUnits > 0 and self._isOverDiskQuota():
+                    if not overQuota:
+                        self.log.warn("Output directory is over the disk quota of %d bytes; starting no new "
+                                      "tasks while others are running" % self.config.diskQuotaBytes)
+                    overQuota = True
+                    # wait for the running units to finish and free their intermediate files; if nothing is
+                    # running, waiting won't free anything, so carry on one unit at a time
+                    maxUnits = 0 if scheduler.nRunning > 0 else 1
+                elif overQuota and maxUnits > 0:
+                    self.log.info("Output directory is back under the disk quota")
+                    overQuota = False
+                admit = None
+                if memoryModel is not None:
+                    runningKeys = set(unit.key for unit in scheduler.running)
+                    reserved = dict((key, nBytes) for key, nBytes in reserved.items() if key in runningKeys)
+                    admit = lambda unit: self._admitUnit(eotestRuns[unit.run], unit, memoryModel, reserved)
+                for unit in scheduler.getReady(maxUnits=maxUnits, admit=admit):
+                    eotestRun = eotestRuns[unit.run]
+                    manifest = eotestRun.manifest
+                    kwargs = self._makeRunArgs(eotestRun, unit)
+                    signature = self._getUnitSignature(unit, kwargs)
+                    if self.config.resume and manifest.isComplete(unit.key, signature):
+                        self.log.info("Skipping %s task on %s, which is already complete" %
+                                      (unit.stage.name, unit.ccd))
+                        scheduler.markDone(unit)
+                        self._releaseIntermediates(eotestRun, scheduler, unit)
+                        continue
+                    manifest.remove(unit.key)
+                    before = self._listSensorFiles(eotestRun.outputPath, unit.ccd)
+
+                    cacheKey = None
+                    if eotestRun.resultCache is not None:
+                        cacheKey = self._getCacheKey(unit, signature, before)
+                        # files already there, and the results file even if the unit made it, are updated
+                        # in place by later stages, so must not be linked to the cache
+                        copyAlways = [os.path.basename(p) for p in before] + [_RESULTS_FILE_PATTERN]
+                        hit = eotestRun.resultCache.fetch(cacheKey, eotestRun.outputPath,
+                                                          copyAlways=copyAlways)
+                        if hit is not None:
+                            self.log.info("Took the outputs of %s task on %s from the result cache" %
+                                          (unit.stage.name, unit.ccd))
+                            result, outputs = hit
+                            self._finishUnit(eotestRun, unit, result, signature, outputs)
+                            scheduler.markDone(unit)
+                            self._releaseIntermediates(eotestRun, scheduler, unit)
+                            continue
+
+                    stagedInputs = []
+                    if eotestRun.stager is not None:
+                        # the signature and cache key use the original files; the subtask reads the copies
+                        stagedInputs = [kwargs[unit.stage.filesArg]] if unit.stage.singleFile else \
+                            kwargs[unit.stage.filesArg]
+                        localInputs = eotestRun.stager.stage(stagedInputs)
+                        kwargs[unit.stage.filesArg] = localInputs[0] if unit.stage.singleFile else localInputs
+                    started[unit.key] = pipeBase.Struct(signature=signature, before=before, cacheKey=cacheKey,
+                                                        stagedInputs=stagedInputs,
+                                                        intermediatesBefore=self._listIntermediateFiles(
+                                                            eotestRun.outputPath, unit.ccd))
+
+                    self.log.info("Starting %s task on %s" % (unit.stage.name, unit.ccd))
+                    profilePath = None
+                    if unit.stage.name in self.config.profileStages:
+                        profilePath = self._getProfilePath(eotestRun, unit)
+                    started[unit.key].runArgs = (unit.stage.name, unit.run, kwargs, profilePath)
+                    started[unit.key].attempts = 1
+                    self._startUnit(unit, started[unit.key].runArgs, pool, finished, calls)
+                if stager is not None:
+                    # read ahead the inputs of the units which are next in line
+                    for upcoming in scheduler.peekWaiting(self.config.stagingReadAhead):
+                        if upcoming.key not in prefetched:
+                            prefetched.add(upcoming.key)
+                            stager.prefetch(self._getInputFilenames(eotestRuns[upcoming.run], upcoming))
+                if scheduler.nRunning == 0:
+                    continue  # everything which was ready was already complete
+
+                unit, succeeded, result = self._waitForUnit(finished, calls)
+                eotestRun = eotestRuns[unit.run]
+                if not succeeded:
+                    unitStart = started[unit.key]
+                    error = self._describeFailure(result)
+                    if unitStart.attempts <= self.config.unitRetries:
+                        unitStart.attempts += 1
+                        self.log.warn("%s task on %s failed; retrying, attempt %d of %d:\n%s" %
+                                      (unit.stage.name, unit.ccd, unitStart.attempts,
+                                       self.config.unitRetries + 1, error))
+                        self._startUnit(unit, unitStart.runArgs, pool, finished, calls)
+                        continue
+                    started.pop(unit.key)
+                    if eotestRun.stager is not None:
+                        eotestRun.stager.release(unitStart.stagedInputs)
+                    skipped = scheduler.markFailed(unit)
+                    skippedNames = [skippedUnit.stage.name for skippedUnit in skipped]
+                    self.log.warn("%s task on %s failed after %d attempts, so is quarantined, and %s "
+                                  "skipped:\n%s" % (unit.stage.name, unit.ccd, unitStart.attempts,
+                                                    skippedNames, error))
+                    quarantined.append(pipeBase.Struct(unit=unit, error=error, attempts=unitStart.attempts,
+                                                       skipped=skipped))
+                    self._releaseIntermediates(eotestRun, scheduler, unit)
+                    continue
+                result, measurements = result
+                self._recordMeasurements(eotestRun, unit, measurements)
+                if memoryModel is not None and measurements['peakRss'] is not None:
+                    memoryModel.record(unit.stage.name, self._getInputSize(eotestRun, unit)[0],
+                                       measurements['peakRss'])
+                unitStart = started.pop(unit.key)
+                if eotestRun.stager is not None:
+                    eotestRun.stager.release(unitStart.stagedInputs)
+                after = self._listSensorFiles(eotestRun.outputPath, unit.ccd)
+                outputs = [path for path in after if after[path] != unitStart.before.get(path)]
+                self._finishUnit(eotestRun, unit, result, unitStart.signature, outputs)
+                if unitStart.cacheKey is not None:
+                    eotestRun.resultCache.store(unitStart.cacheKey, outputs, result)
+                eotestRun.intermediates.add(unit.ccd, unit.stage.name,
+                                            self._listIntermediateFiles(eotestRun.outputPath, unit.ccd) -
+                                            unitStart.intermediatesBefore)
+                scheduler.markDone(unit)
+                self._releaseIntermediates(eotestRun, scheduler, unit)
+            if ownPool:
+                pool.close()
+        except Exception:
+            for call in (calls or {}).values():
+                call.kill()
+            if pool is not None:
+                pool.terminate()
+                if not ownPool:
+                    # the long-lived pool is still busy with the abandoned units, so can't be reused
+                    pool.join()
+                    self._workerPool = None
+            raise
+        finally:
+            if ownPool:
+                pool.join()
+            if ownPool or calls is not None:
+                _poolTask = None
+            if memoryModel is not None:
+                memoryModel.writeJson(self._getMemoryHistoryFile())
+        return quarantined
 
     def _cleanupEotest(self, path):
         """Delete all the medianed files left behind after eotest has run.
 
-        Running eotest generates a lot of interim medianed files, so this just cleans them up.
+        Running eotest generates a lot of interim medianed files. Those written during the run are deleted as
+        soon as they are no longer needed, so this just cleans up any left by earlier, interrupted runs.
 
         Parameters
         ----------
         path : `str`
            Path on which to delete all the eotest medianed files.
         """
-        for filename in glob.glob(os.path.join(path, '*_median_*.fits')):
+        for filename in glob.glob(os.path.join(path, _MEDIAN_FILE_PATTERN)):
             os.remove(filename)
 
     def makeEotestReport(self, butler):
@@ -265,24 +1566,41 @@ class CpTask(pipeBase.CmdLineTask):
         The pdf file(s), along with the .tex file(s) and the individual plots are written
         to the eotestOutputPath.
         .pdf generation requires a TeX distro including pdflatex to be installed.
+
+        The CCDs' reports are made in parallel in config.numProcesses worker processes, which plot with a
+        headless backend, and at most config.reportMaxPdfLatex pdflatex runs happen at once. A CCD's figures
+        are only redrawn, and its pdf only remade, if they are older than its eotest outputs, unless
+        config.reportAlwaysRedraw is set.
         """
         ccds = butler.queryMetadata('raw', ['ccd'])
-        for ccd in ccds:
-            self.log.info("Starting test report generation for %s"%ccd)
-            try:
-                plotPath = os.path.join(self.config.eotestOutputPath, 'plots')
-                if not os.path.exists(plotPath):
-                    os.makedirs(plotPath)
-                plots = sensorTest.EOTestPlots(ccd, self.config.eotestOutputPath, plotPath)
-                eoTestReport = sensorTest.EOTestReport(plots, wl_dir='')
-                eoTestReport.make_figures()
-                eoTestReport.make_pdf()
-            except Exception as e:
-                self.log.warn("Failed to make eotest report for %s: %s"%(ccd, e))
+        outputPath = os.path.abspath(self.config.eotestOutputPath)
+        plotPath = os.path.join(outputPath, 'plots')
+        if not os.path.exists(plotPath):
+            os.makedirs(plotPath)
+
+        self.log.info("Starting test report generation for %s" % (ccds,))
+        latexSemaphore = multiprocessing.Semaphore(max(self.config.reportMaxPdfLatex, 1))
+        # a pool is used even for one process, so the plotting backend and working directory of this
+        # process are left alone
+        pool = multiprocessing.Pool(processes=max(min(self.config.numProcesses, len(ccds)), 1),
+                                    initializer=_initReportWorker, initargs=(latexSemaphore,))
+        try:
+            args = [(ccd, outputPath, plotPath, self.config.reportAlwaysRedraw) for ccd in ccds]
+            for ccd, status, succeeded in pool.imap_unordered(makeCcdReport, args):
+                if succeeded:
+                    self.log.info("Test report for %s: %s" % (ccd, status))
+                else:
+                    self.log.warn("Failed to make eotest report for %s: %s" % (ccd, status))
+            pool.close()
+        except Exception:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
         self.log.info("Finished test report generation.")
 
     @pipeBase.timeMethod
-    def runEotestDirect(self, butler, run=None):
+    def runEotestDirect(self, butler, run=None, ccds=None):
         """
         Generate calibration products using eotest algorithms.
 
@@ -310,6 +1628,11 @@ class CpTask(pipeBase.CmdLineTask):
         * Photon Transfer Curve
         * Quantum Efficiency            X - will not be implemented here
 
+        Each CCD goes through these steps in this order, but the CCDs do not wait for one another: a CCD
+        moves on to its next step as soon as the steps whose products it needs (see EOTEST_STAGES) have
+        finished for that CCD. With config.numProcesses > 1 several CCDs are processed at once. To process
+        several runs together, use runEotestBatch().
+
         List of tasks that exist in the eotest package but aren't mentioned on the above link:
         * linearityTask()
         * fe55CteTask()
@@ -330,258 +1653,397 @@ class CpTask(pipeBase.CmdLineTask):
             Butler for the repo containg the eotest data to be used
         run : `str` or `int`
             Optional run number, to be used for repos containing multiple runs
+        ccds : `list` of `str`, optional
+            The CCDs to process. Defaults to all those in the run.
         """
         self.log.info("Running eotest routines direct")
+        run = self._checkRun(butler, run)
+        self._runEotest(butler, {run: self.config.eotestOutputPath}, ccds=ccds)
+
+    def _checkRun(self, butler, run):
+        """Check that a run is in the repo, or find the only run in it.
 
-        # Input testing to check that run is in the repo
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        run : `str` or `int`
+            The run, or None if the repo should contain only one
+
+        Returns
+        -------
+        run : `str`
+            The run
+        """
         runs = butler.queryMetadata('raw', ['run'])
         if run is None:
             if len(runs) == 1:
-                run = runs[0]
-            else:
-                raise RuntimeError("Butler query found %s for runs. eotest datasets must have a run number,"
-                                   "and you must specify which run to use if a respoitory contains several."
-                                   % runs)
-        else:
-            run = str(run)
-            if run not in runs:
-                raise RuntimeError("Butler query found %s for runs, but the run specified (%s) "
-                                   "was not among them." % (runs, run))
-        del runs  # we have run defined now, so remove this to avoid potential confusion later
+                return runs[0]
+            raise RuntimeError("Butler query found %s for runs. eotest datasets must have a run number,"
+                               "and you must specify which run to use if a respoitory contains several."
+                               % runs)
+        run = str(run)
+        if run not in runs:
+            raise RuntimeError("Butler query found %s for runs, but the run specified (%s) "
+                               "was not among them." % (runs, run))
+        return run
 
-        if not os.path.exists(self.config.eotestOutputPath):
-            os.makedirs(self.config.eotestOutputPath)
+    def _selectCcds(self, index, ccds):
+        """Get the CCDs of a run to process.
 
-        ccds = butler.queryMetadata('raw', ['ccd'])
-        imTypes = butler.queryMetadata('raw', ['imageType'])
-        testTypes = butler.queryMetadata('raw', ['testType'])
-
-        ################################
-        ################################
-        # Run the Fe55 task
-        if self.config.doFe55:
-            fe55TaskDataId = {'run': run, 'testType': 'FE55', 'imageType': 'FE55'}
-            self.log.info("Starting Fe55 pixel task")
-            for ccd in ccds:
-                if 'FE55' not in testTypes:
-                    msg = "No Fe55 tests found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping Fe55 task")
-                        break
-                fe55Filenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                    'ccd': ccd})[0][:-3]
-                                 for visit in butler.queryMetadata('raw', ['visit'], dataId=fe55TaskDataId)]
-                self.log.trace("Fe55Task: Processing %s with %s files" % (ccd, len(fe55Filenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = self.fe55.run(sensor_id=ccd, infiles=fe55Filenames, mask_files=maskFiles)
-                # gainsPropSet = dafBase.PropertySet()
-                # for amp, gain in gains.items():  # there is no propSet.fromDict() method so make like this
-                #     gainsPropSet.addDouble(str(amp), gain)
-                butler.put(gains, 'eotest_gain', dataId={'ccd': ccd, 'run': run})
-            del fe55TaskDataId
-
-        # TODO: validate the results above, and/or change code to (be able to) always run
+        Parameters
+        ----------
+        index : `lsst.cp.pipe.RawFilenameIndex`
+            The index of the run's raw files
+        ccds : `list` of `str`
+            The CCDs to process, or None for all those in the run
+
+        Returns
+        -------
+        ccds : `list` of `str`
+            The CCDs, in the order of the index
+        """
+        runCcds = index.getCcds()
+        if ccds is None:
+            return runCcds
+        missing = [ccd for ccd in ccds if ccd not in runCcds]
+        if missing:
+            raise RuntimeError("Run %s has data for CCDs %s, but the CCDs specified %s were not "
+                               "among them." % (index.run, runCcds, missing))
+        return [ccd for ccd in runCcds if ccd in ccds]
+
+    @pipeBase.timeMethod
+    def runEotestBatch(self, butler, runs=None):
+        """Generate calibration products using eotest algorithms for several runs at once.
+
+        This is equivalent to calling runEotestDirect() for each run, writing the outputs of each to a
+        directory named after the run in config.eotestOutputPath, but the registry is queried once for all
+        the runs, and the (run, stage, ccd) units of all of them share the pool of worker processes.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        runs : `list` of `str` or `int`, optional
+            The runs to process. Defaults to all the runs in the repo.
+        """
+        self.log.info("Running eotest routines direct in batch mode")
+
+        repoRuns = [str(run) for run in butler.queryMetadata('raw', ['run'])]
+        if runs is None:
+            runs = repoRuns
+        runs = [str(run) for run in runs]
+        missing = [run for run in runs if run not in repoRuns]
+        if missing:
+            raise RuntimeError("Butler query found %s for runs, but the runs specified %s were not among "
+                               "them." % (repoRuns, missing))
+        if not runs:
+            raise RuntimeError("No runs to process")
+
+        self._runEotest(butler, dict((run, os.path.join(self.config.eotestOutputPath, run)) for run in runs))
+
+    def _runEotest(self, butler, outputPaths, ccds=None):
+        """Run the eotest stages over some runs.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        outputPaths : `dict` of `str`: `str`
+            The output directory of each run to process
+        ccds : `list` of `str`, optional
+            The CCDs to process. Defaults to all those in each run.
+        """
+        for path in [self.config.eotestOutputPath] + list(outputPaths.values()):
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+        # TODO: validate the Fe55 results, and/or change code to (be able to) always run
         # over all files instead of stopping at the "required accuracy"
         # This will require making changes to the eotest code.
         # DM-12939
 
-        ################################
-        ################################
-        # Run the Noise task
-        if self.config.doReadNoise:
-            # note that LCA-10103 defines the Fe55 bias frames as the ones to use here
-            self.log.info("Starting readNoise task")
-            noiseTaskDataId = {'run': run, 'testType': 'FE55', 'imageType': 'BIAS'}
-            for ccd in ccds:
-                if ('FE55' not in testTypes) or ('BIAS' not in imTypes):
-                    msg = "Required data for readNoise unavailable. Available data:\
-                           \ntestTypes: %s\nimageTypes: %s" % (testTypes, imTypes)
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping noise task")
-                noiseFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                     'ccd': ccd})[0][:-3]
-                                  for visit in butler.queryMetadata('raw', ['visit'],
-                                                                    dataId=noiseTaskDataId)]
-                self.log.trace("Fe55Task: Processing %s with %s files" % (ccd, len(noiseFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
-                self.readNoise.run(sensor_id=ccd, bias_files=noiseFilenames,
-                                   gains=gains, mask_files=maskFiles)
-            del noiseTaskDataId
-
-        ################################
-        ################################
-        # Run the bright task
-        if self.config.doBrightPixels:
-            self.log.info("Starting bright pixel task")
-            brightTaskDataId = {'run': run, 'testType': 'DARK', 'imageType': 'DARK'}
-            for ccd in ccds:
-                if 'DARK' not in testTypes:
-                    msg = "No dark tests found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping bright pixel task")
-                        break
-                darkFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                    'ccd': ccd})[0][:-3]
-                                 for visit in butler.queryMetadata('raw', ['visit'],
-                                                                   dataId=brightTaskDataId)]
-                self.log.trace("BrightTask: Processing %s with %s files" % (ccd, len(darkFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
-                self.brightPixels.run(sensor_id=ccd, dark_files=darkFilenames,
-                                      mask_files=maskFiles, gains=gains)
-            del brightTaskDataId
-
-        ################################
-        ################################
-        # Run the dark task
-        if self.config.doDarkPixels:
-            self.log.info("Starting dark pixel task")
-            darkTaskDataId = {'run': run, 'testType': 'SFLAT_500', 'imageType': 'FLAT'}
-            for ccd in ccds:
-                if 'SFLAT_500' not in testTypes:
-                    msg = "No superflats found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping dark pixel task")
-                        break
-                sflatFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                     'ccd': ccd})[0][:-3]
-                                  for visit in butler.queryMetadata('raw', ['visit'],
-                                                                    dataId=darkTaskDataId)]
-                self.log.trace("DarkTask: Processing %s with %s files" % (ccd, len(sflatFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                self.darkPixels.run(sensor_id=ccd, sflat_files=sflatFilenames, mask_files=maskFiles)
-            del darkTaskDataId
-
-        ################################
-        ################################
-        # Run the trap task
-        if self.config.doTraps:
-            self.log.info("Starting trap task")
-            trapTaskDataId = {'run': run, 'testType': 'TRAP', 'imageType': 'PPUMP'}
-            for ccd in ccds:
-                if ('TRAP' not in testTypes) and ('PPUMP' not in imTypes):
-                    msg = "No pocket pumping exposures found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping trap task")
-                        break
-                trapFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                    'ccd': ccd})[0][:-3]
-                                 for visit in butler.queryMetadata('raw', ['visit'], dataId=trapTaskDataId)]
-                if len(trapFilenames) != 1:  # eotest can't handle more than one
-                    self.log.fatal("Trap Task: Found more than one ppump trap file: %s" % trapFilenames)
-                self.log.trace("Trap Task: Processing %s with %s files" % (ccd, len(trapFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
-                self.traps.run(sensor_id=ccd, pocket_pumped_file=trapFilenames[0],
-                               mask_files=maskFiles, gains=gains)
-            del trapTaskDataId
-
-        ################################
-        ################################
-        # Run the CTE task
-        if self.config.doCTE:
-            self.log.info("Starting CTE task")
-            cteTaskDataId = {'run': run, 'testType': 'SFLAT_500', 'imageType': 'FLAT'}
-            for ccd in ccds:
-                if 'SFLAT_500' not in testTypes:
-                    msg = "No superflats found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping CTE task")
-                        break
-                sflatFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                     'ccd': ccd})[0][:-3]
-                                  for visit in butler.queryMetadata('raw', ['visit'], dataId=cteTaskDataId)]
-                self.log.trace("CTETask: Processing %s with %s files" % (ccd, len(sflatFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                self.cte.run(sensor_id=ccd, superflat_files=sflatFilenames, mask_files=maskFiles)
-            del cteTaskDataId
-
-        ################################
-        ################################
-        # Run the flatPair task
-        if self.config.doFlatPair:
-            self.log.info("Starting flatPair task")
-            flatPairDataId = {'run': run, 'testType': 'FLAT', 'imageType': 'FLAT'}
-            for ccd in ccds:
-                if 'FLAT' not in testTypes:
-                    msg = "No dataset for flat_pairs found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping flatPair task")
-                        break
-                flatPairFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                'ccd': ccd})[0][:-3]
-                                     for visit in butler.queryMetadata('raw', ['visit'],
-                                                                       dataId=flatPairDataId)]
-                # Note that eotest needs the original filename as written by the test-stand data acquisition
-                # system, as that is the only place the flat pair-number is recorded, so we have to resolve
-                # sym-links and pass in the *original* paths/filenames here :(
-                # Also, there is no "flat-pair" test type, so all FLAT/FLAT imType/testType will appear here
-                # so we need to filter these for only the pair acquisitions (as the eotest code looks like it
-                # isn't totally thorough on rejecting the wrong types of data here)
-                # TODO: adding a translator to obs_comCam and ingesting this would allow this to be done
-                # by the butler instead of here. DM-12939
-                flatPairFilenames = [os.path.realpath(f) for f in flatPairFilenames if
-                                     os.path.realpath(f).find('flat1') != -1 or
-                                     os.path.realpath(f).find('flat2') != -1]
-                if not flatPairFilenames:
-                    raise RuntimeError("No flatPair files found.")
-                self.log.trace("FlatPairTask: Processing %s with %s files" % (ccd, len(flatPairFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
-                self.flatPair.run(sensor_id=ccd, infiles=flatPairFilenames, mask_files=maskFiles,
-                                  gains=gains, max_pd_frac_dev=self.config.flatPairMaxPdFracDev)
-            del flatPairDataId
-
-        ################################
-        ################################
-        # Run the PTC task
-        if self.config.doPTC:
-            self.log.info("Starting PTC task")
-            ptcDataId = {'run': run, 'testType': 'FLAT', 'imageType': 'FLAT'}
-            for ccd in ccds:
-                if 'FLAT' not in testTypes:
-                    msg = "No dataset for flat_pairs found. Available data: %s" % testTypes
-                    if self.config.requireAllEOTests:
-                        raise RuntimeError(msg)
-                    else:
-                        self.log.warn(msg + "\nSkipping PTC task")
-                        break
-                ptcFilenames = [butler.get('raw_filename', dataId={'visit': visit,
-                                                                   'ccd': ccd})[0][:-3]
-                                for visit in butler.queryMetadata('raw', ['visit'], dataId=ptcDataId)]
-                # Note that eotest needs the original filename as written by the test-stand data acquisition
-                # system, as that is the only place the flat pair-number is recorded, so we have to resolve
-                # sym-links and pass in the *original* paths/filenames here :(
-                # Also, there is no "flat-pair" test type, so all FLAT/FLAT imType/testType will appear here
-                # so we need to filter these for only the pair acquisitions (as the eotest code looks like it
-                # isn't totally thorough on rejecting the wrong types of data here)
-                # TODO: adding a translator to obs_comCam and ingesting this would allow this to be done
-                # by the butler instead of here. DM-12939
-                ptcFilenames = [os.path.realpath(f) for f in ptcFilenames if
-                                os.path.realpath(f).find('flat1') != -1 or
-                                os.path.realpath(f).find('flat2') != -1]
-                if not ptcFilenames:
-                    raise RuntimeError("No flatPair files found")
-                self.log.trace("PTCTask: Processing %s with %s files" % (ccd, len(ptcFilenames)))
-                maskFiles = self._getMaskFiles(self.config.eotestOutputPath, ccd)
-                gains = butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
-                self.ptc.run(sensor_id=ccd, infiles=ptcFilenames, mask_files=maskFiles, gains=gains)
-            del ptcDataId
-
-        self._cleanupEotest(self.config.eotestOutputPath)
+        # the images of an earlier call are dropped, as its outputs, e.g. the masks, may be rewritten
+        self.exposurePool.clear()
+
+        # the result cache, stager, timeline and profiles are shared by all the runs
+        resultCache = self._makeResultCache()
+        stager = self._makeInputStager()
+        timeline = Timeline()
+        profiles = []
+        eotestRuns = {}
+        for run, index in self._getRawFilenameIndices(butler, outputPaths).items():
+            outputPath = outputPaths[run]
+            if outputPath != self.config.eotestOutputPath:
+                self._makeRunSubtasks(run, outputPath)
+            runCcds = self._selectCcds(index, ccds)
+            manifest = CompletionManifest(os.path.join(outputPath, 'eotestManifest.json'))
+            eotestRuns[run] = pipeBase.Struct(run=run, outputPath=outputPath, rawIndex=index, ccds=runCcds,
+                                              flatPairIndex=self._getFlatPairIndex(outputPath, run),
+                                              flatPairs={},
+                                              manifest=manifest,
+                                              maskRegistry=self._makeMaskRegistry(outputPath, run, runCcds,
+                                                                                  manifest),
+                                              resultCache=resultCache,
+                                              stager=stager,
+                                              intermediates=IntermediateTracker(log=self.log),
+                                              timeline=timeline,
+                                              profiles=profiles)
+        scheduler = self._planEotestUnits(eotestRuns)
+
+        if self.gainCache is None or self.gainCache.butler is not butler:
+            self.gainCache = GainCache(butler)
+        for run, eotestRun in eotestRuns.items():
+            stages = set(unit.stage for unit in scheduler.units if unit.run == run)
+            if (not any('gains' in stage.produces for stage in stages) and
+                    any('gains' in stage.consumes for stage in stages)):
+                # Fe55 isn't being run, so the gains must come from an earlier run; read them all up front
+                self.gainCache.preload(eotestRun.ccds, run)
+        try:
+            quarantined = self._runUnits(eotestRuns, scheduler)
+        finally:
+            if stager is not None:
+                stager.close()
+            if len(timeline) > 0:
+                timeline.writeJson(os.path.join(self.config.eotestOutputPath, 'eotestTimeline.json'))
+                self._logTimelineSummary(timeline)
+            profiles = [path for path in profiles if os.path.exists(path)]
+            if profiles and self.config.profileSummaryLength > 0:
+                summaryPath = os.path.join(self.config.eotestOutputPath, 'profile', 'summary.txt')
+                if not os.path.exists(os.path.dirname(summaryPath)):
+                    os.makedirs(os.path.dirname(summaryPath))
+                summarizeProfiles(profiles, summaryPath, self.config.profileSummaryLength)
+                self.log.info("Wrote a summary of %d profiles to %s" % (len(profiles), summaryPath))
+
+        # summed over the units, as those run in worker processes used the workers' pools
+        poolStats = dict((name, sum(event['args'].get('exposurePool' + name.capitalize(), 0)
+                                    for event in timeline.events)) for name in _EXPOSURE_POOL_STATS)
+        for name in _EXPOSURE_POOL_STATS:
+            self.metadata.set('exposurePool%s' % name.capitalize(), poolStats[name])
+        self.log.info("Exposure pool: %(hits)d hits, %(misses)d misses, %(evictions)d evictions" % poolStats)
+
+        for outputPath in outputPaths.values():
+            self._cleanupEotest(outputPath)
+        self._writeQuarantine(eotestRuns, quarantined)
+        if quarantined:
+            failures = ", ".join("%s on %s" % (entry.unit.stage.name, entry.unit.ccd)
+                                 for entry in quarantined)
+            msg = ("%d eotest tasks failed and were quarantined, and %d tasks depending on them were "
+                   "skipped: %s" % (len(quarantined), sum(len(entry.skipped) for entry in quarantined),
+                                    failures))
+            if self.config.requireAllEOTests:
+                raise RuntimeError(msg)
+            self.log.warn(msg)
         self.log.info("Finished running EOTest")
+
+    def _writeQuarantine(self, eotestRuns, quarantined):
+        """Write the quarantined units of each run to eotestQuarantine.json in its output directory.
+
+        The file of a run with no quarantined units is removed, so that it only ever describes the last run.
+
+        Parameters
+        ----------
+        eotestRuns : `dict` of `str`: `lsst.pipe.base.Struct`
+            The state of each eotest run, as made by _runEotest()
+        quarantined : `list` of `lsst.pipe.base.Struct`
+            The quarantined units, from _runUnits()
+        """
+        for run, eotestRun in eotestRuns.items():
+            path = os.path.join(eotestRun.outputPath, 'eotestQuarantine.json')
+            entries = [dict(stage=entry.unit.stage.name, ccd=entry.unit.ccd, error=entry.error,
+                            attempts=entry.attempts, skipped=[unit.stage.name for unit in entry.skipped])
+                       for entry in quarantined if entry.unit.run == run]
+            if entries:
+                with open(path, 'w') as f:
+                    json.dump(entries, f, indent=1)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def planEotestQueue(self, butler, workQueue, run=None, ccds=None):
+        """Push the (stage, ccd) units of work of a run onto a queue, to be run by runEotestWorker().
+
+        The units and their dependencies are those runEotestDirect() would run. Units already in the queue,
+        e.g. from an earlier plan of the same run, are left as they are, so replanning an interrupted
+        campaign only adds what is missing.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        workQueue : `lsst.cp.pipe.WorkQueue`
+            The queue
+        run : `str` or `int`
+            Optional run number, to be used for repos containing multiple runs
+        ccds : `list` of `str`, optional
+            The CCDs to process. Defaults to all those in the run.
+
+        Returns
+        -------
+        nUnits : `int`
+            The number of units planned
+        """
+        run = self._checkRun(butler, run)
+        outputPath = self.config.eotestOutputPath
+        if not os.path.exists(outputPath):
+            os.makedirs(outputPath)
+        # the index is saved in the output directory, where the workers read it
+        index = self._getRawFilenameIndices(butler, {run: outputPath})[run]
+        eotestRun = pipeBase.Struct(run=run, outputPath=outputPath, rawIndex=index,
+                                    ccds=self._selectCcds(index, ccds))
+        scheduler = self._planEotestUnits({run: eotestRun})
+        workQueue.push(scheduler.units, dict((unit.key, scheduler.getDependencies(unit))
+                                             for unit in scheduler.units))
+        self.log.info("Queued %d eotest units of run %s" % (len(scheduler.units), run))
+        return len(scheduler.units)
+
+    def _makeWorkerRun(self, butler, run):
+        """Make the state of a run for a worker of a queue, reading the index saved by planEotestQueue().
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        run : `str`
+            The run
+
+        Returns
+        -------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the run, like that made by _runEotest(), but without its manifest, mask registry,
+            result cache or stager
+        """
+        outputPath = self.config.eotestOutputPath
+        indexFile = os.path.join(outputPath, 'rawFilenameIndex_%s.json' % run)
+        if os.path.exists(indexFile):
+            index = RawFilenameIndex.readJson(indexFile)
+        else:
+            index = RawFilenameIndex.fromButler(butler, run)
+        return pipeBase.Struct(run=run, outputPath=outputPath, rawIndex=index,
+                               flatPairIndex=self._getFlatPairIndex(outputPath, run), flatPairs={},
+                               maskRegistry=None, intermediates=IntermediateTracker(log=self.log),
+                               timeline=Timeline(), profiles=[])
+
+    def _runQueuedUnit(self, eotestRun, unit, workQueue):
+        """Run a unit of work leased from a queue.
+
+        The masks written by the units already done on the CCD, possibly by other workers, are found in the
+        shared output directory, attributed to their stages using the outputs recorded in the queue. The
+        gains are read back through the butler.
+
+        Parameters
+        ----------
+        eotestRun : `lsst.pipe.base.Struct`
+            The state of the run, from _makeWorkerRun()
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit of work
+        workQueue : `lsst.cp.pipe.WorkQueue`
+            The queue from which it was leased
+
+        Returns
+        -------
+        outputs : `list` of `str`
+            The files written by the unit
+        """
+        outputPath = eotestRun.outputPath
+        doneOutputs = workQueue.getOutputs(unit.run, unit.ccd)
+        origins = dict((path, stageName) for stageName, paths in doneOutputs.items() for path in paths)
+        eotestRun.maskRegistry = MaskRegistry([stage.name for stage in EOTEST_STAGES])
+        eotestRun.maskRegistry.scanDirectory(outputPath, [unit.ccd], origins)
+        kwargs = self._makeRunArgs(eotestRun, unit)
+
+        before = self._listSensorFiles(outputPath, unit.ccd)
+        intermediatesBefore = self._listIntermediateFiles(outputPath, unit.ccd)
+        self.log.info("Starting %s task on %s" % (unit.stage.name, unit.ccd))
+        profilePath = None
+        if unit.stage.name in self.config.profileStages:
+            profilePath = self._getProfilePath(eotestRun, unit)
+        result, measurements = self._callSubtask(unit.stage.name, unit.run, kwargs, profilePath)
+        self._recordMeasurements(eotestRun, unit, measurements)
+
+        after = self._listSensorFiles(outputPath, unit.ccd)
+        if 'gains' in unit.stage.produces:
+            self.gainCache.put(result, unit.ccd, unit.run)
+        eotestRun.intermediates.add(unit.ccd, unit.stage.name,
+                                    self._listIntermediateFiles(outputPath, unit.ccd) - intermediatesBefore)
+        keepStages = set()
+        for stageName in workQueue.getPendingStages(unit.run, unit.ccd):
+            if stageName != unit.stage.name:
+                keepStages.update(getStage(stageName).usesIntermediates)
+        eotestRun.intermediates.release(unit.ccd, keepStages)
+        return [path for path in after if after[path] != before.get(path)]
+
+    def runEotestWorker(self, butler, workQueue, workerId=None, pollInterval=1., idleTimeout=None):
+        """Run units of work leased from a queue filled by planEotestQueue(), until it is finished.
+
+        Any number of workers, on any number of nodes, may share a queue, as long as they see the same repo
+        and config.eotestOutputPath. A worker renews the lease of the unit it is running in the background,
+        so if it dies its unit is handed to another worker once the lease expires. A unit which fails is
+        recorded in the queue, and everything which depends on it skipped, but the worker carries on.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data to be used
+        workQueue : `lsst.cp.pipe.WorkQueue`
+            The queue
+        workerId : `str`, optional
+            Identifier of the worker. Defaults to the hostname and process id.
+        pollInterval : `float`, optional
+            Seconds to wait before trying again when no unit is ready
+        idleTimeout : `float`, optional
+            Stop after this many seconds without a unit to run, even if the queue is not finished
+
+        Returns
+        -------
+        counts : `lsst.pipe.base.Struct`
+            The number of units which this worker completed (nDone) and which failed (nFailed)
+        """
+        if workerId is None:
+            workerId = '%s_%d' % (socket.gethostname(), os.getpid())
+        self.log.info("Starting eotest worker %s" % workerId)
+        if self.gainCache is None or self.gainCache.butler is not butler:
+            self.gainCache = GainCache(butler)
+        eotestRuns = {}
+        nDone = nFailed = 0
+        lastUnit = time.time()
+        while True:
+            unit = workQueue.lease(workerId)
+            if unit is None:
+                if workQueue.isFinished():
+                    break
+                if idleTimeout is not None and time.time() - lastUnit > idleTimeout:
+                    self.log.info("No eotest units ready for %.0f s; stopping" % idleTimeout)
+                    break
+                time.sleep(pollInterval)
+                continue
+
+            if unit.run not in eotestRuns:
+                eotestRuns[unit.run] = self._makeWorkerRun(butler, unit.run)
+            lost = None
+            try:
+                with _keepLeased(workQueue, unit, workerId, log=self.log) as lost:
+                    outputs = self._runQueuedUnit(eotestRuns[unit.run], unit, workQueue)
+            except Exception:
+                error = traceback.format_exc()
+                self.log.warn("%s task on %s failed:\n%s" % (unit.stage.name, unit.ccd, error))
+                if lost is not None and lost.is_set():
+                    self.log.warn("Lost the lease of %s task on %s, so not recording its failure" %
+                                  (unit.stage.name, unit.ccd))
+                else:
+                    workQueue.fail(unit, workerId, error)
+                    nFailed += 1
+            else:
+                # once the lease is lost another worker may be running the unit, so its outcome isn't recorded
+                if not lost.is_set() and workQueue.complete(unit, workerId, outputs):
+                    nDone += 1
+                else:
+                    self.log.warn("Lost the lease of %s task on %s, so it may be rerun" %
+                                  (unit.stage.name, unit.ccd))
+            lastUnit = time.time()
+
+        for run, eotestRun in eotestRuns.items():
+            if len(eotestRun.timeline) > 0:
+                eotestRun.timeline.writeJson(os.path.join(eotestRun.outputPath,
+                                                          'eotestTimeline_%s_%s.json' % (run, workerId)))
+        self.log.info("Eotest worker %s finished: %d units done, %d failed" % (workerId, nDone, nFailed))
+        return pipeBase.Struct(nDone=nDone, nFailed=nFailed)
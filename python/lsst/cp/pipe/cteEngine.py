@@ -0,0 +1,197 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""An EPER charge transfer efficiency analysis vectorized over the superflats and amplifiers of a CCD, as an
+alternative to eotest's CteTask."""
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import os
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.eotest.sensor as sensorTest
+import lsst.pipe.base as pipeBase
+
+from .ampImages import getAmps, readAmpGeometry, getOverscanColumns, fitRowBias, readSegmentRows, \
+    readMaskStack
+from .engineConfigs import NumpyCteConfig
+from .exposurePool import ExposurePool
+
+__all__ = ["measureEper", "NumpyCteTask"]
+
+# Number of serial overscan columns at the end of each row left out of the bias level, as eotest does to
+# avoid the bright last column of e2v sensors
+_SERIAL_BIAS_END_SKIP = 4
+
+
+def measureEper(lastPixels, trailingPixels, biasPixels, nTransfers, masked=None):
+    """Measure the charge transfer inefficiency of some amplifiers by extended pixel edge response (EPER).
+
+    As eotest does, the charge trailing out of the last imaging row or column into the first overscan rows
+    or columns is divided by the signal in the last imaging row or column, and by the number of transfers
+    it made, each level being measured above the bias level of the overscan beyond the trailing charge.
+
+    Parameters
+    ----------
+    lastPixels : `numpy.ndarray`
+        The (amp, pixel) last imaging row or column of each amplifier
+    trailingPixels : `numpy.ndarray`
+        The (amp, overscan, pixel) first overscan rows or columns after it
+    biasPixels : `numpy.ndarray`
+        The (amp, ...) overscan pixels which measure the bias level
+    nTransfers : `int`
+        Number of transfers made by the charge in the last imaging row or column
+    masked : `numpy.ndarray`, optional
+        The boolean (amp, pixel) array of masked pixels of the last imaging row or column
+
+    Returns
+    -------
+    eper : `lsst.pipe.base.Struct`
+        - ``cti``: the charge transfer inefficiency of each amplifier (`numpy.ndarray`)
+        - ``error``: its statistical error, from the noise in the bias pixels (`numpy.ndarray`)
+        - ``signal``: the signal in the last imaging row or column above the bias (`numpy.ndarray`)
+    """
+    nAmps, nOverscans, nPixels = trailingPixels.shape
+    biasPixels = biasPixels.reshape(nAmps, -1)
+    if biasPixels.shape[1] > 1:
+        bias = biasPixels.mean(axis=1, dtype=np.float64)
+        biasSigma = biasPixels.std(axis=1, ddof=1, dtype=np.float64)
+    else:  # no overscan left beyond the trailing charge, so rely on the subtraction of the serial overscan
+        bias = np.zeros(nAmps)
+        biasSigma = np.full(nAmps, np.nan)
+    good = np.ones(lastPixels.shape, dtype=bool) if masked is None else ~masked
+    with np.errstate(invalid='ignore', divide='ignore'):
+        signal = np.where(good, lastPixels, 0).sum(axis=1, dtype=np.float64)/good.sum(axis=1) - bias
+        trailed = (trailingPixels.mean(axis=2, dtype=np.float64) - bias[:, np.newaxis]).sum(axis=1)
+        cti = trailed/signal/nTransfers
+        error = np.sqrt(nOverscans/nPixels)*biasSigma/signal/nTransfers
+    return pipeBase.Struct(cti=cti, error=error, signal=signal)
+
+
+class NumpyCteTask(pipeBase.Task):
+    """Measure the serial and parallel charge transfer inefficiency of a CCD from its superflats.
+
+    This is a replacement for eotest's CteTask, selected with CpTaskConfig.cteEngine, with the same run()
+    arguments and outputs: CTI_<LEVEL>_SERIAL, CTI_<LEVEL>_PARALLEL and their errors in the sensor's eotest
+    results file. Rather than median-stacking the whole superflats into <sensor>_superflat_<level>.fits and
+    measuring each amplifier of it in turn, only the strips of pixels around the edges of the imaging
+    regions which EPER uses are read, from all the frames and amplifiers into one array. Each frame is
+    bias-subtracted by its serial overscan, as eotest's superflat is, before they are median-stacked and
+    the inefficiencies of all the amplifiers measured together.
+    """
+    ConfigClass = NumpyCteConfig
+    _DefaultName = "numpyCte"
+
+    # largest expected relative differences from the results of eotest's CteTask, per results column; the
+    # bias levels are fitted slightly differently, which matters as the trailed charge is small
+    TOLERANCES = {'CTI_HIGH_SERIAL': 1e-2, 'CTI_HIGH_PARALLEL': 1e-2}
+
+    def __init__(self, exposurePool=None, **kwargs):
+        pipeBase.Task.__init__(self, **kwargs)
+        # only the mask files are read through the pool; just the edges of the superflats are read
+        self.exposurePool = exposurePool if exposurePool is not None else ExposurePool(0)
+
+    @pipeBase.timeMethod
+    def run(self, sensor_id, superflat_files, bias_frame=None, flux_level='high', gains=None, mask_files=()):
+        """Measure the charge transfer inefficiency of a CCD.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        superflat_files : `list` of `str`
+            The superflats
+        bias_frame : `str`, optional
+            Not supported; the bias is taken from the serial overscan
+        flux_level : `str`
+            'high' or 'low', the level of the superflats, which names the results columns
+        gains : `dict`, optional
+            Unused, as the inefficiency is a ratio of charges; accepted so that the task can be run in place
+            of CteTask
+        mask_files : `tuple` of `str`
+            The mask files; masked pixels of the last imaging row and column are left out of the signal
+        """
+        if bias_frame is not None:
+            raise RuntimeError("NumpyCteTask does not support a bias frame")
+        if flux_level not in ('high', 'low'):
+            raise RuntimeError("flux_level must be 'high' or 'low', not %s" % flux_level)
+        superflat_files = sorted(superflat_files)
+        amps = getAmps(superflat_files[0])
+        geometry = readAmpGeometry(superflat_files[0], amps[0])
+        overscanColumns = getOverscanColumns(geometry)
+        rows, columns = geometry.imaging
+        ny, nx = geometry.shape
+        nOverscans = self.config.overscans
+        if overscanColumns is None or nx - columns.stop < nOverscans or ny - rows.stop < nOverscans:
+            raise RuntimeError("%s has fewer than %d serial and parallel overscans in which to measure EPER" %
+                               (superflat_files[0], nOverscans))
+
+        serial, parallel = self._readEdges(superflat_files, amps, geometry, overscanColumns)
+        masked = readMaskStack(self.exposurePool, mask_files, amps, geometry)
+        # the serial strip starts at the last imaging column, and the parallel one at the last imaging row
+        serialEper = measureEper(serial[:, rows, 0], serial[:, rows, 1:nOverscans + 1].transpose(0, 2, 1),
+                                 serial[:, rows, nOverscans + 1:serial.shape[2] - _SERIAL_BIAS_END_SKIP],
+                                 columns.stop, masked[:, :, -1])
+        parallelEper = measureEper(parallel[:, 0, :], parallel[:, 1:nOverscans + 1, :],
+                                   parallel[:, nOverscans + 1:, :], rows.stop, masked[:, -1, :])
+
+        results = sensorTest.EOTestResults(os.path.join(self.config.output_dir,
+                                                        '%s_eotest_results.fits' % sensor_id),
+                                           namps=len(amps))
+        level = flux_level.upper()
+        for i, amp in enumerate(amps):
+            results.add_seg_result(amp, 'CTI_%s_SERIAL' % level, float(serialEper.cti[i]))
+            results.add_seg_result(amp, 'CTI_%s_SERIAL_ERROR' % level, float(serialEper.error[i]))
+            results.add_seg_result(amp, 'CTI_%s_PARALLEL' % level, float(parallelEper.cti[i]))
+            results.add_seg_result(amp, 'CTI_%s_PARALLEL_ERROR' % level, float(parallelEper.error[i]))
+            self.log.info("%s: amp %d %s flux serial CTI %.3g, parallel CTI %.3g" %
+                          (sensor_id, amp, flux_level, serialEper.cti[i], parallelEper.cti[i]))
+        results.write()
+
+    def _readEdges(self, paths, amps, geometry, overscanColumns):
+        """Read the strips around the edges of the imaging regions which EPER uses, bias-subtracted and
+        median-stacked over the frames.
+
+        Returns the (amp, row, column) serial strip, of all the rows from the last imaging column to the end
+        of the serial overscan, and the parallel strip, of the imaging columns from the last imaging row to
+        the end of the parallel overscan.
+        """
+        rows, columns = geometry.imaging
+        ny, nx = geometry.shape
+        serialColumns = slice(columns.stop - 1, nx)
+        with contextlib.ExitStack() as stack:
+            frames = [stack.enter_context(fits.open(path, memmap=True, do_not_scale_image_data=True))
+                      for path in paths]
+            # (frame, amp, row, column)
+            serial = np.array([readSegmentRows(frame, amps, slice(0, ny), serialColumns) for frame in frames])
+            parallel = np.array([readSegmentRows(frame, amps, slice(rows.stop - 1, ny), columns)
+                                 for frame in frames])
+        biasColumns = slice(overscanColumns.start - serialColumns.start,
+                            overscanColumns.stop - serialColumns.start)
+        bias = fitRowBias(serial[:, :, :, biasColumns].mean(axis=3, dtype=np.float64), slice(0, ny),
+                          self.config.biasFitOrder).astype(np.float32)
+        serial -= bias[:, :, :, np.newaxis]
+        parallel -= bias[:, :, rows.stop - 1:, np.newaxis]
+        return np.median(serial, axis=0), np.median(parallel, axis=0)
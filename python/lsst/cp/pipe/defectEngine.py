@@ -0,0 +1,273 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Bright and dark pixel finding on stacks made out of core, as alternatives to eotest's BrightPixelsTask
+and DarkPixelsTask."""
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import os
+import warnings
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.eotest.sensor as sensorTest
+import lsst.pipe.base as pipeBase
+
+from .ampImages import CHANNEL_IDS, getAmps, readAmpGeometry, fitSerialBias, readSegmentRows, readMaskStack
+from .engineConfigs import NumpyBrightPixelsConfig, NumpyDarkPixelsConfig
+from .exposurePool import ExposurePool
+
+__all__ = ["stackSegments", "findDefectColumns", "writeMaskFile", "NumpyBrightPixelsTask",
+           "NumpyDarkPixelsTask"]
+
+# The bit of the BAD mask plane, which eotest's defect tasks set in their masks
+_BAD_BIT = 0
+
+
+def stackSegments(paths, amps, method='median', nSigmaClip=3., nClipIterations=3, maxChunkBytes=256*1024**2):
+    """Stack the whole segments of some amplifiers over a set of frames, a strip of rows at a time.
+
+    The frames are memory-mapped, and each strip of rows is read from all of them, all the amplifiers
+    together, and reduced before the next is read, so the memory used is that of the stack plus
+    maxChunkBytes, whatever the number of frames, and nothing is written to disk.
+
+    Parameters
+    ----------
+    paths : `list` of `str`
+        The frames
+    amps : `list` of `int`
+        The amplifiers, which are also the indices of their extensions
+    method : `str`
+        'median', as eotest stacks, or 'clippedMean' for the mean after clipping outliers
+    nSigmaClip : `float`
+        For 'clippedMean', pixels further than this many standard deviations from the mean are clipped
+    nClipIterations : `int`
+        For 'clippedMean', number of times the pixels are clipped
+    maxChunkBytes : `int`
+        Maximum size of the pixels of all the frames held at once
+
+    Returns
+    -------
+    stack : `numpy.ndarray`
+        The float32 (amp, row, column) stacked segments
+    """
+    if method not in ('median', 'clippedMean'):
+        raise ValueError("Unknown stacking method %s" % method)
+    with contextlib.ExitStack() as exitStack:
+        frames = [exitStack.enter_context(fits.open(path, memmap=True, do_not_scale_image_data=True))
+                  for path in paths]
+        ny, nx = frames[0][amps[0]].data.shape
+        rowsPerChunk = max(1, min(ny, maxChunkBytes//(len(paths)*len(amps)*nx*4)))
+        stack = np.empty((len(amps), ny, nx), dtype=np.float32)
+        for start in range(0, ny, rowsPerChunk):
+            rows = slice(start, min(start + rowsPerChunk, ny))
+            pixels = np.array([readSegmentRows(frame, amps, rows, slice(0, nx)) for frame in frames])
+            if method == 'median':
+                stack[:, rows] = np.median(pixels, axis=0)
+                continue
+            with warnings.catch_warnings(), np.errstate(invalid='ignore'):
+                warnings.simplefilter('ignore', RuntimeWarning)  # a pixel clipped in every frame is NaN
+                for iteration in range(nClipIterations):
+                    mean = np.nanmean(pixels, axis=0)
+                    sigma = np.nanstd(pixels, axis=0)
+                    pixels[np.abs(pixels - mean) > nSigmaClip*sigma] = np.nan
+                stack[:, rows] = np.nanmean(pixels, axis=0)
+    return stack
+
+
+def findDefectColumns(defects, colthresh):
+    """Split defective pixels into defective columns and the remaining single pixels, as eotest does.
+
+    Parameters
+    ----------
+    defects : `numpy.ndarray`
+        The boolean (amp, row, column) array of defective imaging pixels
+    colthresh : `int`
+        A column with more than this many defective pixels is a defective column
+
+    Returns
+    -------
+    pixels : `numpy.ndarray`
+        The boolean (amp, row, column) array of defective pixels outside the defective columns
+    columns : `numpy.ndarray`
+        The boolean (amp, column) array of defective columns
+    """
+    columns = defects.sum(axis=1) > colthresh
+    return defects & ~columns[:, np.newaxis, :], columns
+
+
+def writeMaskFile(path, amps, geometry, pixels, columns, templatePath):
+    """Write a mask file in the format of eotest's, with the BAD plane set for some pixels and columns.
+
+    Parameters
+    ----------
+    path : `str`
+        The file to write
+    amps : `list` of `int`
+        The amplifiers
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of their segments
+    pixels : `numpy.ndarray`
+        The boolean (amp, row, column) array of imaging pixels to mask
+    columns : `numpy.ndarray`
+        The boolean (amp, column) array of imaging columns to mask over the whole imaging region
+    templatePath : `str`
+        A file whose primary header is copied, as eotest does
+    """
+    output = fits.HDUList([fits.PrimaryHDU(header=fits.getheader(templatePath, 0))])
+    for i, amp in enumerate(amps):
+        mask = np.zeros(geometry.shape, dtype=np.int32)
+        mask[geometry.imaging] = np.where(pixels[i] | columns[i][np.newaxis, :], 1 << _BAD_BIT, 0)
+        hdu = fits.ImageHDU(mask, name='SEGMENT%s' % CHANNEL_IDS[amp])
+        hdu.header['MP_BAD'] = _BAD_BIT
+        output.append(hdu)
+    output.writeto(path, overwrite=True)
+
+
+class _NumpyDefectTask(pipeBase.Task):
+    """Base class of the NumPy defect tasks, which stack a CCD's frames in memory, find the defects in the
+    bias-subtracted imaging regions of the stack, and write them to a mask file and the eotest results."""
+
+    def __init__(self, exposurePool=None, **kwargs):
+        pipeBase.Task.__init__(self, **kwargs)
+        # only the mask files are read through the pool; the frames are stacked in strips
+        self.exposurePool = exposurePool if exposurePool is not None else ExposurePool(0)
+
+    def _stackImaging(self, paths):
+        """Stack the frames, returning the amplifiers, their geometry and the unbiased imaging regions."""
+        amps = getAmps(paths[0])
+        geometry = readAmpGeometry(paths[0], amps[0])
+        stack = stackSegments(paths, amps, method=self.config.stackMethod, nSigmaClip=self.config.nSigmaClip,
+                              nClipIterations=self.config.nClipIterations,
+                              maxChunkBytes=self.config.maxChunkBytes)
+        bias = fitSerialBias(stack, geometry, fitOrder=self.config.biasFitOrder)
+        images = stack[(slice(None),) + geometry.imaging]
+        images -= bias[:, :, np.newaxis].astype(np.float32)
+        return amps, geometry, images
+
+    def _writeDefects(self, sensorId, kind, amps, geometry, defects, templatePath):
+        """Write the mask file and the numbers of defective pixels and columns of each amplifier."""
+        pixels, columns = findDefectColumns(defects, self.config.colthresh)
+        writeMaskFile(os.path.join(self.config.output_dir, '%s_%s_pixel_mask.fits' % (sensorId, kind)),
+                      amps, geometry, pixels, columns, templatePath)
+        results = sensorTest.EOTestResults(os.path.join(self.config.output_dir,
+                                                        '%s_eotest_results.fits' % sensorId),
+                                           namps=len(amps))
+        nPixels = pixels.sum(axis=(1, 2))
+        nColumns = columns.sum(axis=1)
+        for i, amp in enumerate(amps):
+            results.add_seg_result(amp, 'NUM_%s_PIXELS' % kind.upper(), int(nPixels[i]))
+            results.add_seg_result(amp, 'NUM_%s_COLUMNS' % kind.upper(), int(nColumns[i]))
+            self.log.info("%s: amp %d %d %s pixels, %d %s columns" %
+                          (sensorId, amp, nPixels[i], kind, nColumns[i], kind))
+        results.write()
+
+
+class NumpyBrightPixelsTask(_NumpyDefectTask):
+    """Find the bright pixels and columns of a CCD in a stack of its dark frames.
+
+    This is a replacement for eotest's BrightPixelsTask, selected with CpTaskConfig.brightPixelsEngine,
+    with the same run() arguments and outputs: <sensor>_bright_pixel_mask.fits, and NUM_BRIGHT_PIXELS and
+    NUM_BRIGHT_COLUMNS in the sensor's eotest results file. The median of the darks is made in memory, in
+    strips of rows, rather than written to <sensor>_median_dark_bp.fits and read back, and the pixels of
+    all the amplifiers are thresholded together.
+    """
+    ConfigClass = NumpyBrightPixelsConfig
+    _DefaultName = "numpyBrightPixels"
+
+    # the stack and thresholds are eotest's, so the counts are expected to agree exactly
+    TOLERANCES = {'NUM_BRIGHT_PIXELS': 0., 'NUM_BRIGHT_COLUMNS': 0.}
+
+    @pipeBase.timeMethod
+    def run(self, sensor_id, dark_files, mask_files, gains, bias_frame=None):
+        """Find the bright pixels and columns of a CCD.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        dark_files : `list` of `str`
+            The dark frames, which must all have the same exposure time
+        mask_files : `tuple` of `str`
+            Unused, as eotest thresholds masked pixels too; accepted so that the task can be run in place of
+            BrightPixelsTask
+        gains : `dict` of `int`: `float`
+            The gain of each amplifier, in electrons per ADU
+        bias_frame : `str`, optional
+            Not supported; the bias is taken from the serial overscan
+        """
+        if bias_frame is not None:
+            raise RuntimeError("NumpyBrightPixelsTask does not support a bias frame")
+        dark_files = sorted(dark_files)
+        exptime = fits.getheader(dark_files[0], 0)['EXPTIME']
+        amps, geometry, images = self._stackImaging(dark_files)
+        scale = np.array([gains[amp] for amp in amps])/exptime
+        images *= scale.astype(np.float32)[:, np.newaxis, np.newaxis]  # electrons per second
+        self._writeDefects(sensor_id, 'bright', amps, geometry, images >= self.config.ethresh, dark_files[0])
+
+
+class NumpyDarkPixelsTask(_NumpyDefectTask):
+    """Find the dark pixels and columns of a CCD in a stack of its superflats.
+
+    This is a replacement for eotest's DarkPixelsTask, selected with CpTaskConfig.darkPixelsEngine, with
+    the same run() arguments and outputs: <sensor>_dark_pixel_mask.fits, and NUM_DARK_PIXELS and
+    NUM_DARK_COLUMNS in the sensor's eotest results file. The median of the superflats is made in memory,
+    in strips of rows, rather than written to <sensor>_median_sflat.fits and read back, and the pixels of
+    all the amplifiers are thresholded together.
+    """
+    ConfigClass = NumpyDarkPixelsConfig
+    _DefaultName = "numpyDarkPixels"
+
+    # the stack and thresholds are eotest's, so the counts are expected to agree exactly
+    TOLERANCES = {'NUM_DARK_PIXELS': 0., 'NUM_DARK_COLUMNS': 0.}
+
+    @pipeBase.timeMethod
+    def run(self, sensor_id, sflat_files, mask_files, bias_frame=None):
+        """Find the dark pixels and columns of a CCD.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        sflat_files : `list` of `str`
+            The superflat frames
+        mask_files : `tuple` of `str`
+            The mask files, whose pixels are left out of the median level of each amplifier
+        bias_frame : `str`, optional
+            Not supported; the bias is taken from the serial overscan
+        """
+        if bias_frame is not None:
+            raise RuntimeError("NumpyDarkPixelsTask does not support a bias frame")
+        sflat_files = sorted(sflat_files)
+        amps, geometry, images = self._stackImaging(sflat_files)
+        masked = readMaskStack(self.exposurePool, mask_files, amps, geometry)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # an amplifier which is all masked has no median
+            medians = np.nanmedian(np.where(masked, np.nan, images), axis=(1, 2))
+        for amp, median in zip(amps, medians):
+            if not np.isfinite(median):
+                self.log.warn("%s: amp %d has no unmasked pixels" % (sensor_id, amp))
+        defects = images <= (self.config.thresh*medians)[:, np.newaxis, np.newaxis]
+        self._writeDefects(sensor_id, 'dark', amps, geometry, defects, sflat_files[0])
@@ -0,0 +1,180 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Configs of cp_pipe's NumPy engine tasks.
+
+They are kept apart from the tasks, so that CpTaskConfig can have a field for each engine without
+importing the engines; an engine's module is imported only when its task is made.
+"""
+from __future__ import absolute_import, division, print_function
+
+import lsst.pex.config as pexConfig
+
+__all__ = ["NumpyPtcConfig", "NumpyReadNoiseConfig", "NumpyBrightPixelsConfig", "NumpyDarkPixelsConfig",
+           "NumpyCteConfig"]
+
+
+class NumpyPtcConfig(pexConfig.Config):
+    """Config for NumpyPtcTask."""
+    output_dir = pexConfig.Field(
+        dtype=str,
+        doc="Output directory, set by CpTaskConfig.validate()",
+        default='.',
+    )
+    biasFitOrder = pexConfig.Field(
+        dtype=int,
+        doc="Order of the polynomial fitted to the serial overscan of each segment, as a function of row",
+        default=1,
+    )
+    sigCut = pexConfig.Field(
+        dtype=float,
+        doc="Points further than this many standard deviations from the fitted PTC are clipped",
+        default=5.,
+    )
+    maxClipIterations = pexConfig.Field(
+        dtype=int,
+        doc="Maximum number of times the PTC is refitted after clipping",
+        default=10,
+    )
+
+
+class NumpyReadNoiseConfig(pexConfig.Config):
+    """Config for NumpyReadNoiseTask."""
+    output_dir = pexConfig.Field(
+        dtype=str,
+        doc="Output directory, set by CpTaskConfig.validate()",
+        default='.',
+    )
+    dx = pexConfig.Field(
+        dtype=int,
+        doc="Number of columns of the boxes in which the noise is measured",
+        default=100,
+    )
+    dy = pexConfig.Field(
+        dtype=int,
+        doc="Number of rows of the boxes in which the noise is measured",
+        default=100,
+    )
+    biasFitOrder = pexConfig.Field(
+        dtype=int,
+        doc="Order of the polynomial fitted to the serial overscan of each segment, as a function of row",
+        default=1,
+    )
+    nSigmaClip = pexConfig.Field(
+        dtype=float,
+        doc="Pixels further than this many standard deviations from the mean of their box are clipped",
+        default=3.,
+    )
+    nClipIterations = pexConfig.Field(
+        dtype=int,
+        doc="Number of times the pixels of each box are clipped",
+        default=3,
+    )
+    maxChunkBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum size in bytes of the pixels held at once. The frames are read in strips of rows of "
+        "boxes, all the frames and amplifiers together, no larger than this.",
+        default=256*1024**2,
+    )
+
+
+class _NumpyDefectConfig(pexConfig.Config):
+    """Config fields common to the NumPy defect tasks."""
+    output_dir = pexConfig.Field(
+        dtype=str,
+        doc="Output directory, set by CpTaskConfig.validate()",
+        default='.',
+    )
+    colthresh = pexConfig.Field(
+        dtype=int,
+        doc="A column with more than this many defective pixels is masked as a whole",
+        default=20,
+    )
+    biasFitOrder = pexConfig.Field(
+        dtype=int,
+        doc="Order of the polynomial fitted to the serial overscan of each segment, as a function of row",
+        default=1,
+    )
+    stackMethod = pexConfig.ChoiceField(
+        dtype=str,
+        doc="How the frames are stacked",
+        allowed={
+            "median": "The median of each pixel, as eotest stacks",
+            "clippedMean": "The mean of each pixel after clipping outliers",
+        },
+        default="median",
+    )
+    nSigmaClip = pexConfig.Field(
+        dtype=float,
+        doc="For the clippedMean stackMethod, pixels further than this many standard deviations from the "
+        "mean are clipped",
+        default=3.,
+    )
+    nClipIterations = pexConfig.Field(
+        dtype=int,
+        doc="For the clippedMean stackMethod, number of times the pixels are clipped",
+        default=3,
+    )
+    maxChunkBytes = pexConfig.Field(
+        dtype=int,
+        doc="Maximum size in bytes of the input pixels held at once. The frames are stacked in strips of "
+        "rows, all the frames and amplifiers together, no larger than this.",
+        default=256*1024**2,
+    )
+
+
+class NumpyBrightPixelsConfig(_NumpyDefectConfig):
+    """Config for NumpyBrightPixelsTask."""
+    ethresh = pexConfig.Field(
+        dtype=float,
+        doc="Bright pixel threshold, in electrons per pixel per second",
+        default=5.,
+    )
+
+
+class NumpyDarkPixelsConfig(_NumpyDefectConfig):
+    """Config for NumpyDarkPixelsTask."""
+    thresh = pexConfig.Field(
+        dtype=float,
+        doc="Dark pixel threshold, as a fraction of the median of the amplifier's unmasked pixels",
+        default=0.8,
+    )
+
+
+class NumpyCteConfig(pexConfig.Config):
+    """Config for NumpyCteTask."""
+    output_dir = pexConfig.Field(
+        dtype=str,
+        doc="Output directory, set by CpTaskConfig.validate()",
+        default='.',
+    )
+    overscans = pexConfig.Field(
+        dtype=int,
+        doc="Number of overscan rows/columns in which the trailed charge is measured",
+        default=2,
+    )
+    biasFitOrder = pexConfig.Field(
+        dtype=int,
+        doc="Order of the polynomial fitted to the serial overscan of each segment, as a function of row",
+        default=1,
+    )
@@ -0,0 +1,137 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Descriptions of the eotest analysis stages run by CpTask.runEotestDirect()."""
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["EotestStage", "EOTEST_STAGES", "getStage"]
+
+
+class EotestStage(object):
+    """Description of how CpTask runs one of the eotest analyses.
+
+    Each stage declares the data it processes, the products of other stages it consumes, and the products
+    it makes, so that the (stage, ccd) work units can be ordered by their real dependencies rather than by
+    a fixed sequence.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the subtask, and of its ConfigurableField in CpTaskConfig, e.g. 'fe55'.
+    doField : `str`
+        Name of the CpTaskConfig field which switches the stage on or off, e.g. 'doFe55'.
+    testType : `str`
+        The testType of the raw data processed by the stage.
+    imageType : `str`
+        The imageType of the raw data processed by the stage.
+    filesArg : `str`
+        Keyword of the subtask's run() method through which the input files are passed.
+    singleFile : `bool`
+        Does the subtask take a single file rather than a list of them?
+    flatPairsOnly : `bool`
+        Should the input files be restricted to the flat-pair acquisitions, resolving sym-links?
+    consumes : `tuple` of `str`
+        Products of other stages used by this stage. 'gains' are passed to the run() method, masks are
+        picked up from the output directory.
+    produces : `tuple` of `str`
+        Products made by this stage.
+    configArgs : `dict` of `str`: `str`
+        Extra run() keywords, mapped to the CpTaskConfig fields which supply their values.
+    usesIntermediates : `tuple` of `str`
+        Names of the stages whose intermediate (medianed) files this stage reads from the output directory.
+        The intermediate files of a CCD are deleted as soon as no stage still to run on it uses them.
+    inputsInMemory : `int` or None
+        Number of input files whose images the stage holds in memory at once, or None if it may hold all of
+        them, e.g. to stack them. Used for the first estimate of its peak memory; see MemoryModel.
+    numpyField : `str` or None
+        Name of the CpTaskConfig ConfigurableField of cp_pipe's NumPy implementation of the stage, if it has
+        one. It is run in place of the eotest task if the CpTaskConfig field <name>Engine is 'numpy'.
+    """
+
+    def __init__(self, name, doField, testType, imageType, filesArg, singleFile=False, flatPairsOnly=False,
+                 consumes=(), produces=(), configArgs=None, usesIntermediates=(), inputsInMemory=None,
+                 numpyField=None):
+        self.name = name
+        self.doField = doField
+        self.testType = testType
+        self.imageType = imageType
+        self.filesArg = filesArg
+        self.singleFile = singleFile
+        self.flatPairsOnly = flatPairsOnly
+        self.consumes = tuple(consumes)
+        self.produces = tuple(produces)
+        self.configArgs = dict(configArgs) if configArgs else {}
+        self.usesIntermediates = tuple(usesIntermediates)
+        self.inputsInMemory = inputsInMemory
+        self.numpyField = numpyField
+
+    def __repr__(self):
+        return "EotestStage(%s)" % self.name
+
+
+# The stages in the canonical eotest order, see CpTask.runEotestDirect(). Every stage picks up all the mask
+# files that exist for its sensor, but a stage is only considered to consume the masks from the stages which
+# precede it in this order, which is what the camera team's processing does. Each of the eotest tasks makes
+# its own medianed images, so none of them uses the intermediate files of another. The Fe55, read noise and
+# trap analyses work through their files one at a time; the others stack, or pair up, the whole set.
+EOTEST_STAGES = (
+    # note that LCA-10103 defines the Fe55 bias frames as the ones to use for the read noise
+    EotestStage('fe55', 'doFe55', 'FE55', 'FE55', 'infiles',
+                produces=('gains',), inputsInMemory=1),
+    EotestStage('readNoise', 'doReadNoise', 'FE55', 'BIAS', 'bias_files',
+                consumes=('gains',), inputsInMemory=1, numpyField='readNoiseNumpy'),
+    EotestStage('brightPixels', 'doBrightPixels', 'DARK', 'DARK', 'dark_files',
+                consumes=('gains',), produces=('brightPixelMask',), numpyField='brightPixelsNumpy'),
+    EotestStage('darkPixels', 'doDarkPixels', 'SFLAT_500', 'FLAT', 'sflat_files',
+                consumes=('brightPixelMask',), produces=('darkPixelMask',), numpyField='darkPixelsNumpy'),
+    EotestStage('traps', 'doTraps', 'TRAP', 'PPUMP', 'pocket_pumped_file', singleFile=True,
+                consumes=('gains', 'brightPixelMask', 'darkPixelMask'), produces=('trapMask',),
+                inputsInMemory=1),
+    EotestStage('cte', 'doCTE', 'SFLAT_500', 'FLAT', 'superflat_files',
+                consumes=('brightPixelMask', 'darkPixelMask', 'trapMask'), numpyField='cteNumpy'),
+    EotestStage('flatPair', 'doFlatPair', 'FLAT', 'FLAT', 'infiles', flatPairsOnly=True,
+                consumes=('gains', 'brightPixelMask', 'darkPixelMask', 'trapMask'),
+                configArgs={'max_pd_frac_dev': 'flatPairMaxPdFracDev'}),
+    EotestStage('ptc', 'doPTC', 'FLAT', 'FLAT', 'infiles', flatPairsOnly=True,
+                consumes=('gains', 'brightPixelMask', 'darkPixelMask', 'trapMask'), numpyField='ptcNumpy'),
+)
+
+
+def getStage(name):
+    """Get the description of an eotest stage from its name.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the stage, e.g. 'fe55'
+
+    Returns
+    -------
+    stage : `EotestStage`
+        The stage description
+    """
+    for stage in EOTEST_STAGES:
+        if stage.name == name:
+            return stage
+    raise KeyError("Unknown eotest stage %s. Known stages are %s" %
+                   (name, [stage.name for stage in EOTEST_STAGES]))
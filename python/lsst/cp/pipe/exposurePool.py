@@ -0,0 +1,150 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A memory-bounded pool of decoded amplifier images, shared by the stages run in a process."""
+from __future__ import absolute_import, division, print_function
+
+import collections
+import os
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ["ExposurePool"]
+
+
+class ExposurePool(object):
+    """Least-recently-used pool of decoded amplifier images, bounded by the number of bytes it holds.
+
+    The NumPy engines read the mask files of a CCD through the pool, so each later stage in the same process
+    reuses the masks rather than reading and decoding them again; the NumPy PTC engine also reads its flats
+    through it. eotest's own tasks, and the engines which read frames a strip at a time, don't. Images which
+    need no scaling are memory-mapped from the file, so they cost only page cache until they are used;
+    scaled images are decoded to float32. The images are read-only, as they are shared.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Maximum total size of the images held. Images larger than this are returned but not kept.
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._images = collections.OrderedDict()
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._images)
+
+    def getStats(self):
+        """Get the usage statistics of the pool.
+
+        Returns
+        -------
+        stats : `dict`
+            The number of hits, misses and evictions, and the number of images and bytes held
+        """
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, nImages=len(self),
+                    nBytes=self.nBytes)
+
+    @staticmethod
+    def _readImage(path, hdu):
+        """Read and decode one image extension of a FITS file."""
+        with fits.open(path, memmap=True, do_not_scale_image_data=True) as hdulist:
+            header = hdulist[hdu].header
+            data = hdulist[hdu].data
+            bscale = header.get('BSCALE', 1)
+            bzero = header.get('BZERO', 0)
+            if bscale == 1 and bzero == 0:
+                image = data  # a view of the memory-mapped file, where the file can be mapped
+            else:
+                image = data.astype(np.float32)
+                image *= bscale
+                image += bzero
+        if image.flags.writeable:
+            image.flags.writeable = False
+        return image
+
+    def _evict(self):
+        while self.nBytes > self.maxBytes and self._images:
+            _, image = self._images.popitem(last=False)
+            self.nBytes -= image.nbytes
+            self.evictions += 1
+
+    def getImage(self, path, hdu):
+        """Get the decoded image in one extension of a FITS file.
+
+        Parameters
+        ----------
+        path : `str`
+            The file
+        hdu : `int`
+            The index of the extension, which for the eotest data is the amplifier number
+
+        Returns
+        -------
+        image : `numpy.ndarray`
+            The read-only image
+        """
+        # the file's identity and modification time are part of the key, so that an image is never served
+        # from a file which has since been rewritten or replaced, e.g. a mask written by a rerun
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_ino, stat.st_size, stat.st_mtime, hdu)
+        image = self._images.pop(key, None)
+        if image is not None:
+            self.hits += 1
+            self._images[key] = image  # now the most recently used
+            return image
+
+        self.misses += 1
+        image = self._readImage(path, hdu)
+        if image.nbytes <= self.maxBytes:
+            self._images[key] = image
+            self.nBytes += image.nbytes
+            self._evict()
+        return image
+
+    def getAmpImages(self, path, amps=range(1, 17)):
+        """Get the decoded images of all the amplifiers in a file.
+
+        Parameters
+        ----------
+        path : `str`
+            The file
+        amps : iterable of `int`
+            The amplifiers, which are also the indices of their extensions
+
+        Returns
+        -------
+        images : `collections.OrderedDict`
+            The read-only images, keyed by amplifier
+        """
+        return collections.OrderedDict((amp, self.getImage(path, amp)) for amp in amps)
+
+    def clear(self):
+        """Drop all the images, keeping the statistics."""
+        self._images.clear()
+        self.nBytes = 0
@@ -0,0 +1,261 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""An index of the flat-pair acquisitions of an eotest run, built from the primary headers of the files."""
+from __future__ import absolute_import, division, print_function
+
+import collections
+import json
+import os
+import re
+
+from astropy.io import fits
+
+__all__ = ["FlatPairIndex", "readFlatHeader"]
+
+# the pair number is only recorded in the filename written by the data acquisition system
+_PAIR_NUMBER = re.compile(r'flat([12])')
+
+
+def readFlatHeader(path):
+    """Read the keywords describing a flat from the primary header of a file, without reading any pixels.
+
+    Parameters
+    ----------
+    path : `str`
+        The file to read
+
+    Returns
+    -------
+    values : `dict`
+        The exposure time (exptime), photodiode current (photodiode) and frame type (imageType), each None
+        if the keyword is missing
+    """
+    header = fits.getheader(path, 0)
+    return dict(exptime=header.get('EXPTIME'), photodiode=header.get('MONDIODE'),
+                imageType=header.get('IMGTYPE'))
+
+
+class FlatPairIndex(object):
+    """The flat1/flat2 pairs of each CCD of a run, with the header values eotest uses to choose among them.
+
+    The flat-pair and PTC stages both take the pair acquisitions from the FLAT/FLAT data, which also
+    holds other flats. Each file's links are resolved, and its primary header read, once, recording its
+    real path, size, modification time, pair number, exposure time, photodiode current and frame type. The
+    pairs are then matched and checked up front, so both stages get the same list of good pairs, and a bad
+    pair is reported once rather than by each eotest task. The index can be written to disk so that a rerun
+    reads no headers, except those of files which have changed since.
+
+    Parameters
+    ----------
+    run : `str`
+        The run which has been indexed
+    entries : iterable of `dict`
+        The indexed files, with keys ccd, filename, realPath, size, mtime, pair, exptime, photodiode and
+        imageType, and an error message for files whose header could not be read
+    """
+
+    def __init__(self, run, entries=()):
+        self.run = str(run)
+        self._entries = {}
+        for entry in entries:
+            self._entries.setdefault(entry['ccd'], collections.OrderedDict())[entry['filename']] = dict(entry)
+
+    def __len__(self):
+        return sum(len(ccdEntries) for ccdEntries in self._entries.values())
+
+    @classmethod
+    def readJson(cls, path):
+        """Read an index previously written with writeJson().
+
+        Parameters
+        ----------
+        path : `str`
+            The file to read
+
+        Returns
+        -------
+        index : `lsst.cp.pipe.FlatPairIndex`
+            The index
+        """
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['run'], data['entries'])
+
+    def writeJson(self, path):
+        """Write the index to a file.
+
+        The file is written to a temporary name unique to the process and then moved into place, so that
+        neither an interrupted write nor several processes writing at once leave a truncated index behind.
+
+        Parameters
+        ----------
+        path : `str`
+            The file to write
+        """
+        entries = [entry for ccd in sorted(self._entries, key=str) for entry in self._entries[ccd].values()]
+        tmpPath = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmpPath, 'w') as f:
+            json.dump({'run': self.run, 'entries': entries}, f, indent=1)
+        os.rename(tmpPath, path)
+
+    def addFiles(self, ccd, filenames, readHeader=readFlatHeader):
+        """Index the files of a CCD which are not already in the index, or which have changed since.
+
+        A file is indexed again if its link now resolves to another file, or the size or modification time
+        of that file differ from those indexed, e.g. because it was re-ingested. Only the files whose real
+        path carries a pair number (flat1 or flat2) have their header read.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        filenames : `list` of `str`
+            The FLAT/FLAT files of the CCD
+        readHeader : callable, optional
+            Function returning the header values of a file, as readFlatHeader()
+
+        Returns
+        -------
+        nRead : `int`
+            The number of headers read
+        """
+        ccdEntries = self._entries.setdefault(ccd, collections.OrderedDict())
+        nRead = 0
+        for filename in filenames:
+            realPath = os.path.realpath(filename)
+            try:
+                stat = os.stat(realPath)
+                size, mtime = stat.st_size, stat.st_mtime
+            except OSError:
+                size = mtime = None
+            indexed = ccdEntries.get(filename)
+            if indexed is not None and (indexed['realPath'], indexed.get('size'), indexed.get('mtime')) == \
+                    (realPath, size, mtime):
+                continue
+            match = _PAIR_NUMBER.search(os.path.basename(realPath))
+            entry = dict(ccd=ccd, filename=filename, realPath=realPath, size=size, mtime=mtime,
+                         pair=int(match.group(1)) if match else None,
+                         exptime=None, photodiode=None, imageType=None)
+            if entry['pair'] is not None:
+                try:
+                    entry.update(readHeader(realPath))
+                except Exception as e:
+                    entry['error'] = "unreadable header: %s" % (e,)
+                nRead += 1
+            ccdEntries[filename] = entry
+        return nRead
+
+    def getPairs(self, ccd, maxPdFracDev=None, filenames=None):
+        """Match the flat1 and flat2 files of a CCD, and check each pair.
+
+        Files are paired by exposure time, in the order of their real paths. A pair is rejected if either
+        header could not be read or is not that of a flat, or if the photodiode currents differ by more
+        than maxPdFracDev of their mean, as the eotest flat-pair task requires. Files left without a
+        partner are rejected too.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        maxPdFracDev : `float`, optional
+            Maximum fractional deviation between the photodiode currents of a pair. Defaults to no check.
+        filenames : `list` of `str`, optional
+            The files of the CCD to pair, e.g. those now in the registry. Defaults to all those indexed.
+
+        Returns
+        -------
+        pairs : `list` of `tuple`
+            The (flat1, flat2) entries of the good pairs, ordered by exposure time
+        rejected : `list` of `tuple`
+            The (realPaths, reason) of each rejected pair or unpaired file
+        """
+        byPair = {1: {}, 2: {}}
+        for entry in self._getEntries(ccd, filenames):
+            if entry['pair'] is not None:
+                exptime = entry['exptime']
+                key = round(exptime, 4) if exptime is not None else None
+                byPair[entry['pair']].setdefault(key, []).append(entry)
+
+        pairs = []
+        rejected = []
+        for key in sorted(set(byPair[1]) | set(byPair[2]), key=lambda key: (key is None, key)):
+            flat1s = sorted(byPair[1].get(key, []), key=lambda entry: entry['realPath'])
+            flat2s = sorted(byPair[2].get(key, []), key=lambda entry: entry['realPath'])
+            for flat1, flat2 in zip(flat1s, flat2s):
+                reason = self._checkPair(flat1, flat2, maxPdFracDev)
+                if reason is None:
+                    pairs.append((flat1, flat2))
+                else:
+                    rejected.append(([flat1['realPath'], flat2['realPath']], reason))
+            for entry in flat1s[len(flat2s):] + flat2s[len(flat1s):]:
+                rejected.append(([entry['realPath']], "no flat%d with the same exposure time" %
+                                 (3 - entry['pair'])))
+        return pairs, rejected
+
+    @staticmethod
+    def _checkPair(flat1, flat2, maxPdFracDev):
+        """Return why a pair of flats is unusable, or None if it is good."""
+        for entry in (flat1, flat2):
+            if 'error' in entry:
+                return entry['error']
+            if entry['imageType'] is not None and entry['imageType'].upper() != 'FLAT':
+                return "frame type of %s is %s" % (os.path.basename(entry['realPath']), entry['imageType'])
+        pd1, pd2 = flat1['photodiode'], flat2['photodiode']
+        if maxPdFracDev is not None and pd1 is not None and pd2 is not None:
+            mean = (pd1 + pd2)/2.
+            if mean == 0:
+                return "no photodiode current"
+            if abs(pd1 - pd2)/abs(mean) > maxPdFracDev:
+                return "photodiode currents %g and %g differ by more than %g" % (pd1, pd2, maxPdFracDev)
+        return None
+
+    def _getEntries(self, ccd, filenames=None):
+        """Get the entries of a CCD, in the order in which they were added, optionally only those of some
+        files."""
+        ccdEntries = self._entries.get(ccd, {})
+        if filenames is None:
+            return list(ccdEntries.values())
+        wanted = set(filenames)
+        return [entry for filename, entry in ccdEntries.items() if filename in wanted]
+
+    def getFilenames(self, ccd, maxPdFracDev=None, filenames=None):
+        """Get the real paths of the files in the good pairs of a CCD.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        maxPdFracDev : `float`, optional
+            Maximum fractional deviation between the photodiode currents of a pair. Defaults to no check.
+        filenames : `list` of `str`, optional
+            The files of the CCD to pair, e.g. those now in the registry. Defaults to all those indexed.
+
+        Returns
+        -------
+        filenames : `list` of `str`
+            The real paths, in the order in which the files were added to the index
+        """
+        good = set(entry['filename'] for pair in self.getPairs(ccd, maxPdFracDev, filenames)[0]
+                   for entry in pair)
+        return [entry['realPath'] for entry in self._getEntries(ccd, filenames) if entry['filename'] in good]
@@ -0,0 +1,97 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""In-memory cache of the eotest gains, shared by all the stages of a run."""
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["GainCache"]
+
+
+class GainCache(object):
+    """Write-through cache of the per-amplifier gains of each CCD.
+
+    Gains put into the cache are written to the butler and kept in memory, so the stages which use them
+    never have to read them back. Gains which were not put here, e.g. because the Fe55 stage was not run,
+    are read from the butler the first time they are needed.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.persistence.butler`
+        Butler to which the gains are written, and from which missing gains are read
+    """
+
+    def __init__(self, butler):
+        self.butler = butler
+        self._gains = {}
+
+    def __contains__(self, key):
+        ccd, run = key
+        return (str(run), ccd) in self._gains
+
+    def put(self, gains, ccd, run):
+        """Store the gains for a CCD, writing them to the butler.
+
+        Parameters
+        ----------
+        gains : `dict`
+            The gains, keyed by amplifier
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        run : `str`
+            The run from which the gains were measured
+        """
+        self.butler.put(gains, 'eotest_gain', dataId={'ccd': ccd, 'run': run})
+        self._gains[(str(run), ccd)] = gains
+
+    def get(self, ccd, run):
+        """Get the gains for a CCD, reading them from the butler if they are not already cached.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        run : `str`
+            The run from which the gains were measured
+
+        Returns
+        -------
+        gains : `dict`
+            The gains, keyed by amplifier
+        """
+        key = (str(run), ccd)
+        if key not in self._gains:
+            self._gains[key] = self.butler.get('eotest_gain', dataId={'ccd': ccd, 'run': run})
+        return self._gains[key]
+
+    def preload(self, ccds, run):
+        """Read the gains for many CCDs from the butler in one go.
+
+        Parameters
+        ----------
+        ccds : iterable of `str` or `int`
+            Names/identifiers of the CCDs
+        run : `str`
+            The run from which the gains were measured
+        """
+        for ccd in ccds:
+            self.get(ccd, run)
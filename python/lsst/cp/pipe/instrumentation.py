@@ -0,0 +1,240 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Measurement of the resources used by each unit of eotest work, and a timeline of the units."""
+from __future__ import absolute_import, division, print_function
+
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+
+__all__ = ["measureCall", "profileCall", "summarizeProfiles", "Timeline"]
+
+# Number of files opened through Python in this process, counted by an audit hook once it is installed
+_nFilesOpened = None
+_auditLock = threading.Lock()
+
+
+def _countFileOpens(event, args):
+    global _nFilesOpened
+    if event == 'open':
+        _nFilesOpened += 1
+
+
+def _getFilesOpened():
+    """Get the number of files opened so far in this process, or None if they cannot be counted.
+
+    Only files opened through Python are counted; those opened by compiled code, e.g. cfitsio, are not.
+    """
+    global _nFilesOpened
+    if not hasattr(sys, 'addaudithook'):
+        return None
+    with _auditLock:
+        if _nFilesOpened is None:
+            _nFilesOpened = 0
+            sys.addaudithook(_countFileOpens)  # audit hooks can't be removed, so install it just once
+    return _nFilesOpened
+
+
+def _readProcFile(path):
+    """Read the integer fields of a "key: value" file in /proc, returning an empty dict if unavailable."""
+    fields = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                words = value.split()
+                if words and words[0].isdigit():
+                    fields[key.strip()] = int(words[0])
+    except (IOError, OSError):
+        pass
+    return fields
+
+
+def _resetPeakRss():
+    """Reset the peak resident set size of this process, returning whether that was possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _getPeakRss(wasReset):
+    """Get the peak resident set size of this process in bytes, since the last reset if there was one."""
+    status = _readProcFile('/proc/self/status')
+    if wasReset and 'VmHWM' in status:
+        return status['VmHWM']*1024
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss if sys.platform == 'darwin' else maxRss*1024  # bytes on macOS, kB elsewhere
+
+
+def _getCpuTime():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measureCall(func, *args, **kwargs):
+    """Call a function, measuring the resources it uses.
+
+    The measurements are of the whole process, so they are only meaningful if nothing else is running in
+    it at the same time. The peak RSS is reset before the call where the platform allows it; otherwise it
+    is the peak for the life of the process.
+
+    Parameters
+    ----------
+    func : callable
+        The function to call
+    *args, **kwargs
+        Its arguments
+
+    Returns
+    -------
+    result : `object`
+        The function's return value
+    measurements : `dict`
+        Start time (seconds since the epoch), wall time and CPU time (seconds), peak RSS, bytes read from
+        storage and by read calls, the number of files opened (None where not measurable) and the process id
+    """
+    wasReset = _resetPeakRss()
+    ioBefore = _readProcFile('/proc/self/io')
+    filesBefore = _getFilesOpened()
+    cpuBefore = _getCpuTime()
+    start = time.time()
+
+    result = func(*args, **kwargs)
+
+    wallTime = time.time() - start
+    cpuTime = _getCpuTime() - cpuBefore
+    filesAfter = _getFilesOpened()
+    ioAfter = _readProcFile('/proc/self/io')
+    measurements = dict(start=start, wallTime=wallTime, cpuTime=cpuTime, peakRss=_getPeakRss(wasReset),
+                        bytesRead=None, charsRead=None, filesOpened=None, pid=os.getpid())
+    if 'read_bytes' in ioBefore and 'read_bytes' in ioAfter:
+        measurements['bytesRead'] = ioAfter['read_bytes'] - ioBefore['read_bytes']
+        measurements['charsRead'] = ioAfter['rchar'] - ioBefore['rchar']
+    if filesBefore is not None:
+        measurements['filesOpened'] = filesAfter - filesBefore
+    return result, measurements
+
+
+def profileCall(path, func, *args, **kwargs):
+    """Call a function under cProfile, writing the profile to a file.
+
+    The profile is written even if the function raises.
+
+    Parameters
+    ----------
+    path : `str`
+        The file to which to write the profile, in the format read by `pstats.Stats`
+    func : callable
+        The function to call
+    *args, **kwargs
+        Its arguments
+
+    Returns
+    -------
+    result : `object`
+        The function's return value
+    """
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
+
+
+def summarizeProfiles(paths, summaryPath, nFunctions):
+    """Write a summary of the functions taking the most time over a set of profiles.
+
+    Parameters
+    ----------
+    paths : `list` of `str`
+        The profile files, as written by profileCall()
+    summaryPath : `str`
+        The file to which to write the summary
+    nFunctions : `int`
+        The number of functions to list
+    """
+    with open(summaryPath, 'w') as f:
+        stats = pstats.Stats(*paths, stream=f)
+        stats.sort_stats('tottime').print_stats(nFunctions)
+        stats.sort_stats('cumulative').print_stats(nFunctions)
+
+
+class Timeline(object):
+    """A timeline of the units of work in a run, which can be written in the Chrome trace event format.
+
+    The file can be loaded into chrome://tracing or https://ui.perfetto.dev, which show one row per worker
+    process.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, name, category, measurements, **args):
+        """Add a completed unit of work.
+
+        Parameters
+        ----------
+        name : `str`
+            The name of the event, e.g. the CCD
+        category : `str`
+            The category of the event, e.g. the stage
+        measurements : `dict`
+            The measurements of the unit, from measureCall()
+        **args
+            Further information to attach to the event
+        """
+        eventArgs = dict((key, value) for key, value in measurements.items()
+                         if key not in ('start', 'wallTime', 'pid'))
+        eventArgs.update(args)
+        self.events.append(dict(name=name, cat=category, ph='X', pid=0, tid=measurements['pid'],
+                                ts=int(measurements['start']*1e6), dur=int(measurements['wallTime']*1e6),
+                                args=eventArgs))
+
+    def writeJson(self, path):
+        """Write the timeline to a file in the Chrome trace event format.
+
+        The file is written to a temporary name and then moved into place, so that an interrupted write
+        never leaves a truncated timeline behind.
+
+        Parameters
+        ----------
+        path : `str`
+            The file to write
+        """
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump({'traceEvents': sorted(self.events, key=lambda event: event['ts']),
+                       'displayTimeUnit': 'ms'}, f, indent=1)
+        os.rename(tmpPath, path)
@@ -0,0 +1,134 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Tracking of the intermediate files written by the eotest stages, so they can be deleted early."""
+from __future__ import absolute_import, division, print_function
+
+import os
+
+__all__ = ["IntermediateTracker", "getDirectorySize"]
+
+# The interim medianed files which eotest leaves behind in its output directory
+_MEDIAN_FILE_PATTERN = '*_median_*.fits'
+
+
+def getDirectorySize(path):
+    """Get the total size of the files in a directory tree.
+
+    Parameters
+    ----------
+    path : `str`
+        The directory
+
+    Returns
+    -------
+    nBytes : `int`
+        The total size of the files, in bytes
+    """
+    nBytes = 0
+    for dirPath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                nBytes += os.path.getsize(os.path.join(dirPath, filename))
+            except OSError:
+                pass  # deleted while we were looking
+    return nBytes
+
+
+class IntermediateTracker(object):
+    """Keep track of which stage wrote each of a CCD's intermediate files, and delete them when asked.
+
+    Parameters
+    ----------
+    log : `lsst.log.Log`, optional
+        Log to which to report deletions
+    """
+
+    def __init__(self, log=None):
+        self.log = log
+        self._files = {}  # ccd: {path: stageName}
+
+    def __len__(self):
+        return sum(len(files) for files in self._files.values())
+
+    def add(self, ccd, stageName, paths):
+        """Record the intermediate files written by a stage for a CCD.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        stageName : `str`
+            Name of the stage which wrote the files
+        paths : iterable of `str`
+            The files
+        """
+        files = self._files.setdefault(str(ccd), {})
+        for path in paths:
+            files[path] = stageName
+
+    def getFiles(self, ccd):
+        """Get the tracked intermediate files of a CCD.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+
+        Returns
+        -------
+        files : `dict`
+            The name of the stage which wrote each file, keyed by path
+        """
+        return dict(self._files.get(str(ccd), {}))
+
+    def release(self, ccd, keepStages=()):
+        """Delete the intermediate files of a CCD which are no longer needed.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        keepStages : iterable of `str`
+            Names of the stages whose intermediate files are still needed
+
+        Returns
+        -------
+        nBytes : `int`
+            The number of bytes freed
+        """
+        keepStages = set(keepStages)
+        files = self._files.get(str(ccd), {})
+        nBytes = 0
+        for path, stageName in list(files.items()):
+            if stageName in keepStages:
+                continue
+            try:
+                nBytes += os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass  # already gone
+            del files[path]
+        if nBytes and self.log is not None:
+            self.log.info("Deleted %.1f MB of intermediate files for %s" % (nBytes/1024**2, ccd))
+        return nBytes
@@ -0,0 +1,131 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Calls run in their own worker processes, so that they can be killed if they hang."""
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+
+__all__ = ["IsolatedCall", "waitForCalls"]
+
+# the child must inherit the state of the parent, which only forking gives, whatever the platform's default
+_forkContext = multiprocessing.get_context('fork')
+
+
+def _callInChild(conn, func, args):
+    """Call a function in the child process, and send back whether it succeeded and its result."""
+    try:
+        reply = (True, func(*args))
+    except Exception:
+        # the exception itself may not pickle, so its traceback is sent instead
+        reply = (False, RuntimeError(traceback.format_exc()))
+    conn.send(reply)
+    conn.close()
+
+
+class IsolatedCall(object):
+    """A function call running in a forked child process, which can be killed if it overruns.
+
+    The child inherits the state of the parent when the call is made, so e.g. a task need not be pickled,
+    and nothing it does affects the parent, other than through the filesystem.
+
+    Parameters
+    ----------
+    func : callable
+        The function to call
+    args : `tuple`, optional
+        Its arguments
+    timeout : `float`, optional
+        Seconds after which the call is overdue; see isOverdue(). Defaults to no limit.
+    tag : `object`, optional
+        Anything which identifies the call to the caller
+    """
+
+    def __init__(self, func, args=(), timeout=None, tag=None):
+        self.tag = tag
+        self.timeout = timeout
+        self.start = time.time()
+        self.deadline = self.start + timeout if timeout else None
+        self.connection, childConnection = _forkContext.Pipe(duplex=False)
+        self.process = _forkContext.Process(target=_callInChild, args=(childConnection, func, args))
+        self.process.daemon = True
+        self.process.start()
+        childConnection.close()
+
+    def isOverdue(self, now=None):
+        """Has the call run past its timeout?"""
+        return self.deadline is not None and (now or time.time()) > self.deadline
+
+    def getResult(self):
+        """Get the outcome of a call which has finished, i.e. which waitForCalls() has returned.
+
+        Returns
+        -------
+        succeeded : `bool`
+            Did the function return rather than raise?
+        result : `object`
+            What the function returned, or an exception describing why it failed
+        """
+        try:
+            succeeded, result = self.connection.recv()
+        except EOFError:
+            self.process.join()
+            succeeded, result = False, RuntimeError("Worker process died with exit code %s" %
+                                                    self.process.exitcode)
+        self.process.join()
+        self.connection.close()
+        return succeeded, result
+
+    def kill(self):
+        """Kill the child process."""
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def waitForCalls(calls, timeout=None):
+    """Wait for at least one of some isolated calls to finish, or until the timeout or a call's deadline.
+
+    Parameters
+    ----------
+    calls : iterable of `IsolatedCall`
+        The calls
+    timeout : `float`, optional
+        Maximum number of seconds to wait
+
+    Returns
+    -------
+    finished : `list` of `IsolatedCall`
+        The calls which have finished, whose result can be got without waiting
+    """
+    calls = list(calls)
+    deadlines = [call.deadline for call in calls if call.deadline is not None]
+    if deadlines:
+        untilDeadline = max(min(deadlines) - time.time(), 0.)
+        timeout = untilDeadline if timeout is None else min(timeout, untilDeadline)
+    ready = multiprocessing.connection.wait([call.connection for call in calls], timeout)
+    return [call for call in calls if call.connection in ready]
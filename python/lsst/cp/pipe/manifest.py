@@ -0,0 +1,153 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A record of the eotest work units which have completed, allowing interrupted runs to be resumed."""
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+
+__all__ = ["CompletionManifest", "getFileSignature"]
+
+
+def getFileSignature(path):
+    """Get a cheap signature of a file's contents.
+
+    Parameters
+    ----------
+    path : `str`
+        The file
+
+    Returns
+    -------
+    signature : `list`
+        The path, size and modification time of the file, or just the path if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path]
+    return [path, stat.st_size, stat.st_mtime]
+
+
+class CompletionManifest(object):
+    """Record of the (stage, ccd) units of an eotest run which have completed, and of what went into them.
+
+    Each entry records the signature of everything which went into a unit - its input files, the mask files
+    it picked up, the gains and the subtask config - and the output files it wrote. A unit need not be
+    rerun if it has an entry whose signature matches its current one and whose outputs all still exist.
+    The manifest is rewritten after every change, so that it survives the run being killed.
+
+    Parameters
+    ----------
+    path : `str`
+        The file in which the manifest is kept. It is read if it already exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _makeKey(key):
+        return '/'.join(str(item) for item in key)
+
+    @staticmethod
+    def _digest(signature):
+        return hashlib.sha1(json.dumps(signature, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _write(self):
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True, default=str)
+        os.rename(tmpPath, self.path)
+
+    def isComplete(self, key, signature):
+        """Has a unit already been completed with the same inputs?
+
+        Parameters
+        ----------
+        key : `tuple`
+            The key of the unit
+        signature : `dict`
+            The signature of the unit's inputs, which must be JSON serialisable
+
+        Returns
+        -------
+        complete : `bool`
+            True if the unit has completed with a matching signature, and its outputs still exist
+        """
+        entry = self._entries.get(self._makeKey(key))
+        if entry is None or entry['digest'] != self._digest(signature):
+            return False
+        return all(os.path.exists(output) for output in entry['outputs'])
+
+    def getOutputs(self, key):
+        """Get the output files recorded for a completed unit.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The key of the unit
+
+        Returns
+        -------
+        outputs : `list` of `str`
+            The files written by the unit, or an empty list if it has no entry
+        """
+        entry = self._entries.get(self._makeKey(key))
+        return list(entry['outputs']) if entry is not None else []
+
+    def record(self, key, signature, outputs):
+        """Record that a unit has completed.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The key of the unit
+        signature : `dict`
+            The signature of the unit's inputs, which must be JSON serialisable
+        outputs : iterable of `str`
+            The files written by the unit
+        """
+        self._entries[self._makeKey(key)] = dict(digest=self._digest(signature), signature=signature,
+                                                 outputs=sorted(outputs))
+        self._write()
+
+    def remove(self, key):
+        """Forget a unit, e.g. because it is about to be rerun.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The key of the unit
+        """
+        if self._entries.pop(self._makeKey(key), None) is not None:
+            self._write()
@@ -0,0 +1,133 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A registry of the eotest mask files for each sensor, updated as the stages produce them."""
+from __future__ import absolute_import, division, print_function
+
+import fnmatch
+import os
+
+__all__ = ["MaskRegistry"]
+
+
+class MaskRegistry(object):
+    """The mask files for each sensor, and the stage which made each of them.
+
+    The registry is seeded with a single listing of the output directory, and then told about the masks
+    each stage writes as it completes, so finding the masks for a sensor needs no further filesystem
+    access. Masks are matched to sensors exactly by the sensor id prefix which eotest puts on every file it
+    writes, so that e.g. 'S2' does not pick up the masks for 'S22', and are returned in stage order.
+
+    Parameters
+    ----------
+    stageNames : iterable of `str`
+        The names of the stages which make masks, in the order in which they are run
+    """
+
+    def __init__(self, stageNames):
+        self._order = dict((name, i) for i, name in enumerate(stageNames))
+        self._masks = {}
+
+    @staticmethod
+    def isMaskFile(path, ccd):
+        """Is a file a mask file for a given sensor?
+
+        Parameters
+        ----------
+        path : `str`
+            The file
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+
+        Returns
+        -------
+        isMask : `bool`
+            True if the file is one of the sensor's masks
+        """
+        # the cast to str supports obs_auxTel
+        return fnmatch.fnmatch(os.path.basename(path), str(ccd) + '_*mask*')
+
+    def scanDirectory(self, path, ccds, origins=None):
+        """Register the mask files already in a directory.
+
+        Parameters
+        ----------
+        path : `str`
+            The directory
+        ccds : iterable of `str` or `int`
+            The CCDs whose masks should be registered
+        origins : `dict`, optional
+            The names of the stages which made masks in an earlier run, keyed by the path of the mask.
+            Masks not listed are treated as coming before any stage.
+        """
+        origins = origins or {}
+        filenames = os.listdir(path) if os.path.exists(path) else []
+        for ccd in ccds:
+            for filename in filenames:
+                if self.isMaskFile(filename, ccd):
+                    maskFile = os.path.join(path, filename)
+                    self._getSensorMasks(ccd).setdefault(origins.get(maskFile), []).append(maskFile)
+
+    def _getSensorMasks(self, ccd):
+        return self._masks.setdefault(str(ccd), {})
+
+    def add(self, ccd, stageName, paths):
+        """Register the masks written by a stage, replacing any it made before.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        stageName : `str`
+            The stage which wrote the files
+        paths : iterable of `str`
+            The files written by the stage; those which are not masks of the sensor are ignored
+        """
+        masks = [path for path in paths if self.isMaskFile(path, ccd)]
+        sensorMasks = self._getSensorMasks(ccd)
+        for otherStage in list(sensorMasks):
+            sensorMasks[otherStage] = [path for path in sensorMasks[otherStage] if path not in masks]
+        sensorMasks[stageName] = sorted(masks)
+
+    def getMaskFiles(self, ccd, beforeStage=None):
+        """Get the mask files for a sensor.
+
+        Parameters
+        ----------
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+        beforeStage : `str`, optional
+            Only return the masks made by stages which run before this one, and those of unknown origin
+
+        Returns
+        -------
+        maskFiles : `tuple` of `str`
+            The mask files, ordered by the stage which made them
+        """
+        limit = self._order[beforeStage] if beforeStage is not None else len(self._order)
+        maskFiles = []
+        for stageName, masks in sorted(self._getSensorMasks(ccd).items(),
+                                       key=lambda item: self._order.get(item[0], -1)):
+            if stageName is None or self._order.get(stageName, -1) < limit:
+                maskFiles.extend(sorted(masks))
+        return tuple(maskFiles)
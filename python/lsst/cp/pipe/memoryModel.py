@@ -0,0 +1,141 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Estimates of the peak memory used by the eotest work units, refined from their measured peak RSS."""
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+
+from .eotestStages import getStage
+
+__all__ = ["MemoryModel"]
+
+
+class MemoryModel(object):
+    """Estimate the peak memory of each (stage, ccd) unit from its input files and the units measured so far.
+
+    Before a stage has been measured, its estimate is the baseline of a worker process plus the decoded
+    size of the input files it holds in memory at once (EotestStage.inputsInMemory). Once units of the stage
+    have run, the estimate is the largest of their measured peaks, each adjusted by the difference in input
+    size, times a safety margin. Measurements can be saved, so later runs start from them.
+
+    Parameters
+    ----------
+    baselineBytes : `int`
+        Memory used by a worker process before it reads any data
+    decodeFactor : `float`, optional
+        Ratio of the memory taken by the images decoded from a raw file to the size of the file
+    margin : `float`, optional
+        Factor by which measured peaks are increased, to allow for variation between units
+    maxHistory : `int`, optional
+        Number of the most recent measurements kept for each stage
+    """
+
+    def __init__(self, baselineBytes, decodeFactor=2., margin=1.2, maxHistory=50):
+        self.baselineBytes = baselineBytes
+        self.decodeFactor = decodeFactor
+        self.margin = margin
+        self.maxHistory = maxHistory
+        self._history = {}  # stageName: [(inputBytes, peakRss), ...]
+
+    def _getPerInputByte(self, stageName, nFiles):
+        """Get the memory used per byte of input, from the fraction of the inputs held at once."""
+        inputsInMemory = getStage(stageName).inputsInMemory
+        if inputsInMemory is None or nFiles <= inputsInMemory:
+            return self.decodeFactor
+        return self.decodeFactor*inputsInMemory/nFiles
+
+    def estimate(self, stageName, inputBytes, nFiles):
+        """Estimate the peak memory of a unit.
+
+        Parameters
+        ----------
+        stageName : `str`
+            The name of the unit's stage
+        inputBytes : `int`
+            The total size of its input files
+        nFiles : `int`
+            The number of input files
+
+        Returns
+        -------
+        nBytes : `int`
+            The estimated peak memory in bytes
+        """
+        perInputByte = self._getPerInputByte(stageName, nFiles)
+        history = self._history.get(stageName)
+        if not history:
+            return int(self.baselineBytes + perInputByte*inputBytes)
+        return int(self.margin*max(peak + perInputByte*(inputBytes - measuredBytes)
+                                   for measuredBytes, peak in history))
+
+    def record(self, stageName, inputBytes, peakRss):
+        """Record the measured peak memory of a unit.
+
+        Parameters
+        ----------
+        stageName : `str`
+            The name of the unit's stage
+        inputBytes : `int`
+            The total size of its input files
+        peakRss : `int`
+            Its measured peak RSS in bytes
+        """
+        history = self._history.setdefault(stageName, [])
+        history.append((inputBytes, peakRss))
+        del history[:-self.maxHistory]
+
+    def getHistory(self, stageName):
+        """Get the measurements of a stage, oldest first, as a `list` of (inputBytes, peakRss)."""
+        return list(self._history.get(stageName, []))
+
+    def readJson(self, path):
+        """Add the measurements saved by writeJson() to those of this model, if the file exists.
+
+        Parameters
+        ----------
+        path : `str`
+            The file
+        """
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            history = json.load(f)
+        for stageName, measurements in history.items():
+            for inputBytes, peakRss in measurements:
+                self.record(stageName, inputBytes, peakRss)
+
+    def writeJson(self, path):
+        """Save the measurements, replacing the file atomically.
+
+        Parameters
+        ----------
+        path : `str`
+            The file
+        """
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(self._history, f, indent=1, sort_keys=True)
+        os.rename(tmpPath, path)
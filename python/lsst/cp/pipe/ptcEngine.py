@@ -0,0 +1,342 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A photon transfer curve analysis vectorized over the amplifiers, as an alternative to eotest's PtcTask."""
+from __future__ import absolute_import, division, print_function
+
+import glob
+import os
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.eotest.sensor as sensorTest
+import lsst.pipe.base as pipeBase
+
+from .ampImages import getAmps, readAmpGeometry, readUnbiasedImaging, readMaskStack, maskedMean, \
+    maskedVariance
+from .engineConfigs import NumpyPtcConfig
+from .exposurePool import ExposurePool
+
+__all__ = ["NumpyPtcTask", "findFlat2", "measurePairStats", "fitPtc"]
+
+
+def findFlat2(flat1, infiles):
+    """Find the second flat of a pair, as eotest does, but looking among the input files first.
+
+    Parameters
+    ----------
+    flat1 : `str`
+        The first flat, whose name contains 'flat1'
+    infiles : `list` of `str`
+        The input files
+
+    Returns
+    -------
+    flat2 : `str`
+        The second flat, whose name is that of the first up to 'flat1', followed by 'flat2', or the first
+        flat itself if there is none
+    """
+    prefix = flat1.split('flat1')[0] + 'flat2'
+    candidates = sorted(path for path in infiles if path.startswith(prefix))
+    if not candidates:
+        candidates = sorted(glob.glob(prefix + '*'))
+    return candidates[0] if candidates else flat1
+
+
+def measurePairStats(pool, flat1, flat2, amps, geometry, masked, fitOrder=1):
+    """Measure the mean and the variance of the difference of a pair of flats, for all the amplifiers.
+
+    The statistics are those of eotest's flat_pair_stats(): the second flat is scaled by the mean ratio of
+    the first to the second, and the variance is half that of their difference. If the two flats are the
+    same file, the mean and variance of the single flat are used instead.
+
+    Parameters
+    ----------
+    pool : `lsst.cp.pipe.ExposurePool`
+        The pool from which to get the images
+    flat1, flat2 : `str`
+        The files of the pair
+    amps : `list` of `int`
+        The amplifiers
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of their segments
+    masked : `numpy.ndarray`
+        The boolean (amp, row, column) array of masked imaging pixels
+    fitOrder : `int`
+        Order of the polynomial fitted to the serial overscan
+
+    Returns
+    -------
+    means : `numpy.ndarray`
+        The mean signal of each amplifier, in ADU
+    variances : `numpy.ndarray`
+        The variance of each amplifier, in ADU**2
+    """
+    image1 = readUnbiasedImaging(pool, flat1, amps, geometry, fitOrder)
+    if flat2 == flat1:
+        return maskedMean(image1, masked), maskedVariance(image1, masked)
+    image2 = readUnbiasedImaging(pool, flat2, amps, geometry, fitOrder)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = maskedMean(image1/image2, masked)
+    image2 *= ratio[:, np.newaxis, np.newaxis].astype(np.float32)
+    means = (maskedMean(image1, masked) + maskedMean(image2, masked))/2.
+    image1 -= image2
+    return means, maskedVariance(image1, masked)/2.
+
+
+def _ptcModel(pars, means):
+    """The variance as a function of the mean signal, as fitted by eotest (Astier et al.).
+
+    Parameters
+    ----------
+    pars : `numpy.ndarray`
+        The (amp, 3) values of a00, the gain and the intercept (the read noise squared, in electrons)
+    means : `numpy.ndarray`
+        The (amp, point) mean signals, in ADU
+
+    Returns
+    -------
+    variances : `numpy.ndarray`
+        The (amp, point) variances, in ADU**2
+    """
+    a00, gain, intercept = [pars[:, i, np.newaxis] for i in range(3)]
+    x = 2*a00*gain*means
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        curved = -np.expm1(-x)/(2*a00*gain*gain)
+    # without brighter-fatter the curve is a straight line, which the formula above can't evaluate
+    return np.where(np.abs(x) < 1e-8, means/gain, curved) + intercept/(gain*gain)
+
+
+def _fitWeighted(pars, means, variances, weights, maxSteps=200, tolerance=1e-12):
+    """Fit the PTC model to the weighted points of every amplifier at once by Levenberg-Marquardt.
+
+    Parameters
+    ----------
+    pars : `numpy.ndarray`
+        The (amp, 3) starting parameters
+    means, variances : `numpy.ndarray`
+        The (amp, point) measurements
+    weights : `numpy.ndarray`
+        The (amp, point) weights of the residuals; zero for points left out of the fit
+
+    Returns
+    -------
+    pars : `numpy.ndarray`
+        The (amp, 3) fitted parameters
+    covariance : `numpy.ndarray`
+        The (amp, 3, 3) covariance of the parameters, unscaled by the residuals as that of
+        scipy.optimize.leastsq(), which eotest uses
+    """
+    pars = pars.copy()
+    nAmps = pars.shape[0]
+    damping = np.full(nAmps, 1e-3)
+
+    def getResiduals(pars):
+        residuals = (variances - _ptcModel(pars, means))*weights
+        return np.where(weights > 0, residuals, 0.)
+
+    def getJacobian(pars):
+        jacobian = np.empty(means.shape + (3,))
+        for i in range(3):
+            step = 1e-6*np.maximum(np.abs(pars[:, i]), 1e-12)
+            upper, lower = pars.copy(), pars.copy()
+            upper[:, i] += step
+            lower[:, i] -= step
+            jacobian[..., i] = (_ptcModel(upper, means) - _ptcModel(lower, means))/(2*step[:, np.newaxis])
+        return np.where(weights[..., np.newaxis] > 0, jacobian*weights[..., np.newaxis], 0.)
+
+    def solveScaled(matrix, scale, vector=None):
+        # scale to a unit diagonal, as the parameters differ by many orders of magnitude
+        scaled = np.linalg.pinv(matrix/scale[:, :, np.newaxis]/scale[:, np.newaxis, :])
+        if vector is None:
+            return scaled/scale[:, :, np.newaxis]/scale[:, np.newaxis, :]
+        return np.einsum('akl,al->ak', scaled, vector/scale)/scale
+
+    residuals = getResiduals(pars)
+    cost = np.square(residuals).sum(axis=1)
+    for _ in range(maxSteps):
+        jacobian = getJacobian(pars)
+        normal = np.einsum('apk,apl->akl', jacobian, jacobian)
+        gradient = np.einsum('apk,ap->ak', jacobian, residuals)
+        diagonal = np.diagonal(normal, axis1=1, axis2=2)
+        scale = np.sqrt(np.where(diagonal > 0, diagonal, 1.))
+        damped = normal + damping[:, np.newaxis, np.newaxis]*np.eye(3)*scale[:, :, np.newaxis]**2
+        trial = pars + solveScaled(damped, scale, gradient)
+        trialResiduals = getResiduals(trial)
+        trialCost = np.square(trialResiduals).sum(axis=1)
+        better = np.isfinite(trialCost) & (trialCost < cost)
+        converged = ~better | (cost - trialCost <= tolerance*cost)
+        pars[better] = trial[better]
+        residuals[better] = trialResiduals[better]
+        cost[better] = trialCost[better]
+        damping = np.where(better, damping/10., damping*10.)
+        if np.all(converged & ((damping > 1e10) | better)):
+            break
+
+    jacobian = getJacobian(pars)
+    normal = np.einsum('apk,apl->akl', jacobian, jacobian)
+    diagonal = np.diagonal(normal, axis1=1, axis2=2)
+    covariance = solveScaled(normal, np.sqrt(np.where(diagonal > 0, diagonal, 1.)))
+    return pars, covariance
+
+
+def fitPtc(means, variances, sigCut=5., maxIterations=10, p0=(2.7e-6, 0.75, 25.)):
+    """Fit the photon transfer curves of all the amplifiers of a CCD at once.
+
+    The model and its weighting are those of eotest's PtcTask, as is the clipping: points more than sigCut
+    from the fit are rejected, and the fit repeated, until the points used no longer change. The first fit
+    uses the points up to the turnoff, i.e. that with the highest variance. The turnoff reported is the
+    highest mean of the points in the final fit.
+
+    Parameters
+    ----------
+    means, variances : `numpy.ndarray`
+        The (amp, pair) mean signal and variance, in ADU and ADU**2
+    sigCut : `float`
+        Clipping threshold, in units of the expected scatter
+    maxIterations : `int`
+        Maximum number of fits
+    p0 : `tuple` of `float`
+        The starting values of a00, the gain and the intercept
+
+    Returns
+    -------
+    results : `lsst.pipe.base.Struct`
+        The (amp,) arrays a00, gain and noise, in electrons, with their errors a00Error, gainError and
+        noiseError, the turnoff, in ADU, and a boolean array ok, False for amplifiers which couldn't be fitted
+    """
+    means = np.asarray(means, dtype=np.float64)
+    variances = np.asarray(variances, dtype=np.float64)
+    nAmps = means.shape[0]
+    usable = np.isfinite(means) & np.isfinite(variances) & (means > 0) & (variances > 0)
+    peak = np.argmax(np.where(usable, variances, -np.inf), axis=1)
+    turnoffMean = means[np.arange(nAmps), peak]
+    used = usable & (means <= turnoffMean[:, np.newaxis])
+    pars = np.tile(np.asarray(p0, dtype=np.float64), (nAmps, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scatter = np.where(usable, 1./np.sqrt(variances), 0.)
+    for _ in range(maxIterations):
+        pars, covariance = _fitWeighted(pars, means, variances, np.where(used, scatter, 0.))
+        with np.errstate(invalid='ignore'):
+            clipped = usable & (np.abs((variances - _ptcModel(pars, means))*scatter) < sigCut)
+        if np.array_equal(clipped, used):
+            break
+        used = clipped
+
+    errors = np.sqrt(np.abs(np.diagonal(covariance, axis1=1, axis2=2)))
+    ok = (used.sum(axis=1) >= 3) & np.all(np.isfinite(pars), axis=1) & np.all(np.isfinite(errors), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        noise = np.sqrt(pars[:, 2])
+        noiseError = 0.5/noise*errors[:, 2]
+    turnoff = np.where(used, means, -np.inf).max(axis=1)
+    return pipeBase.Struct(a00=pars[:, 0], a00Error=errors[:, 0], gain=pars[:, 1], gainError=errors[:, 1],
+                           noise=noise, noiseError=noiseError, turnoff=turnoff, ok=ok)
+
+
+class NumpyPtcTask(pipeBase.Task):
+    """Measure the photon transfer curve of a CCD, vectorized over its amplifiers.
+
+    This is a replacement for eotest's PtcTask, selected with CpTaskConfig.ptcEngine, with the same run()
+    arguments and outputs: the pair statistics in <sensor>_ptc.fits, and PTC_GAIN, PTC_A00, PTC_NOISE,
+    their errors and PTC_TURNOFF in the sensor's eotest results file. Rather than measuring each amplifier
+    of each pair in turn, the imaging regions of all the amplifiers of a flat are bias-subtracted and
+    measured as one array, and the curves of all the amplifiers are fitted together. The flats and mask
+    files are read through the exposure pool; the flat-pair stage is always eotest's, so only the mask files
+    are shared with other stages, and only with the other NumPy engines.
+
+    The pair statistics follow eotest's, so they agree with PtcTask's to float32 rounding, and the fit uses
+    the same model, weights and clipping, with its own least-squares solver. TOLERANCES gives the largest
+    relative differences from PtcTask's results which are expected; benchmark.compareEngines() checks them.
+    """
+    ConfigClass = NumpyPtcConfig
+    _DefaultName = "numpyPtc"
+
+    # largest expected relative differences from the results of eotest's PtcTask, per results column
+    TOLERANCES = {'PTC_GAIN': 1e-3, 'PTC_A00': 2e-2, 'PTC_NOISE': 2e-2, 'PTC_TURNOFF': 1e-4}
+
+    def __init__(self, exposurePool=None, **kwargs):
+        pipeBase.Task.__init__(self, **kwargs)
+        # without a shared pool, images are read as needed and not kept
+        self.exposurePool = exposurePool if exposurePool is not None else ExposurePool(0)
+
+    @pipeBase.timeMethod
+    def run(self, sensor_id, infiles, mask_files, gains=None):
+        """Measure and fit the photon transfer curve of a CCD.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        infiles : `list` of `str`
+            The flat-pair files, with the pair number in their names
+        mask_files : `tuple` of `str`
+            The mask files to apply
+        gains : `dict`, optional
+            Unused, as by PtcTask; accepted so that the task can be run in its place
+        """
+        flat1s = sorted(path for path in infiles if path.find('flat1') != -1)
+        if not flat1s:
+            raise RuntimeError("No flat1 files found for %s among %d input files" % (sensor_id, len(infiles)))
+        amps = getAmps(flat1s[0])
+        geometry = readAmpGeometry(flat1s[0], amps[0])
+        masked = readMaskStack(self.exposurePool, mask_files, amps, geometry)
+
+        means = np.empty((len(amps), len(flat1s)))
+        variances = np.empty((len(amps), len(flat1s)))
+        exposures = np.empty(len(flat1s))
+        for i, flat1 in enumerate(flat1s):
+            flat2 = findFlat2(flat1, infiles)
+            exposures[i] = fits.getheader(flat1, 0).get('EXPTIME', 0.)
+            if flat2 != flat1 and fits.getheader(flat2, 0).get('EXPTIME', 0.) != exposures[i]:
+                raise RuntimeError("Exposure times for files %s, %s do not match" % (flat1, flat2))
+            means[:, i], variances[:, i] = measurePairStats(self.exposurePool, flat1, flat2, amps, geometry,
+                                                            masked, self.config.biasFitOrder)
+
+        self._writePtcStats(sensor_id, amps, means, variances, exposures)
+        fit = fitPtc(means, variances, sigCut=self.config.sigCut, maxIterations=self.config.maxClipIterations)
+        results = sensorTest.EOTestResults(os.path.join(self.config.output_dir,
+                                                        '%s_eotest_results.fits' % sensor_id),
+                                           namps=len(amps))
+        for i, amp in enumerate(amps):
+            if not fit.ok[i]:
+                self.log.warn("%s: PTC fit failed for amp %d" % (sensor_id, amp))
+            values = (fit.gain[i], fit.gainError[i], fit.a00[i], fit.a00Error[i], fit.noise[i],
+                      fit.noiseError[i], fit.turnoff[i]) if fit.ok[i] else (0.,)*7
+            for column, value in zip(('PTC_GAIN', 'PTC_GAIN_ERROR', 'PTC_A00', 'PTC_A00_ERROR', 'PTC_NOISE',
+                                      'PTC_NOISE_ERROR', 'PTC_TURNOFF'), values):
+                results.add_seg_result(amp, column, float(value))
+        results.write()
+
+    def _writePtcStats(self, sensorId, amps, means, variances, exposures):
+        """Write the pair statistics in the format of eotest's <sensor>_ptc.fits."""
+        columns = []
+        for i, amp in enumerate(amps):
+            columns.append(fits.Column(name='AMP%02i_MEAN' % amp, format='E', unit='ADU', array=means[i]))
+            columns.append(fits.Column(name='AMP%02i_VAR' % amp, format='E', unit='ADU**2',
+                                       array=variances[i]))
+        columns.append(fits.Column(name='EXPOSURE', format='E', unit='seconds', array=exposures))
+        output = fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns(columns)])
+        output[-1].name = 'PTC_STATS'
+        output[0].header['NAMPS'] = len(amps)
+        output.writeto(os.path.join(self.config.output_dir, '%s_ptc.fits' % sensorId), overwrite=True)
@@ -0,0 +1,195 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""An index of the raw filenames in an eotest run, built with a single registry scan."""
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+
+__all__ = ["RawFilenameIndex"]
+
+
+class RawFilenameIndex(object):
+    """Mapping from (testType, imageType, visit, ccd) to the raw filename, for a single run.
+
+    Building the index from the butler costs one registry query for the whole run plus one filename lookup
+    per (visit, ccd), after which every stage can get its input files without going back to the butler.
+    The index can be written to disk so that a later rerun only needs one query, to check that it is
+    current.
+
+    Parameters
+    ----------
+    run : `str`
+        The run which has been indexed
+    entries : iterable of `tuple`
+        (testType, imageType, visit, ccd, filename) tuples
+    """
+
+    def __init__(self, run, entries=()):
+        self.run = str(run)
+        self._filenames = {}
+        self._visits = {}
+        for testType, imageType, visit, ccd, filename in entries:
+            self._filenames[(testType, imageType, visit, ccd)] = filename
+            self._visits.setdefault((testType, imageType, ccd), set()).add(visit)
+
+    def __len__(self):
+        return len(self._filenames)
+
+    @classmethod
+    def fromButler(cls, butler, run):
+        """Build the index by querying a butler.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data
+        run : `str`
+            The run to index
+
+        Returns
+        -------
+        index : `lsst.cp.pipe.RawFilenameIndex`
+            The index
+        """
+        entries = []
+        for visit, ccd, testType, imageType in butler.queryMetadata('raw', ['visit', 'ccd', 'testType',
+                                                                           'imageType'],
+                                                                    dataId={'run': run}):
+            # strip the trailing HDU specifier, e.g. '[0]', from the filename
+            filename = butler.get('raw_filename', dataId={'visit': visit, 'ccd': ccd})[0][:-3]
+            entries.append((testType, imageType, visit, ccd, filename))
+        return cls(run, entries)
+
+    @classmethod
+    def fromButlerRuns(cls, butler, runs):
+        """Build the indices of several runs with a single registry query.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data
+        runs : iterable of `str`
+            The runs to index
+
+        Returns
+        -------
+        indices : `dict` of `str`: `lsst.cp.pipe.RawFilenameIndex`
+            The index of each run
+        """
+        entries = dict((str(run), []) for run in runs)
+        for run, visit, ccd, testType, imageType in butler.queryMetadata('raw', ['run', 'visit', 'ccd',
+                                                                                'testType', 'imageType']):
+            if str(run) in entries:
+                filename = butler.get('raw_filename', dataId={'visit': visit, 'ccd': ccd})[0][:-3]
+                entries[str(run)].append((testType, imageType, visit, ccd, filename))
+        return dict((run, cls(run, runEntries)) for run, runEntries in entries.items())
+
+    def isCurrent(self, butler):
+        """Check that the index still matches the registry, e.g. that no raws have been ingested since it
+        was made.
+
+        This costs one registry query, but none of the filename lookups of building the index.
+
+        Parameters
+        ----------
+        butler : `lsst.daf.persistence.butler`
+            Butler for the repo containg the eotest data
+
+        Returns
+        -------
+        current : `bool`
+            True if the registry has exactly the (testType, imageType, visit, ccd) of the index for its run
+        """
+        registered = set((testType, imageType, visit, ccd) for visit, ccd, testType, imageType in
+                         butler.queryMetadata('raw', ['visit', 'ccd', 'testType', 'imageType'],
+                                              dataId={'run': self.run}))
+        return registered == set(self._filenames)
+
+    @classmethod
+    def readJson(cls, path):
+        """Read an index previously written with writeJson().
+
+        Parameters
+        ----------
+        path : `str`
+            The file to read
+
+        Returns
+        -------
+        index : `lsst.cp.pipe.RawFilenameIndex`
+            The index
+        """
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['run'], [tuple(entry) for entry in data['entries']])
+
+    def writeJson(self, path):
+        """Write the index to a file.
+
+        The file is written to a temporary name and then moved into place, so that an interrupted write
+        never leaves a truncated index behind.
+
+        Parameters
+        ----------
+        path : `str`
+            The file to write
+        """
+        entries = [list(key) + [filename] for key, filename in sorted(self._filenames.items())]
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump({'run': self.run, 'entries': entries}, f, indent=1)
+        os.rename(tmpPath, path)
+
+    def getCcds(self):
+        """Get the CCDs with data in the run, sorted."""
+        return sorted(set(ccd for _, _, _, ccd in self._filenames))
+
+    def getTestTypes(self):
+        """Get the testTypes of the data in the run, sorted."""
+        return sorted(set(testType for testType, _, _, _ in self._filenames))
+
+    def getImageTypes(self):
+        """Get the imageTypes of the data in the run, sorted."""
+        return sorted(set(imageType for _, imageType, _, _ in self._filenames))
+
+    def getFilenames(self, testType, imageType, ccd):
+        """Get the raw filenames of the given type for a CCD.
+
+        Parameters
+        ----------
+        testType : `str`
+            The testType of the data
+        imageType : `str`
+            The imageType of the data
+        ccd : `str` or `int`
+            Name/identifier of the CCD
+
+        Returns
+        -------
+        filenames : `list` of `str`
+            The filenames, ordered by visit
+        """
+        visits = sorted(self._visits.get((testType, imageType, ccd), ()))
+        return [self._filenames[(testType, imageType, visit, ccd)] for visit in visits]
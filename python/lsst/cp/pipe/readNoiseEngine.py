@@ -0,0 +1,242 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A read noise analysis batched over all the bias frames and amplifiers of a CCD, as an alternative to
+eotest's ReadNoiseTask."""
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import os
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.eotest.sensor as sensorTest
+import lsst.pipe.base as pipeBase
+
+from .ampImages import CHANNEL_IDS, getAmps, readAmpGeometry, getOverscanColumns, fitRowBias, \
+    readSegmentRows, readMaskStack
+from .engineConfigs import NumpyReadNoiseConfig
+from .exposurePool import ExposurePool
+
+__all__ = ["NumpyReadNoiseTask", "measureBoxNoise"]
+
+
+def measureBoxNoise(paths, amps, geometry, region, boxShape, masked=None, fitOrder=1, nSigmaClip=3.,
+                    nClipIterations=3, maxChunkBytes=256*1024**2):
+    """Measure the noise in boxes tiling a region of every amplifier of some frames, in one computation.
+
+    Each frame is bias-subtracted using its serial overscan, as eotest does, and the clipped standard
+    deviation of the pixels in each box is measured. The frames are read in strips of rows of boxes, all
+    the frames and amplifiers together, so the memory used is bounded by maxChunkBytes whatever the number
+    of frames.
+
+    Parameters
+    ----------
+    paths : `list` of `str`
+        The frames
+    amps : `list` of `int`
+        The amplifiers
+    geometry : `lsst.cp.pipe.AmpGeometry`
+        The geometry of their segments
+    region : `tuple` of `slice`
+        The (rows, columns) of each segment to measure, e.g. geometry.imaging
+    boxShape : `tuple` of `int`
+        The (rows, columns) of the boxes; those which don't fit in the region are left out
+    masked : `numpy.ndarray`, optional
+        The boolean (amp, row, column) array of masked pixels in the region
+    fitOrder : `int`
+        Order of the polynomial fitted to the serial overscan
+    nSigmaClip : `float`
+        Pixels further than this many standard deviations from the mean of their box are clipped
+    nClipIterations : `int`
+        Number of times the pixels are clipped
+    maxChunkBytes : `int`
+        Maximum size of the pixels of all the frames held at once
+
+    Returns
+    -------
+    noise : `numpy.ndarray`
+        The (frame, amp, box) standard deviation, in ADU
+    """
+    dy, dx = boxShape
+    rows, columns = region
+    nBoxRows = (rows.stop - rows.start)//dy
+    nBoxColumns = (columns.stop - columns.start)//dx
+    if nBoxRows == 0 or nBoxColumns == 0:
+        raise RuntimeError("Boxes of %s pixels don't fit in a region of %s" %
+                           (boxShape, (rows.stop - rows.start, columns.stop - columns.start)))
+    width = nBoxColumns*dx
+    stripBytes = len(paths)*len(amps)*dy*width*4
+    boxRowsPerChunk = max(1, min(nBoxRows, maxChunkBytes//stripBytes))
+    overscanColumns = getOverscanColumns(geometry)
+    noise = np.empty((len(paths), len(amps), nBoxRows, nBoxColumns))
+
+    with contextlib.ExitStack() as stack:
+        frames = [stack.enter_context(fits.open(path, memmap=True, do_not_scale_image_data=True))
+                  for path in paths]
+        if overscanColumns is None:
+            bias = np.zeros((len(paths), len(amps), rows.stop - rows.start))
+        else:
+            rowMeans = np.array([readSegmentRows(frame, amps, slice(0, geometry.shape[0]),
+                                                 overscanColumns).mean(axis=2, dtype=np.float64)
+                                 for frame in frames])
+            bias = fitRowBias(rowMeans, rows, fitOrder).astype(np.float32)
+
+        for firstBoxRow in range(0, nBoxRows, boxRowsPerChunk):
+            nChunkRows = min(boxRowsPerChunk, nBoxRows - firstBoxRow)
+            start = firstBoxRow*dy
+            chunkRows = slice(rows.start + start, rows.start + start + nChunkRows*dy)
+            chunkColumns = slice(columns.start, columns.start + width)
+            pixels = np.array([readSegmentRows(frame, amps, chunkRows, chunkColumns) for frame in frames])
+            pixels -= bias[:, :, start:start + nChunkRows*dy, np.newaxis]
+            # (frame, amp, boxRow, row in box, boxColumn, column in box)
+            boxes = pixels.reshape(len(paths), len(amps), nChunkRows, dy, nBoxColumns, dx)
+            good = np.isfinite(boxes)
+            if masked is not None:
+                good &= ~masked[np.newaxis, :, start:start + nChunkRows*dy, :width].reshape(
+                    1, len(amps), nChunkRows, dy, nBoxColumns, dx)
+            for iteration in range(nClipIterations + 1):
+                nGood = good.sum(axis=(3, 5), keepdims=True)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean = np.where(good, boxes, 0).sum(axis=(3, 5), keepdims=True, dtype=np.float64)
+                    mean /= nGood
+                    deviations = np.where(good, boxes - mean.astype(np.float32), 0)
+                    variance = np.square(deviations, dtype=np.float64).sum(axis=(3, 5), keepdims=True)
+                    variance /= nGood - 1
+                if iteration < nClipIterations:
+                    good &= np.abs(deviations) <= nSigmaClip*np.sqrt(variance)
+            noise[:, :, firstBoxRow:firstBoxRow + nChunkRows, :] = np.sqrt(variance[:, :, :, 0, :, 0])
+    return noise.reshape(len(paths), len(amps), -1)
+
+
+class NumpyReadNoiseTask(pipeBase.Task):
+    """Measure the read noise of a CCD from its bias frames, batched over the frames and the amplifiers.
+
+    This is a replacement for eotest's ReadNoiseTask, selected with CpTaskConfig.readNoiseEngine, with the
+    same run() arguments and outputs: the distribution of the noise in each bias frame in
+    <sensor>_read_noise_<nnn>.fits, and READ_NOISE, SYSTEM_NOISE and TOTAL_NOISE in the sensor's eotest
+    results file, in electrons using the gains measured by the Fe55 stage. Rather than sampling random
+    boxes of each amplifier of each frame in turn, the boxes tile the region measured, and every box of
+    every frame and amplifier is measured in one array computation, in strips of rows to bound the memory.
+    """
+    ConfigClass = NumpyReadNoiseConfig
+    _DefaultName = "numpyReadNoise"
+
+    # largest expected relative differences from the results of eotest's ReadNoiseTask, per results column;
+    # the noise is the median over many boxes, so choosing them differently changes it slightly
+    TOLERANCES = {'READ_NOISE': 2e-2, 'SYSTEM_NOISE': 2e-2, 'TOTAL_NOISE': 2e-2}
+
+    def __init__(self, exposurePool=None, **kwargs):
+        pipeBase.Task.__init__(self, **kwargs)
+        # only the mask files are read through the pool; the bias frames are read in strips
+        self.exposurePool = exposurePool if exposurePool is not None else ExposurePool(0)
+
+    def _measureNoise(self, paths, amps, geometry, region, boxShape, masked, gains):
+        """Get the noise in each box of each frame and amplifier, in electrons."""
+        noise = measureBoxNoise(paths, amps, geometry, region, boxShape, masked=masked,
+                                fitOrder=self.config.biasFitOrder, nSigmaClip=self.config.nSigmaClip,
+                                nClipIterations=self.config.nClipIterations,
+                                maxChunkBytes=self.config.maxChunkBytes)
+        return noise*np.array([gains[amp] for amp in amps])[np.newaxis, :, np.newaxis]
+
+    @pipeBase.timeMethod
+    def run(self, sensor_id, bias_files, gains, system_noise_files=None, system_noise=None, mask_files=(),
+            use_overscan=False):
+        """Measure the read noise of a CCD.
+
+        Parameters
+        ----------
+        sensor_id : `str`
+            Name/identifier of the CCD
+        bias_files : `list` of `str`
+            The bias frames
+        gains : `dict` of `int`: `float`
+            The gain of each amplifier, in electrons per ADU
+        system_noise_files : `list` of `str`, optional
+            Frames taken with the CCD disconnected, measuring the noise of the readout system, one per bias
+            frame
+        system_noise : `dict` of `int`: `float`, optional
+            The system noise of each amplifier, in electrons, used if there are no system_noise_files.
+            Defaults to zero.
+        mask_files : `tuple` of `str`
+            The mask files to apply
+        use_overscan : `bool`
+            Measure the noise in the serial overscan rather than in the imaging region?
+        """
+        bias_files = sorted(bias_files)
+        amps = getAmps(bias_files[0])
+        geometry = readAmpGeometry(bias_files[0], amps[0])
+        if use_overscan:
+            columns = getOverscanColumns(geometry)
+            if columns is None:
+                raise RuntimeError("%s has no serial overscan in which to measure the noise" % bias_files[0])
+            region = (geometry.imaging[0], columns)
+            boxShape = (self.config.dy, min(self.config.dx, columns.stop - columns.start))
+            masked = None
+        else:
+            region = geometry.imaging
+            boxShape = (self.config.dy, self.config.dx)
+            masked = readMaskStack(self.exposurePool, mask_files, amps, geometry) if mask_files else None
+
+        totalNoise = self._measureNoise(bias_files, amps, geometry, region, boxShape, masked, gains)
+        if system_noise_files:
+            systemNoise = self._measureNoise(sorted(system_noise_files), amps, geometry, region, boxShape,
+                                             None, gains)
+        else:
+            levels = [system_noise[amp] if system_noise else 0. for amp in amps]
+            systemNoise = np.broadcast_to(np.array(levels)[np.newaxis, :, np.newaxis], totalNoise.shape)
+
+        for i, path in enumerate(bias_files):
+            outputPath = os.path.join(self.config.output_dir, '%s_read_noise_%03i.fits' % (sensor_id, i))
+            self._writeNoiseDists(outputPath, amps, totalNoise[i], systemNoise[i], gains, path,
+                                  system_noise_files[i] if system_noise_files else None)
+
+        results = sensorTest.EOTestResults(os.path.join(self.config.output_dir,
+                                                        '%s_eotest_results.fits' % sensor_id),
+                                           namps=len(amps))
+        total = np.median(totalNoise.transpose(1, 0, 2).reshape(len(amps), -1), axis=1)
+        system = np.median(systemNoise.transpose(1, 0, 2).reshape(len(amps), -1), axis=1)
+        read = np.sqrt(np.maximum(total**2 - system**2, 0.))
+        for i, amp in enumerate(amps):
+            results.add_seg_result(amp, 'READ_NOISE', float(read[i]))
+            results.add_seg_result(amp, 'SYSTEM_NOISE', float(system[i]))
+            results.add_seg_result(amp, 'TOTAL_NOISE', float(total[i]))
+            self.log.info("%s: amp %d read noise %.2f e-" % (sensor_id, amp, read[i]))
+        results.write()
+
+    def _writeNoiseDists(self, path, amps, totalNoise, systemNoise, gains, biasFile, systemNoiseFile):
+        """Write the noise in the boxes of a frame as eotest's <sensor>_read_noise_<nnn>.fits does."""
+        output = fits.HDUList([fits.PrimaryHDU()])
+        output[0].header['BIASFILE'] = biasFile
+        output[0].header['SYSNFILE'] = str(systemNoiseFile)
+        for i, amp in enumerate(amps):
+            channel = CHANNEL_IDS[amp]
+            output.append(fits.BinTableHDU.from_columns([
+                fits.Column(name='TOTAL_NOISE', format='E', unit='e- rms', array=totalNoise[i]),
+                fits.Column(name='SYSTEM_NOISE', format='E', unit='e- rms', array=systemNoise[i])]))
+            output[-1].name = 'SEGMENT%s' % channel
+            output[0].header['GAIN%s' % channel] = gains[amp]
+            output[0].header['SIGTOT%s' % channel] = np.median(totalNoise[i])
+            output[0].header['SIGSYS%s' % channel] = np.median(systemNoise[i])
+        output.writeto(path, overwrite=True)
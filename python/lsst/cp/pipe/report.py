@@ -0,0 +1,149 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Rendering of the per-CCD eotest reports in worker processes, skipping the parts which are up to date."""
+from __future__ import absolute_import, division, print_function
+
+import fnmatch
+import glob
+import os
+import sys
+
+import lsst.eotest.sensor as sensorTest
+
+from .intermediates import _MEDIAN_FILE_PATTERN
+
+__all__ = ["isUpToDate", "getReportInputs", "makeCcdReport"]
+
+# Files written by eotest's report itself, which are not among its inputs
+_REPORT_FILE_PATTERN = '*_eotest_report.*'
+
+# Bounds the number of pdflatex runs at once over all the workers; set by _initReportWorker()
+_latexSemaphore = None
+
+
+def _initReportWorker(latexSemaphore):
+    """Set up a report worker process: share the pdflatex semaphore, and plot without a display."""
+    global _latexSemaphore
+    _latexSemaphore = latexSemaphore
+    try:
+        import matplotlib
+    except ImportError:
+        return  # nothing will be plotted
+    matplotlib.use('Agg')
+    if 'matplotlib.pyplot' in sys.modules:
+        sys.modules['matplotlib.pyplot'].switch_backend('Agg')  # eotest may already have imported pyplot
+
+
+def isUpToDate(outputs, inputs):
+    """Are there outputs, all of which are newer than all the inputs?
+
+    Parameters
+    ----------
+    outputs : `list` of `str`
+        The output files
+    inputs : `list` of `str`
+        The files from which they are made
+
+    Returns
+    -------
+    upToDate : `bool`
+        True if there are outputs and they need not be remade
+    """
+    if not outputs:
+        return False
+    try:
+        oldestOutput = min(os.path.getmtime(path) for path in outputs)
+    except OSError:
+        return False
+    newestInput = max([os.path.getmtime(path) for path in inputs] or [0])
+    return oldestOutput >= newestInput
+
+
+def getReportInputs(outputPath, ccd):
+    """List the eotest output files of a CCD, from which its report is made.
+
+    Parameters
+    ----------
+    outputPath : `str`
+        The eotest output directory
+    ccd : `str` or `int`
+        Name/identifier of the CCD
+
+    Returns
+    -------
+    paths : `list` of `str`
+        The files
+    """
+    prefix = str(ccd) + '_'
+    return [os.path.join(outputPath, filename) for filename in sorted(os.listdir(outputPath))
+            if filename.startswith(prefix) and not fnmatch.fnmatch(filename, _MEDIAN_FILE_PATTERN) and
+            not fnmatch.fnmatch(filename, _REPORT_FILE_PATTERN)]
+
+
+def makeCcdReport(args):
+    """Make the figures and pdf report of one CCD, as far as they are out of date.
+
+    The figures are redrawn if any of the CCD's eotest outputs are newer than the oldest of them, and the
+    pdf is remade if it is older than any of the figures or outputs. The work is done in the output
+    directory, where eotest's report writes its .tex and pdflatex its .pdf, so this must be run in a
+    worker process, which is also where the plotting backend is made headless.
+
+    Parameters
+    ----------
+    args : `tuple`
+        The CCD, the eotest output directory, the directory for the figures, and whether to redraw
+        everything regardless of the file times
+
+    Returns
+    -------
+    ccd : `str` or `int`
+        The CCD
+    status : `str`
+        What was done, or the error if it failed
+    succeeded : `bool`
+        Was the report made, or was it already up to date?
+    """
+    ccd, outputPath, plotPath, alwaysRedraw = args
+    try:
+        os.chdir(outputPath)
+        inputs = getReportInputs(outputPath, ccd)
+        figures = glob.glob(os.path.join(plotPath, '%s_*' % ccd))
+        pdfs = glob.glob(os.path.join(outputPath, '%s_eotest_report.pdf' % ccd))
+        redrawFigures = alwaysRedraw or not isUpToDate(figures, inputs)
+        remakePdf = redrawFigures or not isUpToDate(pdfs, inputs + figures)
+        if not remakePdf:
+            return ccd, "up to date", True
+
+        plots = sensorTest.EOTestPlots(ccd, outputPath, plotPath)
+        eoTestReport = sensorTest.EOTestReport(plots, wl_dir='')
+        if redrawFigures:
+            eoTestReport.make_figures()
+        if _latexSemaphore is not None:
+            with _latexSemaphore:
+                eoTestReport.make_pdf()
+        else:
+            eoTestReport.make_pdf()
+        return ccd, "made figures and pdf" if redrawFigures else "made pdf from existing figures", True
+    except Exception as e:
+        return ccd, "%s: %s" % (type(e).__name__, e), False
@@ -0,0 +1,230 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""A shared cache of eotest stage outputs, keyed on a hash of everything which went into them."""
+from __future__ import absolute_import, division, print_function
+
+import fnmatch
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+__all__ = ["ResultCache", "hashFile"]
+
+
+def hashFile(path, blockSize=1 << 20):
+    """Get the SHA-1 hash of a file's contents.
+
+    Parameters
+    ----------
+    path : `str`
+        The file
+    blockSize : `int`
+        Number of bytes read at a time
+
+    Returns
+    -------
+    digest : `str`
+        The hex digest of the file
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ResultCache(object):
+    """Size-bounded cache of the outputs of eotest stages, which can be shared between runs and users.
+
+    Each entry holds the files written by one (stage, ccd) unit and the return value of the subtask's run()
+    method, under a key which is a hash of everything that went into the unit. Entries are written to a
+    temporary directory and renamed into place, so several processes may share a cache. When the cache
+    grows beyond its size limit, the least recently used entries are evicted.
+
+    Parameters
+    ----------
+    root : `str`
+        Directory in which the cache is kept
+    maxBytes : `int`
+        Maximum total size of the cached files
+    link : `bool`
+        Hard-link cached files into the output directory rather than copying them? This is only safe if
+        nothing subsequently modifies the files in place.
+    """
+
+    def __init__(self, root, maxBytes, link=False):
+        self.root = root
+        self.maxBytes = maxBytes
+        self.link = link
+        if not os.path.exists(root):
+            os.makedirs(root)
+
+    @staticmethod
+    def makeKey(description):
+        """Make a cache key.
+
+        Parameters
+        ----------
+        description : `dict`
+            Everything which went into a unit, which must be JSON serialisable. File contents should be
+            represented by a hash of the contents, and files in the output directory by their base names,
+            so that the same inputs give the same key whichever output directory they are in.
+
+        Returns
+        -------
+        key : `str`
+            The key
+        """
+        return hashlib.sha1(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entryDir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def fetch(self, key, outputPath, copyAlways=()):
+        """Put the cached outputs of a unit into an output directory.
+
+        The files are first copied or linked into a temporary directory in the output directory, and only
+        moved into place once they are all there, so a fetch which fails leaves the outputs of the previous
+        stages untouched.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the unit
+        outputPath : `str`
+            The directory into which to put the outputs
+        copyAlways : iterable of `str`
+            Base names, or glob patterns matching them, of files which must be copied even if the cache links
+            files, e.g. because they will be updated in place later
+
+        Returns
+        -------
+        hit : `tuple` or `None`
+            The return value of the subtask's run() method and the list of output files, or None if the key
+            is not in the cache
+        """
+        entryDir = self._entryDir(key)
+        entryFile = os.path.join(entryDir, 'entry.json')
+        tmpDir = None
+        try:
+            with open(entryFile) as f:
+                entry = json.load(f)
+            with open(os.path.join(entryDir, 'result.pickle'), 'rb') as f:
+                result = pickle.load(f)
+            tmpDir = tempfile.mkdtemp(dir=outputPath, prefix='.cache-')
+            for filename in entry['files']:
+                source = os.path.join(entryDir, 'files', filename)
+                staged = os.path.join(tmpDir, filename)
+                if self.link and not any(fnmatch.fnmatch(filename, pattern) for pattern in copyAlways):
+                    try:
+                        os.link(source, staged)
+                    except OSError:  # e.g. the cache is on a different filesystem
+                        shutil.copy2(source, staged)
+                else:
+                    shutil.copy2(source, staged)
+            outputs = []
+            for filename in entry['files']:
+                target = os.path.join(outputPath, filename)
+                os.rename(os.path.join(tmpDir, filename), target)  # replaces any earlier version
+                outputs.append(target)
+            os.utime(entryFile, None)  # mark as recently used
+        except (IOError, OSError, EOFError, ValueError):
+            # not there, or evicted by another process while we were reading it
+            return None
+        finally:
+            if tmpDir is not None:
+                shutil.rmtree(tmpDir, ignore_errors=True)
+        return result, outputs
+
+    def store(self, key, outputs, result):
+        """Add the outputs of a unit to the cache.
+
+        Parameters
+        ----------
+        key : `str`
+            The key of the unit
+        outputs : iterable of `str`
+            The files written by the unit
+        result : `object`
+            The return value of the subtask's run() method, which must be picklable
+        """
+        entryDir = self._entryDir(key)
+        if os.path.exists(entryDir):
+            return
+        parent = os.path.dirname(entryDir)
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        tmpDir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+        try:
+            os.mkdir(os.path.join(tmpDir, 'files'))
+            size = 0
+            for output in outputs:
+                shutil.copy2(output, os.path.join(tmpDir, 'files', os.path.basename(output)))
+                size += os.path.getsize(output)
+            with open(os.path.join(tmpDir, 'result.pickle'), 'wb') as f:
+                pickle.dump(result, f)
+            with open(os.path.join(tmpDir, 'entry.json'), 'w') as f:
+                json.dump(dict(files=[os.path.basename(output) for output in outputs], size=size,
+                               created=time.time()), f)
+            os.rename(tmpDir, entryDir)
+        except OSError:
+            # most likely another process has just stored the same entry
+            shutil.rmtree(tmpDir, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is within its size limit.
+
+        Returns
+        -------
+        nEvicted : `int`
+            The number of entries removed
+        """
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefixDir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefixDir):
+                continue
+            for key in os.listdir(prefixDir):
+                entryFile = os.path.join(prefixDir, key, 'entry.json')
+                try:
+                    with open(entryFile) as f:
+                        size = json.load(f)['size']
+                    entries.append((os.path.getmtime(entryFile), size, os.path.join(prefixDir, key)))
+                except (IOError, OSError, ValueError, KeyError):
+                    continue  # an entry being written or removed by someone else
+        total = sum(size for _, size, _ in entries)
+        nEvicted = 0
+        for _, size, entryDir in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(entryDir, ignore_errors=True)
+            total -= size
+            nEvicted += 1
+        return nEvicted
@@ -0,0 +1,277 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Dependency-aware scheduling of the (stage, ccd) units of work in an eotest run."""
+from __future__ import absolute_import, division, print_function
+
+from .eotestStages import getStage
+
+__all__ = ["WorkUnit", "StageScheduler"]
+
+
+class WorkUnit(object):
+    """A single eotest stage to be run on a single CCD.
+
+    Parameters
+    ----------
+    stage : `lsst.cp.pipe.EotestStage`
+        The stage to run
+    ccd : `str` or `int`
+        Name/identifier of the CCD
+    run : `str`
+        The run containing the data
+    """
+
+    def __init__(self, stage, ccd, run):
+        self.stage = stage
+        self.ccd = ccd
+        self.run = run
+
+    @property
+    def key(self):
+        """A hashable identifier of the unit."""
+        return (self.run, self.stage.name, self.ccd)
+
+    def __repr__(self):
+        return "WorkUnit(run=%s, stage=%s, ccd=%s)" % (self.run, self.stage.name, self.ccd)
+
+    def toDict(self):
+        """Get a description of the unit which can be serialised as JSON.
+
+        Returns
+        -------
+        data : `dict`
+            The run, the name of the stage and the CCD
+        """
+        return dict(run=self.run, stage=self.stage.name, ccd=self.ccd)
+
+    @classmethod
+    def fromDict(cls, data):
+        """Make a unit from its description.
+
+        Parameters
+        ----------
+        data : `dict`
+            The description, from toDict()
+
+        Returns
+        -------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit
+        """
+        return cls(getStage(data['stage']), data['ccd'], data['run'])
+
+
+class StageScheduler(object):
+    """Hand out work units as their dependencies are satisfied.
+
+    Units become ready once all the units they depend on are done. Ready units are handed out in the order
+    in which they were supplied, so giving the units stage-by-stage keeps the canonical eotest order for
+    each CCD, while one CCD can move on to its next stage without waiting for the others to finish the
+    current one. Units in the same group are never handed out concurrently; CpTask groups units by CCD,
+    because every eotest task updates the sensor's results file.
+
+    Parameters
+    ----------
+    units : `list` of `lsst.cp.pipe.WorkUnit`
+        The units to run, in priority order
+    dependencies : `dict`
+        Mapping from a unit's key to an iterable of the keys of the units it depends on. Dependencies on
+        units which are not being run are ignored.
+    groupOf : callable, optional
+        Function returning the group of a unit. Defaults to no grouping.
+    """
+
+    def __init__(self, units, dependencies=None, groupOf=None):
+        self._units = list(units)
+        keys = set(unit.key for unit in self._units)
+        if len(keys) != len(self._units):
+            raise ValueError("Work units must be unique")
+        dependencies = dependencies or {}
+        self._dependencies = {}
+        self._dependents = {key: set() for key in keys}
+        for unit in self._units:
+            deps = set(dep for dep in dependencies.get(unit.key, ()) if dep in keys)
+            self._dependencies[unit.key] = deps
+            for dep in deps:
+                self._dependents[dep].add(unit.key)
+        self._groupOf = groupOf if groupOf is not None else (lambda unit: None)
+        self._waiting = list(self._units)
+        self._running = {}
+        self._done = set()
+        self._skipped = set()
+        self._checkForCycles()
+
+    def _checkForCycles(self):
+        """Raise if the dependencies can never all be satisfied."""
+        remaining = dict((key, set(deps)) for key, deps in self._dependencies.items())
+        while remaining:
+            free = [key for key, deps in remaining.items() if not deps]
+            if not free:
+                raise ValueError("Circular dependencies between work units: %s" % sorted(remaining))
+            for key in free:
+                del remaining[key]
+            for deps in remaining.values():
+                deps.difference_update(free)
+
+    @property
+    def units(self):
+        """All the units, in priority order."""
+        return list(self._units)
+
+    @property
+    def nRunning(self):
+        """Number of units handed out but not yet finished."""
+        return len(self._running)
+
+    @property
+    def isFinished(self):
+        """Have all units been run or skipped?"""
+        return not self._waiting and not self._running
+
+    @property
+    def running(self):
+        """Units which have been handed out but have not yet finished."""
+        return list(self._running.values())
+
+    @property
+    def skipped(self):
+        """Units which were skipped because something they depend on failed."""
+        return [unit for unit in self._units if unit.key in self._skipped]
+
+    def getDependencies(self, unit):
+        """Get the units which a unit depends on.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit
+
+        Returns
+        -------
+        keys : `list`
+            The keys of the units it depends on, leaving out any which are not being run
+        """
+        return sorted(self._dependencies[unit.key])
+
+    def peekWaiting(self, nUnits):
+        """Get the next units which are waiting to be handed out, whether or not they are ready.
+
+        Parameters
+        ----------
+        nUnits : `int`
+            Maximum number of units to return
+
+        Returns
+        -------
+        units : `list` of `lsst.cp.pipe.WorkUnit`
+            The units, in priority order
+        """
+        return self._waiting[:nUnits]
+
+    def getPending(self, group):
+        """Get the units of a group which have not yet finished, whether waiting or running.
+
+        Parameters
+        ----------
+        group : `object`
+            The group, as returned by the groupOf function
+
+        Returns
+        -------
+        units : `list` of `lsst.cp.pipe.WorkUnit`
+            The units, running ones first, then waiting ones in priority order
+        """
+        return [unit for unit in list(self._running.values()) + self._waiting if self._groupOf(unit) == group]
+
+    def getReady(self, maxUnits=None, admit=None):
+        """Get units which may be started now, and mark them as running.
+
+        Parameters
+        ----------
+        maxUnits : `int`, optional
+            Maximum number of units to return. Defaults to all the ready units.
+        admit : callable, optional
+            Function called with each unit which is ready, in priority order, returning whether it may be
+            started, e.g. given the resources it needs. Units which are not admitted stay waiting, and
+            later units may still be started. Defaults to admitting every ready unit.
+
+        Returns
+        -------
+        units : `list` of `lsst.cp.pipe.WorkUnit`
+            Units to start, in priority order
+        """
+        busyGroups = set(self._groupOf(unit) for unit in self._running.values())
+        ready = []
+        for unit in self._waiting:
+            if maxUnits is not None and len(ready) >= maxUnits:
+                break
+            group = self._groupOf(unit)
+            if group is not None and group in busyGroups:
+                continue
+            if self._dependencies[unit.key] <= self._done and (admit is None or admit(unit)):
+                ready.append(unit)
+                if group is not None:
+                    busyGroups.add(group)
+        for unit in ready:
+            self._waiting.remove(unit)
+            self._running[unit.key] = unit
+        return ready
+
+    def markDone(self, unit):
+        """Record that a unit has completed successfully.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit which has finished
+        """
+        del self._running[unit.key]
+        self._done.add(unit.key)
+
+    def markFailed(self, unit):
+        """Record that a unit has failed, and skip everything which depends on it.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit which has failed
+
+        Returns
+        -------
+        skipped : `list` of `lsst.cp.pipe.WorkUnit`
+            The waiting units which will now never be run
+        """
+        del self._running[unit.key]
+        toSkip = set()
+        stack = list(self._dependents[unit.key])
+        while stack:
+            key = stack.pop()
+            if key not in toSkip:
+                toSkip.add(key)
+                stack.extend(self._dependents[key])
+        skipped = [waiting for waiting in self._waiting if waiting.key in toSkip]
+        for waiting in skipped:
+            self._waiting.remove(waiting)
+            self._skipped.add(waiting.key)
+        return skipped
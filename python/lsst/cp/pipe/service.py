@@ -0,0 +1,359 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""A long-lived service running eotest jobs from a file-based queue, keeping its tasks and butlers warm."""
+from __future__ import absolute_import, division, print_function
+
+import collections
+import errno
+import glob
+import json
+import os
+import socket
+import time
+import traceback
+
+import lsst.log as lsstLog
+
+from .cpTask import CpTask
+from .eotestStages import EOTEST_STAGES
+
+__all__ = ["CpService", "submitJob", "readJobResult"]
+
+
+def _writeJson(path, data):
+    """Write a JSON file atomically, so that nothing watching the queue sees it half written."""
+    tmpPath = os.path.join(os.path.dirname(path), '.%s.tmp' % os.path.basename(path))
+    with open(tmpPath, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.rename(tmpPath, path)
+
+
+def _makeQueueDirs(queueDir):
+    """Make the directories of a job queue, returning those of the pending, running and done jobs."""
+    dirs = [os.path.join(queueDir, name) for name in ('pending', 'running', 'done')]
+    for path in dirs:
+        if not os.path.exists(path):
+            os.makedirs(path)
+    return dirs
+
+
+def _ownerSuffix(host, pid):
+    """Get the suffix of the name of a running job's file recording the service which claimed it."""
+    return '@%s@%d' % (host, pid)
+
+
+def _parseRunningName(name):
+    """Split the name of a running job's file into the job identifier, host and pid of its owner.
+
+    The host and pid are None for a file written by a service which didn't record its owner.
+    """
+    parts = name[:-len('.json')].split('@')
+    if len(parts) != 3:
+        return parts[0], None, None
+    return parts[0], parts[1], int(parts[2])
+
+
+def _isAlive(pid):
+    """Return whether a process of this host is running."""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM  # it exists, but belongs to someone else
+    return True
+
+
+def submitJob(queueDir, repo, run=None, stages=None, ccds=None, config=None):
+    """Add a job to the queue of a `CpService`.
+
+    Parameters
+    ----------
+    queueDir : `str`
+        The directory of the queue
+    repo : `str`
+        The repository containing the eotest data
+    run : `str`, optional
+        The run to process; see `lsst.cp.pipe.CpTask.runEotestDirect`
+    stages : `list` of `str`, optional
+        The names of the eotest stages to run, e.g. ['readNoise']. Defaults to those switched on in the
+        service's config.
+    ccds : `list` of `str`, optional
+        The CCDs to process. Defaults to all those in the run.
+    config : `dict`, optional
+        Overrides of CpTaskConfig fields, e.g. {'eotestOutputPath': '/scratch/eotest'}
+
+    Returns
+    -------
+    jobId : `str`
+        The identifier of the job, with which to get its result from readJobResult()
+    """
+    pendingDir = _makeQueueDirs(queueDir)[0]
+    # zero-padded so that the jobs sort in the order in which they were submitted
+    jobId = '%017.6f_%d' % (time.time(), os.getpid())
+    job = dict(repo=repo, run=None if run is None else str(run), stages=stages,
+               ccds=None if ccds is None else [str(ccd) for ccd in ccds], config=config or {})
+    _writeJson(os.path.join(pendingDir, jobId + '.json'), job)
+    return jobId
+
+
+def readJobResult(queueDir, jobId):
+    """Read the result of a job run by a `CpService`.
+
+    Parameters
+    ----------
+    queueDir : `str`
+        The directory of the queue
+    jobId : `str`
+        The identifier of the job, as returned by submitJob()
+
+    Returns
+    -------
+    result : `dict` or None
+        The job, with its 'status' ('succeeded' or 'failed'), 'wallTime' and, if it failed, 'error'. None
+        if the job has not finished.
+    """
+    path = os.path.join(queueDir, 'done', jobId + '.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class CpService(object):
+    """Run eotest jobs submitted to a file-based queue, reusing the tasks and butlers between them.
+
+    Each job (see submitJob()) is a JSON file in the 'pending' directory of the queue. The service claims
+    it by moving it to 'running', under a name recording the host and pid of the service, runs
+    CpTask.runEotestDirect() for it, then writes it, with its outcome, to 'done'. Several services may
+    share a queue, as only one of them can claim a job. A new service requeues the jobs left running by
+    dead services of its own host; those of a dead service on another host must be moved back to
+    'pending' by hand, as the service can't tell whether their owner is still running.
+
+    Starting a CpTask means importing eotest, validating and freezing the config, and constructing the
+    subtasks, which is a large part of a short job. The service keeps the tasks made for the last
+    maxTasks distinct configs, and the butler of each repo it has used, so a job repeating an earlier
+    config only pays for its own work. Each kept task with config.numProcesses > 1 also keeps its pool of
+    worker processes (see CpTask.startWorkerPool()), forked after it was constructed.
+
+    Parameters
+    ----------
+    queueDir : `str`
+        The directory of the queue
+    config : `dict`, optional
+        Overrides of CpTaskConfig fields applied to every job, before those of the job
+    maxTasks : `int`, optional
+        The maximum number of tasks to keep
+    configure : callable, optional
+        Function called with each new CpTaskConfig before the overrides are applied, e.g. to retarget the
+        subtasks, which can't be done with overrides.
+    butlerFactory : callable, optional
+        Function making the butler of a repo from its path. Defaults to `lsst.daf.persistence.Butler`.
+    log : `lsst.log.Log`, optional
+        Log to use. Defaults to the 'cp.service' logger.
+    """
+
+    def __init__(self, queueDir, config=None, maxTasks=4, configure=None, butlerFactory=None, log=None):
+        self.queueDir = queueDir
+        self.pendingDir, self.runningDir, self.doneDir = _makeQueueDirs(queueDir)
+        self.config = config or {}
+        self.maxTasks = maxTasks
+        self.configure = configure
+        self.butlerFactory = butlerFactory
+        self.log = log if log is not None else lsstLog.Log.getLogger('cp.service')
+        self._tasks = collections.OrderedDict()
+        self._butlers = {}
+        self.nJobs = 0
+
+        self.host = socket.gethostname()
+        self.requeueOrphans()
+
+    def requeueOrphans(self):
+        """Move the jobs left running by dead services back to 'pending'.
+
+        With config.resume set, running such a job again only reruns its unfinished units. Jobs claimed
+        by live services, or by services of other hosts, are left alone.
+
+        Returns
+        -------
+        jobIds : `list` of `str`
+            The identifiers of the requeued jobs
+        """
+        jobIds = []
+        for path in sorted(glob.glob(os.path.join(self.runningDir, '*.json'))):
+            jobId, host, pid = _parseRunningName(os.path.basename(path))
+            if host is not None and (host != self.host or _isAlive(pid)):
+                continue
+            try:
+                os.rename(path, os.path.join(self.pendingDir, jobId + '.json'))
+            except OSError:
+                continue  # requeued by another service starting at the same time
+            self.log.warn("Requeueing job %s, which was left running by a dead service" % jobId)
+            jobIds.append(jobId)
+        return jobIds
+
+    def _getButler(self, repo):
+        """Get the butler of a repo, making it if it hasn't been used before."""
+        if repo not in self._butlers:
+            if self.butlerFactory is None:
+                import lsst.daf.persistence as dafPersist
+                self._butlers[repo] = dafPersist.Butler(repo)
+            else:
+                self._butlers[repo] = self.butlerFactory(repo)
+        return self._butlers[repo]
+
+    def _getConfigOverrides(self, job):
+        """Get the CpTaskConfig overrides of a job, including switching on only its stages."""
+        overrides = dict(job.get('config') or {})
+        stages = job.get('stages')
+        if stages is not None:
+            unknown = set(stages) - set(stage.name for stage in EOTEST_STAGES)
+            if unknown:
+                raise RuntimeError("Unknown eotest stages %s" % sorted(unknown))
+            for stage in EOTEST_STAGES:
+                overrides[stage.doField] = stage.name in stages
+        return overrides
+
+    def getTask(self, overrides=None):
+        """Get a task with the given config, reusing a kept one if possible.
+
+        Parameters
+        ----------
+        overrides : `dict`, optional
+            Overrides of CpTaskConfig fields, applied after those of the service
+
+        Returns
+        -------
+        task : `lsst.cp.pipe.CpTask`
+            The task, with its pool of worker processes started
+        """
+        overrides = dict(self.config, **(overrides or {}))
+        key = json.dumps(overrides, sort_keys=True)
+        if key in self._tasks:
+            self._tasks[key] = self._tasks.pop(key)  # now the most recently used
+        else:
+            config = CpTask.ConfigClass()
+            if self.configure is not None:
+                self.configure(config)
+            for name, value in overrides.items():
+                setattr(config, name, value)
+            self._tasks[key] = CpTask(config=config)
+            while len(self._tasks) > max(self.maxTasks, 1):
+                self._tasks.popitem(last=False)[1].stopWorkerPool()
+        task = self._tasks[key]
+        task.startWorkerPool()  # no-op unless it isn't running, e.g. after a failed job
+        return task
+
+    def runJob(self, jobId):
+        """Claim and run a pending job.
+
+        Parameters
+        ----------
+        jobId : `str`
+            The identifier of the job
+
+        Returns
+        -------
+        result : `dict` or None
+            The job with its outcome, as written to the 'done' directory, or None if the job had already
+            been claimed by another service.
+        """
+        # the owner is part of the name, so that claiming the job and recording who did are one rename
+        runningPath = os.path.join(self.runningDir, jobId + _ownerSuffix(self.host, os.getpid()) + '.json')
+        try:
+            os.rename(os.path.join(self.pendingDir, jobId + '.json'), runningPath)
+        except OSError:
+            return None
+        with open(runningPath) as f:
+            job = json.load(f)
+
+        self.log.info("Starting job %s: run %s, stages %s, CCDs %s" %
+                      (jobId, job.get('run'), job.get('stages'), job.get('ccds')))
+        start = time.time()
+        try:
+            task = self.getTask(self._getConfigOverrides(job))
+            task.runEotestDirect(self._getButler(job['repo']), run=job.get('run'), ccds=job.get('ccds'))
+            job['status'] = 'succeeded'
+        except Exception as e:
+            self.log.warn("Job %s failed: %s" % (jobId, e))
+            job['status'] = 'failed'
+            job['error'] = traceback.format_exc()
+        job['wallTime'] = time.time() - start
+        self.log.info("Finished job %s in %.1f s: %s" % (jobId, job['wallTime'], job['status']))
+
+        _writeJson(os.path.join(self.doneDir, jobId + '.json'), job)
+        try:
+            os.remove(runningPath)
+        except OSError:
+            self.log.warn("Job %s was no longer in %s" % (jobId, self.runningDir))
+        self.nJobs += 1
+        return job
+
+    def runPending(self):
+        """Run all the jobs which are pending, in the order they were submitted.
+
+        Returns
+        -------
+        nJobs : `int`
+            The number of jobs run
+        """
+        nJobs = 0
+        for path in sorted(glob.glob(os.path.join(self.pendingDir, '*.json'))):
+            if self.runJob(os.path.basename(path)[:-len('.json')]) is not None:
+                nJobs += 1
+        return nJobs
+
+    def serve(self, pollInterval=1., maxJobs=None, idleTimeout=None):
+        """Run jobs as they are submitted, until stopped.
+
+        Parameters
+        ----------
+        pollInterval : `float`, optional
+            Seconds to wait between checks of the queue when it is empty
+        maxJobs : `int`, optional
+            Stop after running this many jobs. Defaults to no limit.
+        idleTimeout : `float`, optional
+            Stop after this many seconds without a job to run. Defaults to no limit.
+        """
+        self.log.info("Serving eotest jobs from %s" % self.queueDir)
+        lastJob = time.time()
+        try:
+            while maxJobs is None or self.nJobs < maxJobs:
+                paths = sorted(glob.glob(os.path.join(self.pendingDir, '*.json')))
+                if paths and self.runJob(os.path.basename(paths[0])[:-len('.json')]) is not None:
+                    lastJob = time.time()
+                    continue
+                if idleTimeout is not None and time.time() - lastJob > idleTimeout:
+                    self.log.info("No jobs for %.0f s; stopping" % idleTimeout)
+                    break
+                if not paths:
+                    time.sleep(pollInterval)
+        finally:
+            self.close()
+
+    def close(self):
+        """Shut down the worker pools of the kept tasks, and forget the tasks and butlers."""
+        for task in self._tasks.values():
+            task.stopWorkerPool()
+        self._tasks.clear()
+        self._butlers.clear()
@@ -0,0 +1,238 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""Staging of raw input files onto fast local scratch space."""
+from __future__ import absolute_import, division, print_function
+
+import collections
+import gzip
+import hashlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+__all__ = ["InputStager"]
+
+
+class _StagedFile(object):
+    """Book-keeping for one staged file."""
+
+    def __init__(self, localPath):
+        self.localPath = localPath
+        self.size = 0
+        self.lastUsed = 0
+        self.ready = threading.Event()
+        self.failed = False
+
+
+class InputStager(object):
+    """Copy input files into local scratch space once, so that they are not repeatedly read from a slow
+    shared filesystem.
+
+    Files are copied into a private directory under the scratch directory, keeping their base names, which
+    eotest relies on (e.g. for the flat pair numbers), and optionally decompressing them. Files can be
+    staged in a background thread ahead of being needed. Staged files which are not in use are evicted,
+    least recently used first, to keep within the size budget; if a file cannot be fitted in, its original
+    path is used instead.
+
+    Parameters
+    ----------
+    scratchDir : `str`
+        Directory under which to stage the files
+    maxBytes : `int`
+        Maximum total size of the staged files
+    decompress : `bool`
+        Decompress gzipped files, removing their '.gz' suffix?
+    log : `lsst.log.Log`, optional
+        Logger for reporting failures to stage files
+    """
+
+    def __init__(self, scratchDir, maxBytes, decompress=False, log=None):
+        if not os.path.exists(scratchDir):
+            os.makedirs(scratchDir)
+        self.stagingDir = tempfile.mkdtemp(dir=scratchDir, prefix='cpPipeStaging-')
+        self.maxBytes = maxBytes
+        self.decompress = decompress
+        self.log = log
+        self._files = {}
+        self._pins = collections.Counter()
+        self._usedBytes = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._prefetchLoop, name='InputStager')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _getLocalPath(self, path):
+        # files from different directories may share a base name, so keep them in separate directories
+        subDir = hashlib.sha1(os.path.dirname(path).encode()).hexdigest()[:12]
+        basename = os.path.basename(path)
+        if self.decompress and basename.endswith('.gz'):
+            basename = basename[:-3]
+        return os.path.join(self.stagingDir, subDir, basename)
+
+    def _reserve(self, size):
+        """Evict unused files until size bytes can be added; must be called with the lock held."""
+        candidates = sorted((staged.lastUsed, path) for path, staged in self._files.items()
+                            if self._pins[path] == 0 and staged.ready.is_set())
+        while self._usedBytes + size > self.maxBytes and candidates:
+            _, path = candidates.pop(0)
+            staged = self._files.pop(path)
+            self._usedBytes -= staged.size
+            if os.path.exists(staged.localPath):
+                os.remove(staged.localPath)
+        if self._usedBytes + size > self.maxBytes:
+            return False
+        self._usedBytes += size
+        return True
+
+    def _copy(self, path, staged):
+        """Copy a file into the staging area, or mark it as failed.
+
+        A failed copy, e.g. because the scratch space is full, gives back the space it reserved and
+        removes whatever it had written.
+        """
+        reserved = False
+        tmpPath = staged.localPath + '.tmp'
+        try:
+            size = os.path.getsize(path)
+            with self._lock:
+                reserved = self._reserve(size)
+                if reserved:
+                    staged.size = size
+            if not reserved:
+                staged.failed = True
+                return
+            localDir = os.path.dirname(staged.localPath)
+            if not os.path.exists(localDir):
+                os.makedirs(localDir)
+            if self.decompress and path.endswith('.gz'):
+                with gzip.open(path, 'rb') as src, open(tmpPath, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 22)
+            else:
+                shutil.copyfile(path, tmpPath)
+            os.rename(tmpPath, staged.localPath)
+            with self._lock:
+                # account for the real size of decompressed files
+                newSize = os.path.getsize(staged.localPath)
+                self._usedBytes += newSize - staged.size
+                staged.size = newSize
+        except (IOError, OSError) as e:
+            staged.failed = True
+            with self._lock:
+                if reserved:
+                    self._usedBytes -= staged.size
+                    staged.size = 0
+            for leftover in (tmpPath, staged.localPath):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass  # never written
+            if self.log is not None:
+                self.log.warn("Failed to stage %s, so reading it in place: %s" % (path, e))
+        finally:
+            staged.ready.set()
+
+    def _claim(self, path, pin=False):
+        """Get the book-keeping for a file, and whether the caller must copy it, optionally marking it as
+        in use so that it isn't evicted."""
+        with self._lock:
+            if pin:
+                self._pins[path] += 1
+            staged = self._files.get(path)
+            if staged is not None and not (staged.ready.is_set() and staged.failed):
+                return staged, False
+            staged = _StagedFile(self._getLocalPath(path))
+            self._files[path] = staged
+            return staged, True
+
+    def _prefetchLoop(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            staged, mustCopy = self._claim(path)
+            if mustCopy:
+                self._copy(path, staged)
+
+    def prefetch(self, paths):
+        """Stage files in the background.
+
+        Parameters
+        ----------
+        paths : iterable of `str`
+            The files to stage
+        """
+        for path in paths:
+            self._queue.put(path)
+
+    def stage(self, paths):
+        """Stage files, waiting for any being staged in the background, and mark them as in use.
+
+        Parameters
+        ----------
+        paths : iterable of `str`
+            The files to stage
+
+        Returns
+        -------
+        localPaths : `list` of `str`
+            The paths to use for the files, which are their original paths for any which could not be
+            staged. Call release() with the original paths once they are no longer needed.
+        """
+        localPaths = []
+        for path in paths:
+            staged, mustCopy = self._claim(path, pin=True)
+            if mustCopy:
+                self._copy(path, staged)
+            staged.ready.wait()
+            with self._lock:
+                self._clock += 1
+                staged.lastUsed = self._clock
+            localPaths.append(path if staged.failed else staged.localPath)
+        return localPaths
+
+    def release(self, paths):
+        """Mark staged files as no longer in use, allowing them to be evicted.
+
+        Parameters
+        ----------
+        paths : iterable of `str`
+            The original paths of the files, as passed to stage()
+        """
+        with self._lock:
+            for path in paths:
+                if self._pins[path] > 0:
+                    self._pins[path] -= 1
+
+    def close(self):
+        """Stop staging, and delete all the staged files."""
+        self._queue.put(None)
+        self._thread.join()
+        shutil.rmtree(self.stagingDir, ignore_errors=True)
+        self._files = {}
+        self._pins.clear()
+        self._usedBytes = 0
@@ -0,0 +1,379 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+
+"""Queues of eotest work units shared by worker processes, possibly on several nodes."""
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+
+from .scheduler import WorkUnit
+
+__all__ = ["WorkQueue", "SqliteWorkQueue"]
+
+
+@contextlib.contextmanager
+def _keepLeased(workQueue, unit, workerId, log=None):
+    """Renew the lease of a unit in a background thread for as long as the context is active.
+
+    A renewal which raises, e.g. because the database is locked by other workers, is logged and retried
+    on the next tick. If the lease can't be renewed before it expires, or the queue reports that the worker
+    no longer holds it, the lease is lost: another worker may be running the unit, so this one must not
+    record its outcome.
+
+    Parameters
+    ----------
+    workQueue : `WorkQueue`
+        The queue from which the unit was leased
+    unit : `lsst.cp.pipe.WorkUnit`
+        The unit
+    workerId : `str`
+        The identifier of the worker holding the lease
+    log : `lsst.log.Log`, optional
+        Log to which to report failed renewals. Defaults to the 'cp.workQueue' logger.
+
+    Yields
+    ------
+    lost : `threading.Event`
+        Set once the lease is lost
+    """
+    if log is None:
+        import lsst.log as lsstLog
+        log = lsstLog.Log.getLogger('cp.workQueue')
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def renew():
+        renewed = time.time()
+        while not stop.wait(workQueue.leaseSeconds/3):
+            try:
+                if not workQueue.renew(unit, workerId):
+                    lost.set()
+                    break
+                renewed = time.time()
+            except Exception as e:
+                if time.time() - renewed > workQueue.leaseSeconds:
+                    log.warn("Lease of %s task on %s expired without being renewed: %s" %
+                             (unit.stage.name, unit.ccd, e))
+                    lost.set()
+                    break
+                log.warn("Failed to renew the lease of %s task on %s; retrying: %s" %
+                         (unit.stage.name, unit.ccd, e))
+
+    thread = threading.Thread(target=renew)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        thread.join()
+
+
+class WorkQueue(object):
+    """Interface of a queue from which workers lease the (run, stage, ccd) units of an eotest campaign.
+
+    A queue hands out units with the same rules as `lsst.cp.pipe.StageScheduler`: a unit is only leased
+    once all the units it depends on are done, no two units of the same run and CCD are leased at once, and
+    units are leased in the order in which they were pushed. A lease lasts for leaseSeconds unless it is
+    renewed, and a unit whose lease expires, e.g. because its worker died, is handed out again.
+
+    Backends implement all the methods below; `SqliteWorkQueue` is the default one.
+    """
+
+    leaseSeconds = None
+    """Time after which a lease which has not been renewed expires (`float`)."""
+
+    def push(self, units, dependencies):
+        """Add units to the queue. Units which are already in it, e.g. from an earlier plan, are left as
+        they are.
+
+        Parameters
+        ----------
+        units : `list` of `lsst.cp.pipe.WorkUnit`
+            The units, in priority order
+        dependencies : `dict`
+            Mapping from a unit's key to the keys of the units it depends on
+        """
+        raise NotImplementedError()
+
+    def lease(self, workerId):
+        """Lease the next unit which is ready to run.
+
+        Parameters
+        ----------
+        workerId : `str`
+            The identifier of the worker taking the lease
+
+        Returns
+        -------
+        unit : `lsst.cp.pipe.WorkUnit` or None
+            The unit, or None if no unit is ready
+        """
+        raise NotImplementedError()
+
+    def renew(self, unit, workerId):
+        """Extend a lease by leaseSeconds from now.
+
+        Returns
+        -------
+        renewed : `bool`
+            False if the worker no longer holds the lease
+        """
+        raise NotImplementedError()
+
+    def complete(self, unit, workerId, outputs):
+        """Record that a leased unit has completed successfully.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit
+        workerId : `str`
+            The identifier of the worker which ran it
+        outputs : `list` of `str`
+            The files written by the unit
+
+        Returns
+        -------
+        completed : `bool`
+            False if the worker no longer held the lease, so the unit is not marked as done
+        """
+        raise NotImplementedError()
+
+    def fail(self, unit, workerId, error):
+        """Record that a leased unit has failed, and skip everything which depends on it.
+
+        Parameters
+        ----------
+        unit : `lsst.cp.pipe.WorkUnit`
+            The unit
+        workerId : `str`
+            The identifier of the worker which ran it
+        error : `str`
+            Description of the failure
+        """
+        raise NotImplementedError()
+
+    def getOutputs(self, run, ccd):
+        """Get the files written by the completed units of a CCD.
+
+        Returns
+        -------
+        outputs : `dict` of `str`: `list` of `str`
+            The files, keyed by the name of the stage which wrote them
+        """
+        raise NotImplementedError()
+
+    def getPendingStages(self, run, ccd):
+        """Get the names of the stages which are still to run, or running, on a CCD."""
+        raise NotImplementedError()
+
+    def getCounts(self):
+        """Get the number of units in each state.
+
+        Returns
+        -------
+        counts : `dict` of `str`: `int`
+            The number of units which are 'waiting', 'leased', 'done', 'failed' and 'skipped'
+        """
+        raise NotImplementedError()
+
+    def getFailures(self):
+        """Get the units which have failed, and why.
+
+        Returns
+        -------
+        failures : `list` of (`lsst.cp.pipe.WorkUnit`, `str`)
+            The units and the descriptions of their failures, in priority order
+        """
+        raise NotImplementedError()
+
+    def isFinished(self):
+        """Have all the units been run or skipped?"""
+        counts = self.getCounts()
+        return counts['waiting'] == 0 and counts['leased'] == 0
+
+
+class SqliteWorkQueue(WorkQueue):
+    """A work queue kept in an SQLite database.
+
+    Every operation is a short transaction, so any number of worker processes can share the queue, as long
+    as the database is on a filesystem with working locks: a local disk for workers on one node, or a
+    shared filesystem such as GPFS or Lustre for several nodes. NFS locking is often unreliable.
+
+    Parameters
+    ----------
+    path : `str`
+        The database file, which is created if it does not exist
+    leaseSeconds : `float`, optional
+        Time after which a lease which has not been renewed expires
+    maxAttempts : `int`, optional
+        Number of times a unit is leased before it is failed if its lease expires again
+    """
+
+    _STATES = ('waiting', 'leased', 'done', 'failed', 'skipped')
+
+    def __init__(self, path, leaseSeconds=600., maxAttempts=3):
+        self.path = path
+        self.leaseSeconds = leaseSeconds
+        self.maxAttempts = maxAttempts
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS units (key TEXT PRIMARY KEY, seq INTEGER, run TEXT, "
+                         "stage TEXT, ccd TEXT, state TEXT, worker TEXT, leaseExpiry REAL, "
+                         "attempts INTEGER, outputs TEXT, error TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS dependencies (key TEXT, dependsOn TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS dependencyKeys ON dependencies (key)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Open a connection and hold the write lock for the duration of a transaction.
+
+        A new connection is made each time, as connections can't be shared between processes or threads.
+        """
+        conn = sqlite3.connect(self.path, timeout=60., isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _makeKey(key):
+        # the CCD is kept as JSON to preserve its type
+        run, stageName, ccd = key
+        return '%s/%s/%s' % (run, stageName, json.dumps(ccd))
+
+    @staticmethod
+    def _makeUnit(run, stageName, ccd):
+        return WorkUnit.fromDict(dict(run=run, stage=stageName, ccd=json.loads(ccd)))
+
+    def push(self, units, dependencies):
+        with self._transaction() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM units").fetchone()[0]
+            for unit in units:
+                key = self._makeKey(unit.key)
+                if conn.execute("SELECT 1 FROM units WHERE key = ?", (key,)).fetchone() is not None:
+                    continue
+                seq += 1
+                conn.execute("INSERT INTO units VALUES (?, ?, ?, ?, ?, 'waiting', NULL, NULL, 0, NULL, NULL)",
+                             (key, seq, str(unit.run), unit.stage.name, json.dumps(unit.ccd)))
+                conn.executemany("INSERT INTO dependencies VALUES (?, ?)",
+                                 [(key, self._makeKey(dep)) for dep in dependencies.get(unit.key, ())])
+
+    def _skipDependents(self, conn, key):
+        """Skip the waiting units which depend, directly or not, on a unit."""
+        stack = [key]
+        while stack:
+            for (dependent,) in conn.execute("SELECT d.key FROM dependencies d JOIN units u ON u.key = d.key "
+                                             "WHERE d.dependsOn = ? AND u.state = 'waiting'",
+                                             (stack.pop(),)).fetchall():
+                conn.execute("UPDATE units SET state = 'skipped' WHERE key = ?", (dependent,))
+                stack.append(dependent)
+
+    def _expireLeases(self, conn, now):
+        """Requeue the units whose leases have expired, or fail them if they have used all their attempts."""
+        for key, attempts, worker in conn.execute("SELECT key, attempts, worker FROM units "
+                                                  "WHERE state = 'leased' AND leaseExpiry < ?",
+                                                  (now,)).fetchall():
+            if attempts >= self.maxAttempts:
+                conn.execute("UPDATE units SET state = 'failed', error = ? WHERE key = ?",
+                             ("Lease expired %d times, last held by %s" % (attempts, worker), key))
+                self._skipDependents(conn, key)
+            else:
+                conn.execute("UPDATE units SET state = 'waiting', worker = NULL WHERE key = ?", (key,))
+
+    def lease(self, workerId):
+        now = time.time()
+        with self._transaction() as conn:
+            self._expireLeases(conn, now)
+            # the first waiting unit whose dependencies are all done, and which has no unit of the same run
+            # and CCD leased
+            row = conn.execute("SELECT key, run, stage, ccd FROM units u WHERE state = 'waiting' "
+                               "AND NOT EXISTS (SELECT 1 FROM dependencies d JOIN units p "
+                               "ON p.key = d.dependsOn WHERE d.key = u.key AND p.state != 'done') "
+                               "AND NOT EXISTS (SELECT 1 FROM units o WHERE o.state = 'leased' "
+                               "AND o.run = u.run AND o.ccd = u.ccd) "
+                               "ORDER BY seq LIMIT 1").fetchone()
+            if row is None:
+                return None
+            key, run, stageName, ccd = row
+            conn.execute("UPDATE units SET state = 'leased', worker = ?, leaseExpiry = ?, "
+                         "attempts = attempts + 1 WHERE key = ?", (workerId, now + self.leaseSeconds, key))
+        return self._makeUnit(run, stageName, ccd)
+
+    def renew(self, unit, workerId):
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE units SET leaseExpiry = ? WHERE key = ? AND state = 'leased' "
+                                  "AND worker = ?",
+                                  (time.time() + self.leaseSeconds, self._makeKey(unit.key), workerId))
+            return cursor.rowcount == 1
+
+    def complete(self, unit, workerId, outputs):
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE units SET state = 'done', outputs = ? WHERE key = ? "
+                                  "AND state = 'leased' AND worker = ?",
+                                  (json.dumps(sorted(outputs)), self._makeKey(unit.key), workerId))
+            return cursor.rowcount == 1
+
+    def fail(self, unit, workerId, error):
+        key = self._makeKey(unit.key)
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE units SET state = 'failed', error = ? WHERE key = ? "
+                                  "AND state = 'leased' AND worker = ?", (error, key, workerId))
+            if cursor.rowcount == 1:
+                self._skipDependents(conn, key)
+
+    def getOutputs(self, run, ccd):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT stage, outputs FROM units WHERE run = ? AND ccd = ? "
+                                "AND state = 'done'", (str(run), json.dumps(ccd))).fetchall()
+        return dict((stageName, json.loads(outputs)) for stageName, outputs in rows)
+
+    def getPendingStages(self, run, ccd):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT stage FROM units WHERE run = ? AND ccd = ? "
+                                "AND state IN ('waiting', 'leased') ORDER BY seq",
+                                (str(run), json.dumps(ccd))).fetchall()
+        return [stageName for (stageName,) in rows]
+
+    def getCounts(self):
+        with self._transaction() as conn:
+            self._expireLeases(conn, time.time())
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM units GROUP BY state").fetchall())
+        return dict((state, counts.get(state, 0)) for state in self._STATES)
+
+    def getFailures(self):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT run, stage, ccd, error FROM units WHERE state = 'failed' "
+                                "ORDER BY seq").fetchall()
+        return [(self._makeUnit(run, stageName, ccd), error) for run, stageName, ccd, error in rows]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the amplifier geometry and batched pixel statistics."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class AmpImagesTestCase(lsst.utils.tests.TestCase):
+    """A test case for the helpers of the NumPy engines."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testGeometry(self):
+        from lsst.cp.pipe import AmpGeometry
+        geometry = AmpGeometry((2020, 544), '[11:522,1:2002]')
+        self.assertEqual(geometry.imaging, (slice(0, 2002), slice(10, 522)))
+        self.assertEqual(geometry.imagingShape, (2002, 512))
+        self.assertEqual(geometry.serialOverscan, (slice(0, 2020), slice(522, 544)))
+        self.assertEqual(geometry.parallelOverscan, (slice(2002, 2020), slice(10, 522)))
+        self.assertTrue(geometry.hasSerialOverscan)
+
+        geometry = AmpGeometry((20, 10))
+        self.assertEqual(geometry.imagingShape, (20, 10))
+        self.assertFalse(geometry.hasSerialOverscan)
+        with self.assertRaises(ValueError):
+            AmpGeometry((20, 10), '11:522,1:2002')
+
+    def testUnbiasedImaging(self):
+        from astropy.io import fits
+        from lsst.cp.pipe import ExposurePool, getAmps, readAmpGeometry, readUnbiasedImaging, readMaskStack
+        # a bias rising along the columns, and a signal of 100 ADU in the imaging region
+        rows = np.arange(30, dtype=np.float32)[:, np.newaxis]
+        hdus = [fits.PrimaryHDU()]
+        for amp in range(1, 3):
+            image = np.zeros((30, 25), dtype=np.float32) + 1000. + amp*rows
+            image[:25, 3:18] += 100.
+            hdus.append(fits.ImageHDU(image))
+            hdus[-1].header['DATASEC'] = '[4:18,1:25]'
+        path = os.path.join(self.tmpDir, 'frame.fits')
+        fits.HDUList(hdus).writeto(path)
+        mask = np.zeros((30, 25), dtype=np.int32)
+        mask[5, 10] = 1
+        maskPath = os.path.join(self.tmpDir, 'mask.fits')
+        fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(mask), fits.ImageHDU(mask)]).writeto(maskPath)
+
+        pool = ExposurePool(1 << 20)
+        amps = getAmps(path)
+        self.assertEqual(amps, [1, 2])
+        geometry = readAmpGeometry(path)
+        images = readUnbiasedImaging(pool, path, amps, geometry)
+        self.assertEqual(images.shape, (2, 25, 15))
+        self.assertFloatsAlmostEqual(images, 100., rtol=1e-5)
+
+        masked = readMaskStack(pool, [maskPath], amps, geometry)
+        self.assertEqual(masked.sum(), 2)
+        self.assertTrue(masked[1, 5, 7])
+
+    def testSegmentRows(self):
+        from astropy.io import fits
+        from lsst.cp.pipe import AmpGeometry, getOverscanColumns, fitRowBias, readSegmentRows
+        self.assertEqual(getOverscanColumns(AmpGeometry((30, 40), '[4:18,1:25]')), slice(23, 38))
+        self.assertEqual(getOverscanColumns(AmpGeometry((30, 20), '[4:18,1:25]')), slice(18, 20))
+        self.assertIsNone(getOverscanColumns(AmpGeometry((30, 18), '[4:18,1:25]')))
+
+        rowMeans = 1000. + 0.5*np.arange(30)[np.newaxis, np.newaxis, :]*np.arange(1, 3)[:, np.newaxis]
+        bias = fitRowBias(np.broadcast_to(rowMeans, (3, 2, 30)), slice(5, 10))
+        self.assertEqual(bias.shape, (3, 2, 5))
+        self.assertFloatsAlmostEqual(bias[1, 1], 1000. + np.arange(5, 10), rtol=1e-10)
+
+        image = np.arange(30*25, dtype=np.int16).reshape(30, 25)
+        path = os.path.join(self.tmpDir, 'scaled.fits')
+        hdus = [fits.PrimaryHDU(), fits.ImageHDU(image), fits.ImageHDU(image.copy())]
+        hdus[2].scale('int16', bzero=32768)
+        fits.HDUList(hdus).writeto(path)
+        with fits.open(path, memmap=True, do_not_scale_image_data=True) as hdulist:
+            images = readSegmentRows(hdulist, [1, 2], slice(3, 7), slice(2, 12))
+        self.assertEqual(images.dtype, np.float32)
+        self.assertFloatsAlmostEqual(images[0], image[3:7, 2:12].astype(np.float32), rtol=0)
+        self.assertFloatsAlmostEqual(images[1], image[3:7, 2:12].astype(np.float32), rtol=0)
+
+    def testMaskedStatistics(self):
+        from lsst.cp.pipe import maskedMean, maskedVariance
+        rng = np.random.RandomState(1)
+        images = rng.normal(10., 2., size=(3, 20, 30)).astype(np.float32)
+        masked = rng.uniform(size=images.shape) < 0.1
+        images[0, 0, 0] = np.nan
+        masked[0, 0, 0] = False
+        for i in range(3):
+            good = ~masked[i] & np.isfinite(images[i])
+            self.assertFloatsAlmostEqual(maskedMean(images, masked)[i], images[i][good].mean(), rtol=1e-6)
+            self.assertFloatsAlmostEqual(maskedVariance(images, masked)[i], images[i][good].var(ddof=1),
+                                         rtol=1e-5)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the synthetic repo and stub subtasks used to benchmark CpTask."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class BenchmarkTestCase(lsst.utils.tests.TestCase):
+    """A test case for running CpTask on a synthetic repo with stub subtasks."""
+
+    def setUp(self):
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo
+        self.tmpDir = tempfile.mkdtemp()
+        self.butler = makeSyntheticRepo(os.path.join(self.tmpDir, 'repo'), nCcds=2, visitsPerAcquisition=2,
+                                        ampShape=(10, 8), nAmps=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testSyntheticButler(self):
+        self.assertEqual(self.butler.queryMetadata('raw', ['ccd']), ['S00', 'S01'])
+        self.assertEqual(len(self.butler.queryMetadata('raw', ['visit'], dataId={'imageType': 'PPUMP'})), 1)
+        visit, ccd = self.butler.queryMetadata('raw', ['visit', 'ccd'], dataId={'testType': 'FLAT'})[0]
+        filename = self.butler.get('raw_filename', dataId={'visit': visit, 'ccd': ccd})[0][:-3]
+        self.assertTrue(os.path.exists(filename))
+        self.assertIn('flat1', filename)
+
+        self.butler.put({1: 1.5}, 'eotest_gain', dataId={'ccd': 'S00', 'run': '1234'})
+        self.assertEqual(self.butler.get('eotest_gain', dataId={'ccd': 'S00', 'run': '1234'}), {1: 1.5})
+        with self.assertRaises(RuntimeError):
+            self.butler.get('eotest_gain', dataId={'ccd': 'S01', 'run': '1234'})
+
+    def testRunBenchmark(self):
+        from lsst.cp.pipe import CpTask, EOTEST_STAGES
+        from lsst.cp.pipe.benchmark import configureStubSubtasks, runBenchmark
+        config = CpTask.ConfigClass()
+        config.eotestOutputPath = os.path.join(self.tmpDir, 'eotest')
+        configureStubSubtasks(config, intermediateBytes=10)
+        timings = runBenchmark(CpTask, config, self.butler)
+
+        self.assertEqual(sorted(timings.stageTimes), sorted(stage.name for stage in EOTEST_STAGES))
+        self.assertGreater(timings.runTime, 0)
+        self.assertIsNone(timings.reportTime)
+        self.assertIn(('S01', '1234'), self.butler.gains)
+        outputs = os.listdir(config.eotestOutputPath)
+        self.assertIn('S00_traps_mask.fits', outputs)
+        self.assertFalse([filename for filename in outputs if '_median_' in filename])
+
+    def testMeasureStartup(self):
+        from lsst.cp.pipe.benchmark import measureStartup
+        timings = measureStartup({'doFe55': False}, nRepeats=1, outputPath=self.tmpDir)
+        self.assertGreater(timings.importTime, 0)
+        self.assertGreaterEqual(timings.constructTime, 0)
+
+    def testBatch(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo, configureStubSubtasks
+        butler = makeSyntheticRepo(os.path.join(self.tmpDir, 'batchRepo'), nCcds=2, visitsPerAcquisition=2,
+                                   ampShape=(10, 8), nAmps=2, runs=['1', '2'])
+        config = CpTask.ConfigClass()
+        config.eotestOutputPath = os.path.join(self.tmpDir, 'batch')
+        config.numProcesses = 2
+        configureStubSubtasks(config)
+        task = CpTask(config=config)
+        task.runEotestBatch(butler)
+
+        self.assertEqual(sorted(butler.gains), [('S00', '1'), ('S00', '2'), ('S01', '1'), ('S01', '2')])
+        for run in ('1', '2'):
+            outputs = os.listdir(os.path.join(config.eotestOutputPath, run))
+            self.assertIn('S01_eotest_results.json', outputs)
+            self.assertIn('rawFilenameIndex_%s.json' % run, outputs)
+        self.assertFalse([filename for filename in os.listdir(config.eotestOutputPath)
+                          if filename.startswith('S0')])
+
+        with self.assertRaises(RuntimeError):
+            task.runEotestBatch(butler, runs=['1', '3'])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
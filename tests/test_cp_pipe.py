@@ -25,6 +25,9 @@
 """Test cases for cp_pipe."""
 
 from __future__ import absolute_import, division, print_function
+import importlib
+import subprocess
+import sys
 import unittest
 
 import lsst.utils
@@ -56,6 +59,86 @@ class CpPipeTestCase(lsst.utils.tests.TestCase):
         cpConfig.eotestOutputPath='/some/test/path'  # must not be empty for validate() to pass
         cpTask = CpTask(config=cpConfig)
 
+    @unittest.skipIf(noEotest, noEotestMsg)
+    def testOnlyEnabledSubtasks(self):
+        from lsst.cp.pipe import CpTask
+        cpConfig = CpTask.ConfigClass()
+        cpConfig.eotestOutputPath = '/some/test/path'
+        cpConfig.doFe55 = False
+        cpConfig.doPTC = False
+        cpTask = CpTask(config=cpConfig)
+        self.assertTrue(hasattr(cpTask, 'readNoise'))
+        self.assertFalse(hasattr(cpTask, 'fe55'))
+        self.assertFalse(hasattr(cpTask, 'ptc'))
+
+    @unittest.skipIf(noEotest, noEotestMsg)
+    def testNumpyEngine(self):
+        from lsst.cp.pipe import CpTask, NumpyPtcTask
+        cpConfig = CpTask.ConfigClass()
+        cpConfig.eotestOutputPath = '/some/test/path'
+        cpConfig.ptcEngine = 'numpy'
+        cpTask = CpTask(config=cpConfig)
+        self.assertIsInstance(cpTask.ptc, NumpyPtcTask)
+        self.assertIs(cpTask.ptc.exposurePool, cpTask.exposurePool)
+        self.assertEqual(cpTask.ptc.config.output_dir, '/some/test/path')
+        self.assertNotIsInstance(cpTask.flatPair, NumpyPtcTask)
+
+        from lsst.cp.pipe import NumpyCteTask
+        cpConfig = CpTask.ConfigClass()
+        cpConfig.eotestOutputPath = '/some/test/path'
+        cpConfig.cteEngine = 'numpy'
+        cpTask = CpTask(config=cpConfig)
+        self.assertIsInstance(cpTask.cte, NumpyCteTask)
+        self.assertNotIsInstance(cpTask.ptc, NumpyPtcTask)
+
+    @unittest.skipIf(noEotest, noEotestMsg)
+    def testEnginesImportedWhenUsed(self):
+        # in a fresh interpreter, as other tests import the engines
+        script = ("import sys\n"
+                  "from lsst.cp.pipe import CpTask\n"
+                  "cpConfig = CpTask.ConfigClass()\n"
+                  "cpConfig.eotestOutputPath = '/some/test/path'\n"
+                  "cpConfig.cteEngine = 'numpy'\n"
+                  "CpTask(config=cpConfig)\n"
+                  "print(sorted(name for name in sys.modules if name.endswith('Engine')))\n")
+        output = subprocess.check_output([sys.executable, '-c', script])
+        self.assertEqual(output.decode().strip().splitlines()[-1], "['lsst.cp.pipe.cteEngine']")
+
+        import lsst.cp.pipe as cpPipe
+        for moduleName, names in cpPipe._ENGINE_NAMES.items():
+            module = importlib.import_module('lsst.cp.pipe.' + moduleName)
+            self.assertEqual(sorted(names), sorted(module.__all__))
+            self.assertIs(getattr(cpPipe, names[0]), getattr(module, names[0]))
+
+    @unittest.skipIf(noEotest, noEotestMsg)
+    def testExposurePoolBudget(self):
+        from lsst.cp.pipe import CpTask
+
+        def getPoolBytes(**overrides):
+            cpConfig = CpTask.ConfigClass()
+            cpConfig.eotestOutputPath = '/some/test/path'
+            for name, value in overrides.items():
+                setattr(cpConfig, name, value)
+            return CpTask(config=cpConfig).exposurePool.maxBytes
+        self.assertEqual(getPoolBytes(), 0)  # no NumPy engine uses it
+        self.assertEqual(getPoolBytes(ptcEngine='numpy'), CpTask.ConfigClass().exposurePoolMaxBytes)
+        self.assertEqual(getPoolBytes(ptcEngine='numpy', numProcesses=4, memoryBudgetBytes=8*1024**3),
+                         1024**3)
+
+    @unittest.skipIf(noEotest, noEotestMsg)
+    def testUnknownProfileStage(self):
+        from lsst.cp.pipe import CpTask
+        cpConfig = CpTask.ConfigClass()
+        cpConfig.eotestOutputPath = '/some/test/path'
+        cpConfig.profileStages = ['ptc', 'notAStage']
+        with self.assertRaises(RuntimeError):
+            cpConfig.validate()
+
+        cpConfig.profileStages = ['ptc']
+        cpConfig.stageTimeouts = {'notAStage': 10.}
+        with self.assertRaises(RuntimeError):
+            cpConfig.validate()
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
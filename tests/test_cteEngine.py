@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the NumPy charge transfer efficiency engine."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+# eotest's own CteTask, against which the engine is checked, needs afw
+noAfwMsg = ""
+noAfw = False
+try:
+    import lsst.afw.image
+except ImportError:
+    noAfwMsg = "No afw setup, so skipping comparison with eotest"
+    noAfw = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class NumpyCteTaskTestCase(lsst.utils.tests.TestCase):
+    """A test case for NumpyCteTask."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testMeasureEper(self):
+        from lsst.cp.pipe import measureEper
+        rng = np.random.RandomState(2)
+        lastPixels = np.full((2, 50), 1010.)
+        trailingPixels = np.full((2, 3, 50), 10.)
+        trailingPixels[:, 0, :] += 1.
+        trailingPixels[:, 1, :] += 0.5
+        biasPixels = 10. + rng.normal(0., 1., size=(2, 200))
+        biasPixels -= biasPixels.mean(axis=1)[:, np.newaxis] - 10.
+        masked = np.zeros((2, 50), dtype=bool)
+        masked[1, :10] = True
+        lastPixels[1, :10] = 0.
+        eper = measureEper(lastPixels, trailingPixels, biasPixels, 100, masked)
+        self.assertFloatsAlmostEqual(eper.signal, 1000., rtol=1e-12)
+        self.assertFloatsAlmostEqual(eper.cti, 1.5/1000./100, rtol=1e-10)
+        self.assertTrue(np.all(eper.error > 0))
+
+    def testRun(self):
+        from lsst.cp.pipe import NumpyCteTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs
+        runArgs = makeEngineInputs('cte', self.tmpDir, nAmps=4, serialCti=5e-5, parallelCti=2e-5,
+                                   imagingShape=(400, 200))
+        task = NumpyCteTask()
+        task.config.output_dir = self.tmpDir
+        task.run(**runArgs)
+
+        from astropy.io import fits
+        with fits.open(os.path.join(self.tmpDir, 'S00_eotest_results.fits')) as resultsFile:
+            results = resultsFile['AMPLIFIER_RESULTS'].data
+            self.assertFloatsAlmostEqual(results['CTI_HIGH_SERIAL'], 5e-5, rtol=0.05)
+            self.assertFloatsAlmostEqual(results['CTI_HIGH_PARALLEL'], 2e-5, rtol=0.05)
+            self.assertTrue(np.all(results['CTI_HIGH_SERIAL_ERROR'] < 5e-6))
+            self.assertTrue(np.all(results['CTI_HIGH_PARALLEL_ERROR'] < 2e-6))
+
+        with self.assertRaises(RuntimeError):
+            task.run(flux_level='medium', **runArgs)
+
+    @unittest.skipIf(noAfw, noAfwMsg)
+    def testCompareWithEotest(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs, compareEngines
+        inputDir = os.path.join(self.tmpDir, 'inputs')
+        os.makedirs(inputDir)
+        runArgs = makeEngineInputs('cte', inputDir, nAmps=4, imagingShape=(400, 200))
+        comparison = compareEngines('cte', CpTask.ConfigClass(), runArgs, self.tmpDir)
+        self.assertTrue(comparison.withinTolerance, comparison.differences)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the NumPy bright and dark pixel engines."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+# eotest's own BrightPixelsTask and DarkPixelsTask, against which the engines are checked, need afw
+noAfwMsg = ""
+noAfw = False
+try:
+    import lsst.afw.image
+except ImportError:
+    noAfwMsg = "No afw setup, so skipping comparison with eotest"
+    noAfw = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class NumpyDefectTaskTestCase(lsst.utils.tests.TestCase):
+    """A test case for NumpyBrightPixelsTask and NumpyDarkPixelsTask."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testStackSegments(self):
+        from lsst.cp.pipe import getAmps, stackSegments
+        from lsst.cp.pipe.benchmark import makeSyntheticDefectFrames
+        paths = makeSyntheticDefectFrames(self.tmpDir, 'dark', nFrames=5, level=0., nAmps=2,
+                                          imagingShape=(60, 80), readNoise=10.)
+        amps = getAmps(paths[0])
+        median = stackSegments(paths, amps)
+        self.assertEqual(median.shape, (2, 70, 103))
+        # stacking a row at a time gives the same answer
+        self.assertFloatsAlmostEqual(stackSegments(paths, amps, maxChunkBytes=1), median, rtol=0)
+        clipped = stackSegments(paths, amps, method='clippedMean', maxChunkBytes=1)
+        self.assertFloatsAlmostEqual(np.median(clipped), 1000., atol=1.)
+        with self.assertRaises(ValueError):
+            stackSegments(paths, amps, method='mean')
+
+    def testFindDefectColumns(self):
+        from lsst.cp.pipe import findDefectColumns
+        defects = np.zeros((2, 30, 10), dtype=bool)
+        defects[0, :, 3] = True
+        defects[0, 5, 6] = True
+        defects[1, :20, 4] = True
+        pixels, columns = findDefectColumns(defects, 20)
+        self.assertEqual(list(np.nonzero(columns[0])[0]), [3])
+        self.assertFalse(columns[1].any())
+        self.assertEqual(pixels.sum(axis=(1, 2)).tolist(), [1, 20])
+
+    def checkDefects(self, kind, task, runArgs):
+        from astropy.io import fits
+        task.config.output_dir = self.tmpDir
+        task.config.maxChunkBytes = 100000  # several strips
+        task.run(**runArgs)
+        with fits.open(os.path.join(self.tmpDir, 'S00_%s_pixel_mask.fits' % kind)) as maskFile:
+            self.assertEqual(len(maskFile), 5)
+            mask = maskFile['SEGMENT13'].data
+            self.assertEqual(mask.shape, (110, 123))
+            self.assertEqual(mask[10, 23], 1)
+            self.assertEqual(mask[50, 73], 1)
+            self.assertTrue((mask[:100, 43] == 1).all())
+            self.assertEqual(mask.sum(), 102)
+        with fits.open(os.path.join(self.tmpDir, 'S00_eotest_results.fits')) as resultsFile:
+            results = resultsFile['AMPLIFIER_RESULTS'].data
+            self.assertEqual(list(results['NUM_%s_PIXELS' % kind.upper()]), [2]*4)
+            self.assertEqual(list(results['NUM_%s_COLUMNS' % kind.upper()]), [1]*4)
+        self.assertEqual([name for name in os.listdir(self.tmpDir) if '_median_' in name], [])
+
+    def testBrightPixels(self):
+        from lsst.cp.pipe import NumpyBrightPixelsTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs
+        runArgs = makeEngineInputs('brightPixels', self.tmpDir, nAmps=4, imagingShape=(100, 100))
+        self.checkDefects('bright', NumpyBrightPixelsTask(), runArgs)
+
+    def testDarkPixels(self):
+        from lsst.cp.pipe import NumpyDarkPixelsTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs
+        runArgs = makeEngineInputs('darkPixels', self.tmpDir, nAmps=4, imagingShape=(100, 100))
+        self.checkDefects('dark', NumpyDarkPixelsTask(), runArgs)
+
+    @unittest.skipIf(noAfw, noAfwMsg)
+    def testCompareWithEotestBright(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs, compareEngines
+        inputDir = os.path.join(self.tmpDir, 'inputs')
+        os.makedirs(inputDir)
+        runArgs = makeEngineInputs('brightPixels', inputDir, nAmps=4, imagingShape=(100, 100))
+        comparison = compareEngines('brightPixels', CpTask.ConfigClass(), runArgs, self.tmpDir)
+        self.assertTrue(comparison.withinTolerance, comparison.differences)
+
+    @unittest.skipIf(noAfw, noAfwMsg)
+    def testCompareWithEotestDark(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs, compareEngines
+        inputDir = os.path.join(self.tmpDir, 'inputs')
+        os.makedirs(inputDir)
+        runArgs = makeEngineInputs('darkPixels', inputDir, nAmps=4, imagingShape=(100, 100))
+        comparison = compareEngines('darkPixels', CpTask.ConfigClass(), runArgs, self.tmpDir)
+        self.assertTrue(comparison.withinTolerance, comparison.differences)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
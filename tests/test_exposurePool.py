@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the pool of decoded amplifier images."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from astropy.io import fits
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class ExposurePoolTestCase(lsst.utils.tests.TestCase):
+    """A test case for the ExposurePool."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.nAmps = 4
+        self.shape = (10, 20)
+        self.files = []
+        for i in range(2):
+            hdus = [fits.PrimaryHDU()]
+            for amp in range(1, self.nAmps + 1):
+                data = np.full(self.shape, 100*i + amp, dtype=np.int32)
+                hdus.append(fits.ImageHDU(data, name='Segment%02d' % amp))
+            path = os.path.join(self.tmpDir, 'flat%d.fits' % i)
+            fits.HDUList(hdus).writeto(path)
+            self.files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testHitsAndMisses(self):
+        from lsst.cp.pipe import ExposurePool
+        pool = ExposurePool(maxBytes=10**6)
+        images = pool.getAmpImages(self.files[0], amps=range(1, self.nAmps + 1))
+        self.assertEqual(list(images.keys()), list(range(1, self.nAmps + 1)))
+        self.assertEqual(images[2][0, 0], 2)
+        self.assertEqual(pool.misses, self.nAmps)
+
+        image = pool.getImage(self.files[0], 2)
+        self.assertIs(image, images[2])
+        self.assertEqual(pool.hits, 1)
+        self.assertEqual(pool.nBytes, self.nAmps*images[2].nbytes)
+        with self.assertRaises(ValueError):
+            image[0, 0] = 0
+
+    def testEviction(self):
+        from lsst.cp.pipe import ExposurePool
+        ampBytes = self.shape[0]*self.shape[1]*4
+        pool = ExposurePool(maxBytes=2*ampBytes)
+        pool.getImage(self.files[0], 1)
+        pool.getImage(self.files[0], 2)
+        pool.getImage(self.files[0], 1)  # 2 is now the least recently used
+        pool.getImage(self.files[1], 1)
+        self.assertEqual(pool.evictions, 1)
+        self.assertEqual(len(pool), 2)
+        self.assertLessEqual(pool.nBytes, 2*ampBytes)
+
+        pool.getImage(self.files[0], 1)
+        self.assertEqual(pool.hits, 2)
+        pool.getImage(self.files[0], 2)
+        self.assertEqual(pool.misses, 4)
+
+        pool = ExposurePool(maxBytes=0)
+        self.assertEqual(pool.getImage(self.files[1], 3)[0, 0], 103)
+        self.assertEqual(len(pool), 0)
+
+    def testRewrittenFile(self):
+        from lsst.cp.pipe import ExposurePool
+        pool = ExposurePool(maxBytes=10**6)
+        self.assertEqual(pool.getImage(self.files[0], 1)[0, 0], 1)
+        os.remove(self.files[0])  # as a rerun replaces its mask files
+        hdus = [fits.PrimaryHDU()] + [fits.ImageHDU(np.full(self.shape, 500 + amp, dtype=np.int32))
+                                      for amp in range(1, self.nAmps + 1)]
+        fits.HDUList(hdus).writeto(self.files[0])
+        self.assertEqual(pool.getImage(self.files[0], 1)[0, 0], 501)
+        self.assertEqual(pool.hits, 0)
+
+    def testScaledImage(self):
+        from lsst.cp.pipe import ExposurePool
+        path = os.path.join(self.tmpDir, 'scaled.fits')
+        hdu = fits.ImageHDU(np.arange(6, dtype=np.float64).reshape(2, 3))
+        hdu.scale('int16', bzero=32768)
+        fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(path)
+
+        pool = ExposurePool(maxBytes=10**6)
+        image = pool.getImage(path, 1)
+        self.assertEqual(image.dtype, np.float32)
+        self.assertFloatsAlmostEqual(image, np.arange(6, dtype=np.float32).reshape(2, 3))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
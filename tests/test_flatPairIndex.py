@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the flat-pair index."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class FlatPairIndexTestCase(lsst.utils.tests.TestCase):
+    """A test case for the FlatPairIndex."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        # the data acquisition system's names, behind the links which the butler returns
+        self.headers = {}
+        self.links = []
+        for visit, (name, exptime, photodiode, imageType) in enumerate([
+                ('flat_1.0s_flat1', 1., 1.00, 'FLAT'), ('flat_1.0s_flat2', 1., 1.01, 'FLAT'),
+                ('flat_2.0s_flat1', 2., 2.00, 'FLAT'), ('flat_2.0s_flat2', 2., 3.00, 'FLAT'),
+                ('flat_3.0s_flat1', 3., 3.00, 'FLAT'), ('flat_3.0s_flat2', 3., 3.00, 'BIAS'),
+                ('flat_4.0s_flat1', 4., 4.00, 'FLAT'), ('sflat_500_flat_H', 5., 5.00, 'FLAT')]):
+            path = os.path.join(self.tmpDir, name + '.fits')
+            open(path, 'w').close()
+            self.headers[path] = dict(exptime=exptime, photodiode=photodiode, imageType=imageType)
+            link = os.path.join(self.tmpDir, 'S00_%03d.fits' % visit)
+            os.symlink(path, link)
+            self.links.append(link)
+        self.nRead = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def readHeader(self, path):
+        self.nRead += 1
+        return self.headers[path]
+
+    def testPairs(self):
+        from lsst.cp.pipe import FlatPairIndex
+        index = FlatPairIndex('1234')
+        self.assertEqual(index.addFiles('S00', self.links, readHeader=self.readHeader), 7)
+        self.assertEqual(self.nRead, 7)
+        self.assertEqual(len(index), 8)
+
+        pairs, rejected = index.getPairs('S00', maxPdFracDev=0.05)
+        self.assertEqual([(flat1['exptime'], flat2['exptime']) for flat1, flat2 in pairs], [(1., 1.)])
+        reasons = dict((tuple(os.path.basename(path) for path in paths), reason)
+                       for paths, reason in rejected)
+        self.assertEqual(sorted(reasons), [('flat_2.0s_flat1.fits', 'flat_2.0s_flat2.fits'),
+                                           ('flat_3.0s_flat1.fits', 'flat_3.0s_flat2.fits'),
+                                           ('flat_4.0s_flat1.fits',)])
+        self.assertIn('photodiode', reasons[('flat_2.0s_flat1.fits', 'flat_2.0s_flat2.fits')])
+        self.assertIn('BIAS', reasons[('flat_3.0s_flat1.fits', 'flat_3.0s_flat2.fits')])
+        self.assertIn('no flat2', reasons[('flat_4.0s_flat1.fits',)])
+
+        # the real paths are returned, in the order the files were given
+        self.assertEqual(index.getFilenames('S00', maxPdFracDev=0.05),
+                         [os.path.realpath(link) for link in self.links[:2]])
+        self.assertEqual(len(index.getFilenames('S00')), 4)
+        self.assertEqual(index.getFilenames('S01'), [])
+
+        # files already indexed are not read again
+        self.assertEqual(index.addFiles('S00', self.links, readHeader=self.readHeader), 0)
+        self.assertEqual(self.nRead, 7)
+
+        indexFile = os.path.join(self.tmpDir, 'index.json')
+        index.writeJson(indexFile)
+        readIndex = FlatPairIndex.readJson(indexFile)
+        self.assertEqual(readIndex.run, '1234')
+        self.assertEqual(len(readIndex), 8)
+        self.assertEqual(readIndex.getFilenames('S00'), index.getFilenames('S00'))
+
+    def testCurrentFiles(self):
+        from lsst.cp.pipe import FlatPairIndex
+        index = FlatPairIndex('1234')
+        index.addFiles('S00', self.links, readHeader=self.readHeader)
+
+        # only the files given are paired, e.g. not those since removed from the registry
+        self.assertEqual(index.getFilenames('S00', filenames=self.links[1:]),
+                         [os.path.realpath(link) for link in self.links[2:4]])
+        self.assertEqual(len(index.getFilenames('S00', filenames=self.links[:4])), 4)
+
+        # a re-ingested file has its header read again
+        self.headers[os.path.realpath(self.links[3])]['photodiode'] = 2.00
+        with open(os.path.realpath(self.links[3]), 'w') as f:
+            f.write('re-ingested')
+        self.assertEqual(index.addFiles('S00', self.links, readHeader=self.readHeader), 1)
+        self.assertEqual(self.nRead, 8)
+        self.assertEqual(len(index.getFilenames('S00', maxPdFracDev=0.05)), 4)
+
+    def testUnreadableHeader(self):
+        from lsst.cp.pipe import FlatPairIndex, readFlatHeader
+        index = FlatPairIndex('1234')
+        index.addFiles('S00', self.links[:2], readHeader=readFlatHeader)  # the files are empty
+        pairs, rejected = index.getPairs('S00')
+        self.assertEqual(pairs, [])
+        self.assertEqual(len(rejected), 1)
+        self.assertIn('unreadable header', rejected[0][1])
+
+    def testReadFlatHeader(self):
+        from astropy.io import fits
+        from lsst.cp.pipe import readFlatHeader
+        path = os.path.join(self.tmpDir, 'header.fits')
+        hdu = fits.PrimaryHDU()
+        hdu.header['EXPTIME'] = 2.5
+        hdu.header['MONDIODE'] = 1.5e-9
+        hdu.header['IMGTYPE'] = 'FLAT'
+        hdu.writeto(path)
+        self.assertEqual(readFlatHeader(path), dict(exptime=2.5, photodiode=1.5e-9, imageType='FLAT'))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
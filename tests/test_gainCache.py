@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the gain cache."""
+
+from __future__ import absolute_import, division, print_function
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+class MockButler(object):
+    """A butler which only knows about gains, and counts how often it is used."""
+
+    def __init__(self):
+        self.gains = {('S00', '1234'): {1: 1.1}}
+        self.nGets = 0
+        self.nPuts = 0
+
+    def get(self, datasetType, dataId):
+        self.nGets += 1
+        return self.gains[(dataId['ccd'], dataId['run'])]
+
+    def put(self, obj, datasetType, dataId):
+        self.nPuts += 1
+        self.gains[(dataId['ccd'], dataId['run'])] = obj
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class GainCacheTestCase(lsst.utils.tests.TestCase):
+    """A test case for the GainCache."""
+
+    def testWriteThrough(self):
+        from lsst.cp.pipe import GainCache
+        butler = MockButler()
+        cache = GainCache(butler)
+        cache.put({1: 2.0}, 'S01', '1234')
+        self.assertEqual(butler.nPuts, 1)
+        self.assertEqual(butler.gains[('S01', '1234')], {1: 2.0})
+        for i in range(5):
+            self.assertEqual(cache.get('S01', '1234'), {1: 2.0})
+        self.assertEqual(butler.nGets, 0)
+
+    def testFallBackToButler(self):
+        from lsst.cp.pipe import GainCache
+        butler = MockButler()
+        cache = GainCache(butler)
+        self.assertNotIn(('S00', '1234'), cache)
+        cache.preload(['S00'], '1234')
+        self.assertIn(('S00', '1234'), cache)
+        self.assertEqual(cache.get('S00', '1234'), {1: 1.1})
+        self.assertEqual(butler.nGets, 1)
+        with self.assertRaises(KeyError):
+            cache.get('S02', '1234')
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the measurement of eotest work units."""
+
+from __future__ import absolute_import, division, print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class InstrumentationTestCase(lsst.utils.tests.TestCase):
+    """A test case for measureCall and the Timeline."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _readFiles(self, nFiles, size):
+        for i in range(nFiles):
+            path = os.path.join(self.tmpDir, 'file%d' % i)
+            with open(path, 'wb') as f:
+                f.write(b'x'*size)
+        total = 0
+        for i in range(nFiles):
+            with open(os.path.join(self.tmpDir, 'file%d' % i), 'rb') as f:
+                total += len(f.read())
+        return total
+
+    def testMeasureCall(self):
+        from lsst.cp.pipe import measureCall
+        result, measurements = measureCall(self._readFiles, 3, size=1000)
+        self.assertEqual(result, 3000)
+        self.assertGreaterEqual(measurements['wallTime'], 0)
+        self.assertGreaterEqual(measurements['cpuTime'], 0)
+        self.assertGreater(measurements['peakRss'], 0)
+        self.assertEqual(measurements['pid'], os.getpid())
+        if hasattr(sys, 'addaudithook'):
+            self.assertEqual(measurements['filesOpened'], 6)
+        if measurements['charsRead'] is not None:
+            self.assertGreaterEqual(measurements['charsRead'], 3000)
+
+    def testProfile(self):
+        from lsst.cp.pipe import measureCall, profileCall, summarizeProfiles
+        paths = [os.path.join(self.tmpDir, 'profile%d.pstats' % i) for i in range(2)]
+        for path in paths:
+            result, _ = measureCall(profileCall, path, self._readFiles, 2, size=10)
+            self.assertEqual(result, 20)
+            self.assertTrue(os.path.exists(path))
+
+        summaryPath = os.path.join(self.tmpDir, 'summary.txt')
+        summarizeProfiles(paths, summaryPath, 5)
+        with open(summaryPath) as f:
+            self.assertIn('_readFiles', f.read())
+
+    def testProfileOnFailure(self):
+        from lsst.cp.pipe import profileCall
+        path = os.path.join(self.tmpDir, 'failed.pstats')
+        with self.assertRaises(ZeroDivisionError):
+            profileCall(path, lambda: 1//0)
+        self.assertTrue(os.path.exists(path))
+
+    def testTimeline(self):
+        from lsst.cp.pipe import Timeline, measureCall
+        timeline = Timeline()
+        for ccd in ('S01', 'S00'):
+            _, measurements = measureCall(self._readFiles, 1, size=10)
+            timeline.add(ccd, 'fe55', measurements, run='1234')
+        self.assertEqual(len(timeline), 2)
+
+        path = os.path.join(self.tmpDir, 'timeline.json')
+        timeline.writeJson(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual([event['name'] for event in events], ['S01', 'S00'])
+        for event in events:
+            self.assertEqual(event['ph'], 'X')
+            self.assertEqual(event['cat'], 'fe55')
+            self.assertEqual(event['args']['run'], '1234')
+            self.assertIn('cpuTime', event['args'])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the tracking of intermediate files."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class IntermediateTrackerTestCase(lsst.utils.tests.TestCase):
+    """A test case for the IntermediateTracker."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.files = {}
+        for ccd in ('S00', 'S01'):
+            for stageName in ('brightPixels', 'darkPixels'):
+                path = os.path.join(self.tmpDir, '%s_median_%s.fits' % (ccd, stageName))
+                with open(path, 'wb') as f:
+                    f.write(b'x'*100)
+                self.files[(ccd, stageName)] = path
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testRelease(self):
+        from lsst.cp.pipe import IntermediateTracker, getDirectorySize
+        tracker = IntermediateTracker()
+        for (ccd, stageName), path in self.files.items():
+            tracker.add(ccd, stageName, [path])
+        self.assertEqual(len(tracker), 4)
+        self.assertEqual(getDirectorySize(self.tmpDir), 400)
+
+        self.assertEqual(tracker.release('S00', keepStages=['darkPixels']), 100)
+        self.assertFalse(os.path.exists(self.files[('S00', 'brightPixels')]))
+        self.assertTrue(os.path.exists(self.files[('S00', 'darkPixels')]))
+        self.assertTrue(os.path.exists(self.files[('S01', 'brightPixels')]))
+        self.assertEqual(list(tracker.getFiles('S00').values()), ['darkPixels'])
+
+        self.assertEqual(tracker.release('S00'), 100)
+        self.assertEqual(tracker.getFiles('S00'), {})
+        self.assertEqual(len(tracker), 2)
+        self.assertEqual(getDirectorySize(self.tmpDir), 200)
+
+    def testAlreadyDeleted(self):
+        from lsst.cp.pipe import IntermediateTracker
+        tracker = IntermediateTracker()
+        path = self.files[('S01', 'darkPixels')]
+        tracker.add('S01', 'darkPixels', [path])
+        os.remove(path)
+        self.assertEqual(tracker.release('S01'), 0)
+        self.assertEqual(len(tracker), 0)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
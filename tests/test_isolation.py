@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the isolated calls, timeouts and quarantine of eotest work units."""
+
+from __future__ import absolute_import, division, print_function
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+def _divide(a, b):
+    return a/b
+
+
+def _exit():
+    os._exit(3)
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class IsolatedCallTestCase(lsst.utils.tests.TestCase):
+    """A test case for IsolatedCall and waitForCalls."""
+
+    def _wait(self, call):
+        from lsst.cp.pipe import waitForCalls
+        self.assertEqual(waitForCalls([call], timeout=10.), [call])
+        return call.getResult()
+
+    def testResults(self):
+        from lsst.cp.pipe import IsolatedCall
+        self.assertEqual(self._wait(IsolatedCall(_divide, (3., 2.), tag='a')), (True, 1.5))
+
+        succeeded, error = self._wait(IsolatedCall(_divide, (3., 0.)))
+        self.assertFalse(succeeded)
+        self.assertIn('ZeroDivisionError', str(error))
+
+        succeeded, error = self._wait(IsolatedCall(_exit))
+        self.assertFalse(succeeded)
+        self.assertIn('exit code 3', str(error))
+
+    def testTimeout(self):
+        from lsst.cp.pipe import IsolatedCall, waitForCalls
+        call = IsolatedCall(time.sleep, (60.,), timeout=0.2)
+        self.assertFalse(call.isOverdue())
+        self.assertEqual(waitForCalls([call]), [])  # returns at the deadline
+        self.assertTrue(call.isOverdue())
+        call.kill()
+        self.assertFalse(call.process.is_alive())
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class QuarantineTestCase(lsst.utils.tests.TestCase):
+    """A test case for the timeouts, retries and quarantine of CpTask's units."""
+
+    def setUp(self):
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo
+        self.tmpDir = tempfile.mkdtemp()
+        self.butler = makeSyntheticRepo(os.path.join(self.tmpDir, 'repo'), nCcds=2, visitsPerAcquisition=2,
+                                        ampShape=(10, 8), nAmps=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _makeConfig(self, name):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import configureStubSubtasks
+        config = CpTask.ConfigClass()
+        config.eotestOutputPath = os.path.join(self.tmpDir, name)
+        configureStubSubtasks(config)
+        return config
+
+    def testTimeout(self):
+        from lsst.cp.pipe import CpTask
+        config = self._makeConfig('timeout')
+        config.numProcesses = 2
+        config.traps.hangCcds = ['S01']
+        config.stageTimeouts = {'traps': 0.5}
+        config.unitRetries = 1
+        config.requireAllEOTests = False
+        task = CpTask(config=config)
+        start = time.time()
+        task.runEotestDirect(self.butler)
+        self.assertLess(time.time() - start, 30.)
+
+        with open(os.path.join(config.eotestOutputPath, 'eotestQuarantine.json')) as f:
+            quarantine = json.load(f)
+        self.assertEqual(len(quarantine), 1)
+        self.assertEqual((quarantine[0]['stage'], quarantine[0]['ccd'], quarantine[0]['attempts']),
+                         ('traps', 'S01', 2))
+        self.assertIn('Timed out', quarantine[0]['error'])
+        self.assertEqual(quarantine[0]['skipped'], ['cte', 'flatPair', 'ptc'])
+
+        # the other CCD, and the stages not depending on the traps, carried on
+        with open(os.path.join(config.eotestOutputPath, 'S00_eotest_results.json')) as f:
+            self.assertIn('ptc', json.load(f))
+        with open(os.path.join(config.eotestOutputPath, 'S01_eotest_results.json')) as f:
+            self.assertEqual(sorted(json.load(f)), ['brightPixels', 'darkPixels', 'fe55', 'readNoise'])
+
+    def testFailure(self):
+        from lsst.cp.pipe import CpTask
+        config = self._makeConfig('failure')
+        config.fe55.failCcds = ['S00']
+        with self.assertRaises(RuntimeError):
+            CpTask(config=config).runEotestDirect(self.butler)
+        with open(os.path.join(config.eotestOutputPath, 'eotestQuarantine.json')) as f:
+            quarantine = json.load(f)
+        self.assertEqual([(entry['stage'], entry['ccd'], entry['attempts']) for entry in quarantine],
+                         [('fe55', 'S00', 1)])
+        self.assertIn('failing on S00', quarantine[0]['error'])
+
+        # once the problem is fixed, the quarantine file goes
+        config = self._makeConfig('failure')
+        config.resume = True
+        CpTask(config=config).runEotestDirect(self.butler)
+        self.assertFalse(os.path.exists(os.path.join(config.eotestOutputPath, 'eotestQuarantine.json')))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
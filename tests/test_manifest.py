@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the completion manifest."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class CompletionManifestTestCase(lsst.utils.tests.TestCase):
+    """A test case for the CompletionManifest."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.manifestFile = os.path.join(self.tmpDir, 'manifest.json')
+        self.inputFile = os.path.join(self.tmpDir, 'input.fits')
+        self.outputFile = os.path.join(self.tmpDir, 'S00_output.fits')
+        for filename in (self.inputFile, self.outputFile):
+            with open(filename, 'w') as f:
+                f.write('data')
+        self.key = ('1234', 'fe55', 'S00')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _makeSignature(self, gain=1.0):
+        from lsst.cp.pipe import getFileSignature
+        return dict(inputs=[getFileSignature(self.inputFile)], args=dict(gains={1: gain}))
+
+    def testResume(self):
+        from lsst.cp.pipe import CompletionManifest
+        manifest = CompletionManifest(self.manifestFile)
+        self.assertFalse(manifest.isComplete(self.key, self._makeSignature()))
+        manifest.record(self.key, self._makeSignature(), [self.outputFile])
+
+        # a new manifest, as if the run had been restarted
+        manifest = CompletionManifest(self.manifestFile)
+        self.assertEqual(len(manifest), 1)
+        self.assertEqual(manifest.getOutputs(self.key), [self.outputFile])
+        self.assertTrue(manifest.isComplete(self.key, self._makeSignature()))
+        self.assertFalse(manifest.isComplete(self.key, self._makeSignature(gain=2.0)))
+
+        # changing an input invalidates the entry
+        with open(self.inputFile, 'a') as f:
+            f.write('more data')
+        self.assertFalse(manifest.isComplete(self.key, self._makeSignature()))
+
+    def testMissingOutputs(self):
+        from lsst.cp.pipe import CompletionManifest
+        manifest = CompletionManifest(self.manifestFile)
+        manifest.record(self.key, self._makeSignature(), [self.outputFile])
+        os.remove(self.outputFile)
+        self.assertFalse(manifest.isComplete(self.key, self._makeSignature()))
+
+        manifest.remove(self.key)
+        self.assertEqual(len(CompletionManifest(self.manifestFile)), 0)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
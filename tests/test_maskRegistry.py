@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the mask file registry."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class MaskRegistryTestCase(lsst.utils.tests.TestCase):
+    """A test case for the MaskRegistry."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        for filename in ('S2_rolloff_defects_mask.fits', 'S2_dark_pixel_mask.fits',
+                         'S22_bright_pixel_mask.fits', 'S2_eotest_results.fits'):
+            with open(os.path.join(self.tmpDir, filename), 'w') as f:
+                f.write('mask')
+        self.stageNames = ['brightPixels', 'darkPixels', 'traps']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _path(self, filename):
+        return os.path.join(self.tmpDir, filename)
+
+    def testScanAndAdd(self):
+        from lsst.cp.pipe import MaskRegistry
+        registry = MaskRegistry(self.stageNames)
+        registry.scanDirectory(self.tmpDir, ['S2', 'S22'],
+                               origins={self._path('S2_dark_pixel_mask.fits'): 'darkPixels'})
+        self.assertEqual(registry.getMaskFiles('S2'), (self._path('S2_rolloff_defects_mask.fits'),
+                                                       self._path('S2_dark_pixel_mask.fits')))
+        self.assertEqual(registry.getMaskFiles('S22'), (self._path('S22_bright_pixel_mask.fits'),))
+
+        # masks made by the stage itself, or later ones, are left out
+        self.assertEqual(registry.getMaskFiles('S2', beforeStage='darkPixels'),
+                         (self._path('S2_rolloff_defects_mask.fits'),))
+
+        registry.add('S2', 'traps', [self._path('S2_traps_mask.fits'), self._path('S2_eotest_results.fits')])
+        registry.add('S2', 'brightPixels', [self._path('S2_bright_pixel_mask.fits')])
+        self.assertEqual(registry.getMaskFiles('S2'), (self._path('S2_rolloff_defects_mask.fits'),
+                                                       self._path('S2_bright_pixel_mask.fits'),
+                                                       self._path('S2_dark_pixel_mask.fits'),
+                                                       self._path('S2_traps_mask.fits')))
+        self.assertEqual(registry.getMaskFiles('S3'), ())
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the estimates of the peak memory of the eotest work units."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class MemoryModelTestCase(lsst.utils.tests.TestCase):
+    """A test case for the MemoryModel."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testEstimates(self):
+        from lsst.cp.pipe import MemoryModel
+        model = MemoryModel(100, decodeFactor=2., margin=1.5)
+        # read noise holds one file at a time, PTC all of them
+        self.assertEqual(model.estimate('readNoise', 1000, 10), 100 + 200)
+        self.assertEqual(model.estimate('ptc', 1000, 10), 100 + 2000)
+
+        model.record('ptc', 1000, 1500)
+        model.record('ptc', 1000, 1000)
+        self.assertEqual(model.estimate('ptc', 1000, 10), 1.5*1500)
+        self.assertEqual(model.estimate('ptc', 2000, 20), 1.5*(1500 + 2000))
+        self.assertEqual(model.estimate('readNoise', 1000, 10), 300)
+
+        historyFile = os.path.join(self.tmpDir, 'history.json')
+        model.writeJson(historyFile)
+        readModel = MemoryModel(100, maxHistory=1)
+        readModel.readJson(os.path.join(self.tmpDir, 'noSuchFile.json'))
+        readModel.readJson(historyFile)
+        self.assertEqual(readModel.getHistory('ptc'), [(1000, 1000)])
+        self.assertEqual(readModel.getHistory('fe55'), [])
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class MemoryAdmissionTestCase(lsst.utils.tests.TestCase):
+    """A test case for the admission of units by CpTask within a memory budget."""
+
+    def setUp(self):
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo
+        self.tmpDir = tempfile.mkdtemp()
+        self.butler = makeSyntheticRepo(os.path.join(self.tmpDir, 'repo'), nCcds=3, visitsPerAcquisition=2,
+                                        ampShape=(10, 8), nAmps=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _runTask(self, memoryBudgetBytes):
+        import json
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import configureStubSubtasks
+        config = CpTask.ConfigClass()
+        config.eotestOutputPath = os.path.join(self.tmpDir, 'eotest_%d' % memoryBudgetBytes)
+        config.numProcesses = 3
+        config.memoryBudgetBytes = memoryBudgetBytes
+        configureStubSubtasks(config, cpuSeconds=0.05)
+        CpTask(config=config).runEotestDirect(self.butler)
+        with open(os.path.join(config.eotestOutputPath, 'eotestTimeline.json')) as f:
+            events = json.load(f)['traceEvents']
+        # the largest number of units running at once
+        changes = sorted([(event['ts'], 1) for event in events] +
+                         [(event['ts'] + event['dur'], -1) for event in events])
+        nRunning = maxRunning = 0
+        for ts, change in changes:
+            nRunning += change
+            maxRunning = max(maxRunning, nRunning)
+        return config, maxRunning
+
+    def testBudget(self):
+        config, maxRunning = self._runTask(1)
+        self.assertEqual(maxRunning, 1)
+        self.assertTrue(os.path.exists(os.path.join(config.eotestOutputPath, 'eotestMemoryHistory.json')))
+
+        config, maxRunning = self._runTask(100*1024**3)
+        self.assertGreater(maxRunning, 1)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
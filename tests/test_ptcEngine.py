@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the NumPy photon transfer curve engine."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+# eotest's own PtcTask, against which the engine is checked, needs afw
+noAfwMsg = ""
+noAfw = False
+try:
+    import lsst.afw.image
+except ImportError:
+    noAfwMsg = "No afw setup, so skipping comparison with eotest"
+    noAfw = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class NumpyPtcTaskTestCase(lsst.utils.tests.TestCase):
+    """A test case for NumpyPtcTask."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testFitPtc(self):
+        from lsst.cp.pipe import fitPtc
+        a00, gain, noise = 2e-6, 1.5, 7.
+        means = np.tile(np.geomspace(100., 80000., 20), (3, 1))
+        variances = 0.5/(a00*gain*gain)*(1 - np.exp(-2*a00*means*gain)) + noise**2/gain**2
+        variances[1, 5] *= 2.  # an outlier, which is clipped
+        variances[2, 2:] = np.nan  # too few points to fit
+        fit = fitPtc(means, variances)
+        self.assertEqual(list(fit.ok), [True, True, False])
+        for i in range(2):
+            self.assertFloatsAlmostEqual(fit.gain[i], gain, rtol=1e-6)
+            self.assertFloatsAlmostEqual(fit.a00[i], a00, rtol=1e-4)
+            self.assertFloatsAlmostEqual(fit.noise[i], noise, rtol=1e-4)
+            self.assertEqual(fit.turnoff[i], 80000.)
+
+    def testRun(self):
+        from astropy.io import fits
+        from lsst.cp.pipe import NumpyPtcTask, findFlat2
+        from lsst.cp.pipe.benchmark import makeSyntheticFlatPairs
+        infiles = makeSyntheticFlatPairs(self.tmpDir, gain=1.7, nAmps=4, imagingShape=(100, 80),
+                                         exposureTimes=(1., 4., 16., 64.))
+        self.assertEqual(findFlat2(infiles[0], infiles), infiles[1])
+        self.assertEqual(findFlat2(infiles[0], infiles[:1]), infiles[1])  # found on disk, as eotest does
+        lonely = os.path.join(self.tmpDir, 'S01_flat_0001.00s_flat1.fits')
+        self.assertEqual(findFlat2(lonely, infiles), lonely)
+
+        task = NumpyPtcTask()
+        task.config.output_dir = self.tmpDir
+        task.run('S00', infiles, ())
+
+        with fits.open(os.path.join(self.tmpDir, 'S00_ptc.fits')) as ptcFile:
+            self.assertEqual(ptcFile[0].header['NAMPS'], 4)
+            stats = ptcFile['PTC_STATS'].data
+            self.assertEqual(list(stats['EXPOSURE']), [1., 4., 16., 64.])
+            self.assertFloatsAlmostEqual(stats['AMP01_MEAN'], 1000.*stats['EXPOSURE']/1.7, rtol=0.01)
+        with fits.open(os.path.join(self.tmpDir, 'S00_eotest_results.fits')) as resultsFile:
+            results = resultsFile['AMPLIFIER_RESULTS'].data
+            self.assertFloatsAlmostEqual(results['PTC_GAIN'], 1.7, rtol=0.05)
+            for column in NumpyPtcTask.TOLERANCES:
+                self.assertIn(column, results.names)
+
+    @unittest.skipIf(noAfw, noAfwMsg)
+    def testCompareWithEotest(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs, compareEngines
+        inputDir = os.path.join(self.tmpDir, 'inputs')
+        os.makedirs(inputDir)
+        runArgs = makeEngineInputs('ptc', inputDir, nAmps=4, imagingShape=(100, 80))
+        comparison = compareEngines('ptc', CpTask.ConfigClass(), runArgs, self.tmpDir)
+        self.assertTrue(comparison.withinTolerance, comparison.differences)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the raw filename index."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+class MockButler(object):
+    """Just enough of a butler to build a RawFilenameIndex from."""
+
+    def __init__(self):
+        self.nCalls = 0
+        self.records = [('1234', 2, 'S00', 'FLAT', 'FLAT'), ('1234', 1, 'S00', 'FLAT', 'FLAT'),
+                        ('1234', 1, 'S01', 'FLAT', 'FLAT'), ('1234', 3, 'S00', 'FE55', 'BIAS'),
+                        ('5678', 4, 'S00', 'DARK', 'DARK')]
+
+    def queryMetadata(self, datasetType, keys, dataId=None):
+        self.nCalls += 1
+        if keys[0] == 'run':
+            return self.records
+        return [record[1:] for record in self.records if record[0] == dataId['run']]
+
+    def get(self, datasetType, dataId):
+        self.nCalls += 1
+        return ['/raw/%(ccd)s_%(visit)s.fits[0]' % dataId]
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class RawFilenameIndexTestCase(lsst.utils.tests.TestCase):
+    """A test case for the RawFilenameIndex."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testIndex(self):
+        from lsst.cp.pipe import RawFilenameIndex
+        butler = MockButler()
+        index = RawFilenameIndex.fromButler(butler, '1234')
+        self.assertEqual(len(index), 4)
+        self.assertEqual(butler.nCalls, 5)
+        self.assertEqual(index.getFilenames('FLAT', 'FLAT', 'S00'), ['/raw/S00_1.fits', '/raw/S00_2.fits'])
+        self.assertEqual(index.getFilenames('FE55', 'BIAS', 'S01'), [])
+        self.assertEqual(index.getCcds(), ['S00', 'S01'])
+        self.assertEqual(index.getTestTypes(), ['FE55', 'FLAT'])
+        self.assertEqual(index.getImageTypes(), ['BIAS', 'FLAT'])
+
+        indexFile = os.path.join(self.tmpDir, 'index.json')
+        index.writeJson(indexFile)
+        readIndex = RawFilenameIndex.readJson(indexFile)
+        self.assertEqual(readIndex.run, '1234')
+        self.assertEqual(len(readIndex), 4)
+        for ccd in ('S00', 'S01'):
+            self.assertEqual(readIndex.getFilenames('FLAT', 'FLAT', ccd),
+                             index.getFilenames('FLAT', 'FLAT', ccd))
+
+    def testIsCurrent(self):
+        from lsst.cp.pipe import RawFilenameIndex
+        butler = MockButler()
+        index = RawFilenameIndex.fromButler(butler, '1234')
+        self.assertTrue(index.isCurrent(butler))
+        butler.records.append(('1234', 5, 'S01', 'FLAT', 'FLAT'))  # newly ingested
+        self.assertFalse(index.isCurrent(butler))
+
+    def testIndexRuns(self):
+        from lsst.cp.pipe import RawFilenameIndex
+        butler = MockButler()
+        indices = RawFilenameIndex.fromButlerRuns(butler, ['1234', 5678])
+        self.assertEqual(sorted(indices), ['1234', '5678'])
+        self.assertEqual(butler.nCalls, 6)
+        self.assertEqual(len(indices['1234']), 4)
+        self.assertEqual(indices['5678'].run, '5678')
+        self.assertEqual(indices['5678'].getFilenames('DARK', 'DARK', 'S00'), ['/raw/S00_4.fits'])
+
+        indices = RawFilenameIndex.fromButlerRuns(butler, ['5678'])
+        self.assertEqual(list(indices), ['5678'])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
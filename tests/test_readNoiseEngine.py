@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the NumPy read noise engine."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+# eotest's own ReadNoiseTask, against which the engine is checked, needs afw
+noAfwMsg = ""
+noAfw = False
+try:
+    import lsst.afw.image
+except ImportError:
+    noAfwMsg = "No afw setup, so skipping comparison with eotest"
+    noAfw = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class NumpyReadNoiseTaskTestCase(lsst.utils.tests.TestCase):
+    """A test case for NumpyReadNoiseTask."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testBoxNoise(self):
+        from lsst.cp.pipe import getAmps, readAmpGeometry, measureBoxNoise
+        from lsst.cp.pipe.benchmark import makeSyntheticBiasFrames
+        paths = makeSyntheticBiasFrames(self.tmpDir, nFrames=3, gain=1., readNoise=8., nAmps=2,
+                                        imagingShape=(100, 60))
+        amps = getAmps(paths[0])
+        geometry = readAmpGeometry(paths[0])
+        masked = np.zeros((2, 100, 60), dtype=bool)
+        masked[0, :10, :] = True
+        noise = measureBoxNoise(paths, amps, geometry, geometry.imaging, (20, 30), masked=masked)
+        self.assertEqual(noise.shape, (3, 2, 10))
+        self.assertFloatsAlmostEqual(np.median(noise), 8., rtol=0.05)
+        # reading one strip of boxes at a time gives the same answer
+        strips = measureBoxNoise(paths, amps, geometry, geometry.imaging, (20, 30), masked=masked,
+                                 maxChunkBytes=1)
+        self.assertFloatsAlmostEqual(strips, noise, rtol=1e-10)
+
+    def testRun(self):
+        from astropy.io import fits
+        from lsst.cp.pipe import NumpyReadNoiseTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs
+        runArgs = makeEngineInputs('readNoise', self.tmpDir, nFrames=2, gain=1.7, readNoise=6., nAmps=4,
+                                   imagingShape=(200, 100))
+        task = NumpyReadNoiseTask()
+        task.config.output_dir = self.tmpDir
+        task.config.dx = task.config.dy = 50
+        task.run(system_noise=dict((amp, 2.) for amp in range(1, 5)), **runArgs)
+
+        with fits.open(os.path.join(self.tmpDir, 'S00_read_noise_001.fits')) as noiseFile:
+            self.assertEqual(noiseFile[0].header['BIASFILE'], sorted(runArgs['bias_files'])[1])
+            self.assertEqual(len(noiseFile['SEGMENT10'].data), 8)
+            self.assertFloatsAlmostEqual(noiseFile[0].header['SIGTOT10'], 6., rtol=0.1)
+            self.assertEqual(noiseFile[0].header['SIGSYS13'], 2.)
+        with fits.open(os.path.join(self.tmpDir, 'S00_eotest_results.fits')) as resultsFile:
+            results = resultsFile['AMPLIFIER_RESULTS'].data
+            self.assertFloatsAlmostEqual(results['TOTAL_NOISE'], 6., rtol=0.05)
+            self.assertFloatsAlmostEqual(results['READ_NOISE'], np.sqrt(results['TOTAL_NOISE']**2 - 4.),
+                                         rtol=1e-5)
+            for column in NumpyReadNoiseTask.TOLERANCES:
+                self.assertIn(column, results.names)
+
+    @unittest.skipIf(noAfw, noAfwMsg)
+    def testCompareWithEotest(self):
+        from lsst.cp.pipe import CpTask
+        from lsst.cp.pipe.benchmark import makeEngineInputs, compareEngines
+        inputDir = os.path.join(self.tmpDir, 'inputs')
+        os.makedirs(inputDir)
+        runArgs = makeEngineInputs('readNoise', inputDir, nFrames=2, nAmps=4, imagingShape=(200, 100))
+        comparison = compareEngines('readNoise', CpTask.ConfigClass(), runArgs, self.tmpDir)
+        self.assertTrue(comparison.withinTolerance, comparison.differences)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
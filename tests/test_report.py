@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the incremental making of eotest reports."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class ReportTestCase(lsst.utils.tests.TestCase):
+    """A test case for deciding which parts of a report are out of date."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        for filename in ('S00_eotest_results.fits', 'S00_bright_pixel_mask.fits', 'S00_median_sflat.fits',
+                         'S00_eotest_report.tex', 'S01_eotest_results.fits', 'eotestManifest.json'):
+            self._touch(filename, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _touch(self, filename, mtime):
+        path = os.path.join(self.tmpDir, filename)
+        with open(path, 'w') as f:
+            f.write(filename)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def testGetReportInputs(self):
+        from lsst.cp.pipe import getReportInputs
+        inputs = [os.path.basename(path) for path in getReportInputs(self.tmpDir, 'S00')]
+        self.assertEqual(inputs, ['S00_bright_pixel_mask.fits', 'S00_eotest_results.fits'])
+
+    def testIsUpToDate(self):
+        from lsst.cp.pipe import getReportInputs, isUpToDate
+        inputs = getReportInputs(self.tmpDir, 'S00')
+        self.assertFalse(isUpToDate([], inputs))
+        figures = [self._touch('S00_ptcs.png', 2000), self._touch('S00_fe55_dists.png', 1500)]
+        self.assertTrue(isUpToDate(figures, inputs))
+        self._touch('S00_eotest_results.fits', 1800)
+        self.assertFalse(isUpToDate(figures, inputs))
+        self.assertFalse(isUpToDate([os.path.join(self.tmpDir, 'missing.png')], inputs))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
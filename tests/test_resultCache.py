@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the shared result cache."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class ResultCacheTestCase(lsst.utils.tests.TestCase):
+    """A test case for the ResultCache."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, 'cache')
+        self.outputDirs = [os.path.join(self.tmpDir, name) for name in ('output1', 'output2')]
+        for outputDir in self.outputDirs:
+            os.makedirs(outputDir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _writeOutput(self, filename, nBytes):
+        path = os.path.join(self.outputDirs[0], filename)
+        with open(path, 'wb') as f:
+            f.write(b'x'*nBytes)
+        return path
+
+    def testStoreAndFetch(self):
+        from lsst.cp.pipe import ResultCache, hashFile
+        cache = ResultCache(self.cacheDir, maxBytes=1000, link=True)
+        key = cache.makeKey(dict(stage='fe55', ccd='S00', config={'temp_set_point': -100}))
+        self.assertIsNone(cache.fetch(key, self.outputDirs[1]))
+
+        output = self._writeOutput('S00_mask.fits', 100)
+        cache.store(key, [output], {1: 1.5})
+        result, outputs = cache.fetch(key, self.outputDirs[1], copyAlways=['S00_mask.fits'])
+        self.assertEqual(result, {1: 1.5})
+        self.assertEqual(outputs, [os.path.join(self.outputDirs[1], 'S00_mask.fits')])
+        self.assertEqual(hashFile(outputs[0]), hashFile(output))
+
+    def testCopyAlways(self):
+        from lsst.cp.pipe import ResultCache
+        cache = ResultCache(self.cacheDir, maxBytes=1000, link=True)
+        key = cache.makeKey(dict(stage='fe55', ccd='S00'))
+        cache.store(key, [self._writeOutput('S00_mask.fits', 100),
+                          self._writeOutput('S00_eotest_results.fits', 100)], None)
+        outputs = dict((os.path.basename(path), path) for path in
+                       cache.fetch(key, self.outputDirs[1], copyAlways=['*_eotest_results.fits'])[1])
+        self.assertEqual(os.stat(outputs['S00_mask.fits']).st_nlink, 2)
+        self.assertEqual(os.stat(outputs['S00_eotest_results.fits']).st_nlink, 1)
+        self.assertEqual(sorted(os.listdir(self.outputDirs[1])), sorted(outputs))  # no staging directory
+
+    def testEviction(self):
+        from lsst.cp.pipe import ResultCache
+        cache = ResultCache(self.cacheDir, maxBytes=250)
+        keys = [cache.makeKey(dict(stage='fe55', ccd=ccd)) for ccd in ('S00', 'S01', 'S02')]
+        for i, key in enumerate(keys[:2]):
+            cache.store(key, [self._writeOutput('S0%d_mask.fits' % i, 100)], None)
+            time.sleep(0.01)
+
+        # using the first entry makes the second the least recently used
+        self.assertIsNotNone(cache.fetch(keys[0], self.outputDirs[1]))
+        cache.store(keys[2], [self._writeOutput('S02_mask.fits', 100)], None)
+        self.assertIsNotNone(cache.fetch(keys[0], self.outputDirs[1]))
+        self.assertIsNone(cache.fetch(keys[1], self.outputDirs[1]))
+        self.assertIsNotNone(cache.fetch(keys[2], self.outputDirs[1]))
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
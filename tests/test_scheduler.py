@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the scheduling of eotest work units."""
+
+from __future__ import absolute_import, division, print_function
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class StageSchedulerTestCase(lsst.utils.tests.TestCase):
+    """A test case for the StageScheduler."""
+
+    def setUp(self):
+        from lsst.cp.pipe import EOTEST_STAGES, WorkUnit
+        self.stages = dict((stage.name, stage) for stage in EOTEST_STAGES)
+        self.ccds = ['S00', 'S01']
+        self.units = [WorkUnit(self.stages[name], ccd, '1234')
+                      for name in ('fe55', 'readNoise', 'darkPixels') for ccd in self.ccds]
+        self.dependencies = dict((('1234', 'readNoise', ccd), [('1234', 'fe55', ccd)]) for ccd in self.ccds)
+
+    def _names(self, units):
+        return [(unit.stage.name, unit.ccd) for unit in units]
+
+    def testDependenciesAndGroups(self):
+        from lsst.cp.pipe import StageScheduler
+        scheduler = StageScheduler(self.units, self.dependencies, groupOf=lambda unit: unit.ccd)
+        ready = scheduler.getReady()
+        self.assertEqual(self._names(ready), [('fe55', 'S00'), ('fe55', 'S01')])
+        self.assertEqual(scheduler.getReady(), [])
+
+        # S00 can move on without waiting for S01
+        scheduler.markDone(ready[0])
+        self.assertEqual(self._names(scheduler.getReady()), [('readNoise', 'S00')])
+        self.assertFalse(scheduler.isFinished)
+
+    def testGetPending(self):
+        from lsst.cp.pipe import StageScheduler
+        scheduler = StageScheduler(self.units, self.dependencies, groupOf=lambda unit: unit.ccd)
+        fe55S00, _ = scheduler.getReady()
+        self.assertEqual(self._names(scheduler.getPending('S00')),
+                         [('fe55', 'S00'), ('readNoise', 'S00'), ('darkPixels', 'S00')])
+        scheduler.markDone(fe55S00)
+        self.assertEqual(self._names(scheduler.getPending('S00')),
+                         [('readNoise', 'S00'), ('darkPixels', 'S00')])
+
+    def testSerialization(self):
+        from lsst.cp.pipe import StageScheduler, WorkUnit
+        scheduler = StageScheduler(self.units, self.dependencies)
+        readNoise = WorkUnit.fromDict(self.units[2].toDict())
+        self.assertEqual(readNoise.key, ('1234', 'readNoise', 'S00'))
+        self.assertEqual(scheduler.getDependencies(readNoise), [('1234', 'fe55', 'S00')])
+        self.assertEqual(scheduler.getDependencies(self.units[0]), [])
+
+    def testMaxUnits(self):
+        from lsst.cp.pipe import StageScheduler
+        scheduler = StageScheduler(self.units, self.dependencies)
+        ready = scheduler.getReady(maxUnits=3)
+        self.assertEqual(self._names(ready), [('fe55', 'S00'), ('fe55', 'S01'), ('darkPixels', 'S00')])
+        self.assertEqual(scheduler.nRunning, 3)
+
+    def testAdmit(self):
+        from lsst.cp.pipe import StageScheduler
+        scheduler = StageScheduler(self.units, self.dependencies)
+        ready = scheduler.getReady(admit=lambda unit: unit.ccd == 'S01')
+        self.assertEqual(self._names(ready), [('fe55', 'S01'), ('darkPixels', 'S01')])
+        self.assertEqual(self._names(scheduler.running), self._names(ready))
+        self.assertEqual(self._names(scheduler.getReady()), [('fe55', 'S00'), ('darkPixels', 'S00')])
+
+    def testFailureSkipsDependents(self):
+        from lsst.cp.pipe import StageScheduler
+        scheduler = StageScheduler(self.units, self.dependencies, groupOf=lambda unit: unit.ccd)
+        fe55S00, fe55S01 = scheduler.getReady()
+        self.assertEqual(self._names(scheduler.markFailed(fe55S00)), [('readNoise', 'S00')])
+        scheduler.markDone(fe55S01)
+        while not scheduler.isFinished:
+            for unit in scheduler.getReady():
+                scheduler.markDone(unit)
+        self.assertEqual(self._names(scheduler.skipped), [('readNoise', 'S00')])
+
+    def testCycle(self):
+        from lsst.cp.pipe import StageScheduler
+        dependencies = {('1234', 'fe55', 'S00'): [('1234', 'readNoise', 'S00')]}
+        dependencies.update(self.dependencies)
+        with self.assertRaises(ValueError):
+            StageScheduler(self.units, dependencies)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
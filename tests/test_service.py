@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the service running eotest jobs from a queue."""
+
+from __future__ import absolute_import, division, print_function
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class CpServiceTestCase(lsst.utils.tests.TestCase):
+    """A test case for the CpService, running the stub subtasks on a synthetic repo."""
+
+    def setUp(self):
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo
+        self.tmpDir = tempfile.mkdtemp()
+        self.repo = os.path.join(self.tmpDir, 'repo')
+        self.butler = makeSyntheticRepo(self.repo, nCcds=2, visitsPerAcquisition=2, ampShape=(10, 8),
+                                        nAmps=2)
+        self.queueDir = os.path.join(self.tmpDir, 'queue')
+        self.butlerRepos = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def makeService(self, **kwargs):
+        from lsst.cp.pipe import CpService
+        from lsst.cp.pipe.benchmark import configureStubSubtasks
+
+        def butlerFactory(repo):
+            self.butlerRepos.append(repo)
+            return self.butler
+        return CpService(self.queueDir, config={'eotestOutputPath': os.path.join(self.tmpDir, 'eotest')},
+                         configure=configureStubSubtasks, butlerFactory=butlerFactory, **kwargs)
+
+    def testJobs(self):
+        from lsst.cp.pipe import submitJob, readJobResult
+        service = self.makeService(maxTasks=1)
+        firstId = submitJob(self.queueDir, self.repo, stages=['fe55', 'readNoise'], ccds=['S01'])
+        secondId = submitJob(self.queueDir, self.repo, stages=['fe55', 'readNoise'])
+        badId = submitJob(self.queueDir, self.repo, stages=['noSuchStage'])
+        self.assertIsNone(readJobResult(self.queueDir, firstId))
+        self.assertEqual(service.runPending(), 3)
+        service.close()
+
+        self.assertEqual(readJobResult(self.queueDir, firstId)['status'], 'succeeded')
+        self.assertEqual(readJobResult(self.queueDir, secondId)['status'], 'succeeded')
+        result = readJobResult(self.queueDir, badId)
+        self.assertEqual(result['status'], 'failed')
+        self.assertIn('noSuchStage', result['error'])
+        self.assertEqual(self.butlerRepos, [self.repo])
+        self.assertEqual(sorted(self.butler.gains), [('S00', '1234'), ('S01', '1234')])
+        self.assertEqual(os.listdir(os.path.join(self.queueDir, 'pending')), [])
+        self.assertEqual(os.listdir(os.path.join(self.queueDir, 'running')), [])
+
+    def testWarmTasks(self):
+        service = self.makeService(maxTasks=2)
+        readNoise = service.getTask({'doFe55': False, 'doBrightPixels': False})
+        self.assertFalse(hasattr(readNoise, 'fe55'))
+        self.assertIs(service.getTask({'doBrightPixels': False, 'doFe55': False}), readNoise)
+        service.getTask({'numProcesses': 2})
+        service.getTask()
+        self.assertIsNot(service.getTask({'doFe55': False, 'doBrightPixels': False}), readNoise)
+        service.close()
+
+    def testWorkerPool(self):
+        from lsst.cp.pipe import submitJob, readJobResult
+        service = self.makeService()
+        service.config['numProcesses'] = 2
+        task = service.getTask(service._getConfigOverrides({'stages': ['fe55']}))
+        self.assertIsNotNone(task._workerPool)
+        jobIds = [submitJob(self.queueDir, self.repo, stages=['fe55']) for i in range(2)]
+        service.serve(pollInterval=0.01, maxJobs=2)
+        for jobId in jobIds:
+            self.assertEqual(readJobResult(self.queueDir, jobId)['status'], 'succeeded')
+        self.assertIsNone(task._workerPool)
+
+    def testRequeue(self):
+        from lsst.cp.pipe import submitJob
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        host = socket.gethostname()
+        owners = dict(dead='@%s@%d' % (host, dead.pid), live='@%s@%d' % (host, os.getpid()),
+                      remote='@%s.elsewhere@%d' % (host, dead.pid), unrecorded='')
+        jobIds = {}
+        for name, owner in owners.items():
+            jobIds[name] = submitJob(self.queueDir, self.repo)
+            os.rename(os.path.join(self.queueDir, 'pending', jobIds[name] + '.json'),
+                      os.path.join(self.queueDir, 'running', jobIds[name] + owner + '.json'))
+        self.makeService()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.queueDir, 'pending'))),
+                         sorted([jobIds['dead'] + '.json', jobIds['unrecorded'] + '.json']))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.queueDir, 'running'))),
+                         sorted([jobIds['live'] + owners['live'] + '.json',
+                                 jobIds['remote'] + owners['remote'] + '.json']))
+
+    def testRunningFileRemoved(self):
+        from lsst.cp.pipe import CpTask, submitJob, readJobResult
+        service = self.makeService()
+        jobId = submitJob(self.queueDir, self.repo, stages=['fe55'])
+        runEotestDirect = CpTask.runEotestDirect
+
+        def removeRunning(task, *args, **kwargs):
+            for name in os.listdir(os.path.join(self.queueDir, 'running')):
+                os.remove(os.path.join(self.queueDir, 'running', name))
+            return runEotestDirect(task, *args, **kwargs)
+        CpTask.runEotestDirect = removeRunning
+        try:
+            self.assertEqual(service.runJob(jobId)['status'], 'succeeded')
+        finally:
+            CpTask.runEotestDirect = runEotestDirect
+        service.close()
+        self.assertEqual(readJobResult(self.queueDir, jobId)['status'], 'succeeded')
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the staging of input files."""
+
+from __future__ import absolute_import, division, print_function
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class InputStagerTestCase(lsst.utils.tests.TestCase):
+    """A test case for the InputStager."""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.scratchDir = os.path.join(self.tmpDir, 'scratch')
+        self.inputs = []
+        for i in range(3):
+            path = os.path.join(self.tmpDir, 'raw', str(i), 'S00_flat%d.fits' % (i % 2 + 1))
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(b'x'*100)
+            self.inputs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testStage(self):
+        from lsst.cp.pipe import InputStager
+        stager = InputStager(self.scratchDir, maxBytes=250)
+        stager.prefetch(self.inputs[:1])
+        localPaths = stager.stage(self.inputs[:2])
+        for path, localPath in zip(self.inputs, localPaths):
+            self.assertNotEqual(localPath, path)
+            self.assertTrue(localPath.startswith(self.scratchDir))
+            self.assertEqual(os.path.basename(localPath), os.path.basename(path))
+            with open(localPath, 'rb') as f:
+                self.assertEqual(f.read(), b'x'*100)
+
+        # no room while the first two are in use, so the third is read in place
+        self.assertEqual(stager.stage(self.inputs[2:]), self.inputs[2:])
+        stager.release(self.inputs)
+        localPaths = stager.stage(self.inputs[2:])
+        self.assertNotEqual(localPaths, self.inputs[2:])
+
+        stager.close()
+        self.assertFalse(os.path.exists(localPaths[0]))
+
+    def testDecompress(self):
+        from lsst.cp.pipe import InputStager
+        path = self.inputs[0] + '.gz'
+        with gzip.open(path, 'wb') as f:
+            f.write(b'y'*1000)
+        stager = InputStager(self.scratchDir, maxBytes=10000, decompress=True)
+        localPath, = stager.stage([path])
+        self.assertEqual(os.path.basename(localPath), 'S00_flat1.fits')
+        with open(localPath, 'rb') as f:
+            self.assertEqual(f.read(), b'y'*1000)
+        stager.close()
+
+    def testFailedCopy(self):
+        from lsst.cp.pipe import InputStager
+        path = self.inputs[0] + '.gz'
+        with open(path, 'wb') as f:
+            f.write(b'not gzipped')
+        stager = InputStager(self.scratchDir, maxBytes=10000, decompress=True)
+        self.assertEqual(stager.stage([path]), [path])
+        self.assertEqual(stager._usedBytes, 0)  # the reservation is given back
+        leftovers = [name for _, _, names in os.walk(stager.stagingDir) for name in names]
+        self.assertEqual(leftovers, [])
+        stager.close()
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
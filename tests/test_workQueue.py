@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test cases for the queue of eotest work units shared by workers."""
+
+from __future__ import absolute_import, division, print_function
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import lsst.utils
+import lsst.utils.tests
+
+noEotestMsg = ""
+noEotest = False
+try:
+    import lsst.eotest
+except ImportError:
+    noEotestMsg = "No eotest setup, so skipping unit test"
+    noEotest = True
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class SqliteWorkQueueTestCase(lsst.utils.tests.TestCase):
+    """A test case for the SqliteWorkQueue."""
+
+    def setUp(self):
+        from lsst.cp.pipe import EOTEST_STAGES, WorkUnit
+        self.tmpDir = tempfile.mkdtemp()
+        self.stages = dict((stage.name, stage) for stage in EOTEST_STAGES)
+        self.ccds = ['S00', 'S01']
+        self.units = [WorkUnit(self.stages[name], ccd, '1234')
+                      for name in ('fe55', 'readNoise', 'darkPixels') for ccd in self.ccds]
+        self.dependencies = dict((('1234', 'readNoise', ccd), [('1234', 'fe55', ccd)]) for ccd in self.ccds)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def makeQueue(self, **kwargs):
+        from lsst.cp.pipe import SqliteWorkQueue
+        return SqliteWorkQueue(os.path.join(self.tmpDir, 'queue.sqlite3'), **kwargs)
+
+    def _name(self, unit):
+        return None if unit is None else (unit.stage.name, unit.ccd)
+
+    def testDependenciesAndGroups(self):
+        workQueue = self.makeQueue()
+        workQueue.push(self.units, self.dependencies)
+        workQueue.push(self.units, self.dependencies)  # already there, so ignored
+        self.assertEqual(workQueue.getCounts()['waiting'], 6)
+
+        first = workQueue.lease('a')
+        self.assertEqual(self._name(first), ('fe55', 'S00'))
+        self.assertEqual(self._name(workQueue.lease('b')), ('fe55', 'S01'))
+        self.assertIsNone(workQueue.lease('c'))  # both CCDs are busy
+        self.assertFalse(workQueue.complete(first, 'b', []))
+        self.assertTrue(workQueue.complete(first, 'a', ['/out/S00_gains.fits']))
+        self.assertEqual(workQueue.getOutputs('1234', 'S00'), {'fe55': ['/out/S00_gains.fits']})
+        self.assertEqual(workQueue.getPendingStages('1234', 'S00'), ['readNoise', 'darkPixels'])
+
+        # S00 moves on without waiting for S01
+        readNoise = workQueue.lease('a')
+        self.assertEqual(self._name(readNoise), ('readNoise', 'S00'))
+        self.assertTrue(workQueue.renew(readNoise, 'a'))
+        self.assertFalse(workQueue.renew(readNoise, 'b'))
+        self.assertFalse(workQueue.isFinished())
+
+    def testFailureSkipsDependents(self):
+        workQueue = self.makeQueue()
+        workQueue.push(self.units, self.dependencies)
+        unit = workQueue.lease('a')
+        workQueue.fail(unit, 'a', 'it broke')
+        counts = workQueue.getCounts()
+        self.assertEqual((counts['failed'], counts['skipped'], counts['waiting']), (1, 1, 4))
+        failures = workQueue.getFailures()
+        self.assertEqual([(self._name(failed), error) for failed, error in failures],
+                         [(('fe55', 'S00'), 'it broke')])
+        self.assertEqual(failures[0][0].key, unit.key)
+
+    def testLeaseExpiry(self):
+        workQueue = self.makeQueue(leaseSeconds=0.1, maxAttempts=2)
+        workQueue.push(self.units[:1], {})
+        unit = workQueue.lease('dead')
+        self.assertIsNone(workQueue.lease('a'))
+        time.sleep(0.2)
+        self.assertEqual(self._name(workQueue.lease('a')), ('fe55', 'S00'))
+        self.assertFalse(workQueue.complete(unit, 'dead', []))
+        time.sleep(0.2)
+        self.assertIsNone(workQueue.lease('b'))  # expired on both attempts
+        self.assertEqual(workQueue.getCounts()['failed'], 1)
+        self.assertTrue(workQueue.isFinished())
+
+    def testKeepLeased(self):
+        import sqlite3
+        from lsst.cp.pipe.workQueue import _keepLeased
+
+        class FlakyQueue(object):
+            leaseSeconds = 0.15
+
+            def __init__(self, failures):
+                self.failures = failures
+                self.nRenewed = 0
+
+            def renew(self, unit, workerId):
+                if self.failures > 0:
+                    self.failures -= 1
+                    raise sqlite3.OperationalError("database is locked")
+                self.nRenewed += 1
+                return True
+
+        workQueue = FlakyQueue(failures=1)  # recovers before the lease expires
+        with _keepLeased(workQueue, self.units[0], 'a') as lost:
+            time.sleep(0.3)
+        self.assertFalse(lost.is_set())
+        self.assertGreater(workQueue.nRenewed, 0)
+
+        workQueue = FlakyQueue(failures=100)
+        with _keepLeased(workQueue, self.units[0], 'a') as lost:
+            time.sleep(0.4)
+        self.assertTrue(lost.is_set())
+
+
+@unittest.skipIf(noEotest, noEotestMsg)
+class DistributedEotestTestCase(lsst.utils.tests.TestCase):
+    """A test case for running CpTask's units from a queue with several worker processes."""
+
+    def setUp(self):
+        from lsst.cp.pipe.benchmark import makeSyntheticRepo
+        self.tmpDir = tempfile.mkdtemp()
+        self.butler = makeSyntheticRepo(os.path.join(self.tmpDir, 'repo'), nCcds=2, visitsPerAcquisition=2,
+                                        ampShape=(10, 8), nAmps=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testWorkers(self):
+        from lsst.cp.pipe import CpTask, SqliteWorkQueue
+        from lsst.cp.pipe.benchmark import configureStubSubtasks
+        config = CpTask.ConfigClass()
+        config.eotestOutputPath = os.path.join(self.tmpDir, 'eotest')
+        configureStubSubtasks(config, intermediateBytes=10)
+        task = CpTask(config=config)
+        workQueue = SqliteWorkQueue(os.path.join(self.tmpDir, 'queue.sqlite3'), leaseSeconds=0.5)
+        nUnits = task.planEotestQueue(self.butler, workQueue, ccds=['S00', 'S01'])
+        self.assertEqual(nUnits, 16)
+        self.assertEqual(task.planEotestQueue(self.butler, workQueue), 16)
+        self.assertEqual(workQueue.getCounts()['waiting'], 16)
+
+        # a worker which dies holding a lease
+        self.assertIsNotNone(workQueue.lease('dead'))
+
+        workers = [multiprocessing.Process(target=task.runEotestWorker, args=(self.butler, workQueue),
+                                           kwargs=dict(workerId='worker%d' % i, pollInterval=0.05))
+                   for i in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(workQueue.getCounts()['done'], 16)
+        self.assertIsNotNone(self.butler.get('eotest_gain', dataId={'ccd': 'S01', 'run': '1234'}))
+        outputs = os.listdir(config.eotestOutputPath)
+        self.assertIn('S00_traps_mask.fits', outputs)
+        self.assertFalse([filename for filename in outputs if '_median_' in filename])
+        self.assertIn(os.path.join(config.eotestOutputPath, 'S00_traps_mask.fits'),
+                      workQueue.getOutputs('1234', 'S00')['traps'])
+
+        # the masks found by each unit are the same as in a local run
+        localConfig = CpTask.ConfigClass()
+        localConfig.eotestOutputPath = os.path.join(self.tmpDir, 'local')
+        configureStubSubtasks(localConfig)
+        CpTask(config=localConfig).runEotestDirect(self.butler)
+        for ccd in ('S00', 'S01'):
+            results = [json.load(open(os.path.join(path, '%s_eotest_results.json' % ccd)))
+                       for path in (config.eotestOutputPath, localConfig.eotestOutputPath)]
+            self.assertEqual(results[0], results[1])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()